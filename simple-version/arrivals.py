@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+Arrival predictions joining GTFS-RT TripUpdates with the static schedule
+Scheduled departures are grouped per stop and sorted (see Schedule.stop_rows),
+so finding the next arrivals at a stop is a bisect followed by a short scan.
+Realtime delays live in a per-trip overlay that each feed tick derives from
+the previous one: only trip updates whose content changed are re-parsed, and
+only the overlay storage holding those trips is copied.
+"""
+
+import bisect
+import datetime
+import heapq
+import os
+import time
+from zoneinfo import ZoneInfo
+
+PREDICTION_HORIZON = int(os.getenv('PREDICTION_HORIZON', str(3 * 3600)))  # seconds ahead to search
+MAX_PREDICTIONS = 50
+MAX_TRACKED_DELAY = 2 * 3600  # delays beyond this are treated as feed errors
+DEPARTED_GRACE = 30  # seconds an arrival stays listed after its predicted time
+TRIP_CHUNK_BITS = 8  # DelayOverlay.by_trip holds trips in chunks of 256, shared between versions
+TRIP_CHUNK_MASK = (1 << TRIP_CHUNK_BITS) - 1
+EMPTY_CHUNK = (None,) * (1 << TRIP_CHUNK_BITS)
+
+
+def service_day_start(day, timezone):
+    """Epoch seconds of a GTFS service day's origin (noon minus 12 hours, local time)"""
+    noon = datetime.datetime(day.year, day.month, day.day, 12, tzinfo=timezone)
+    return int(noon.timestamp()) - 12 * 3600
+
+
+def date_stamp(day):
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def iso_utc(epoch):
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def route_keys(route_id, short_name=''):
+    """Names a client may use for a route: '720-13167' -> {'720-13167', '720'}"""
+    keys = {route_id.lower(), route_id.split('-', 1)[0].lower()}
+    if short_name:
+        keys.add(short_name.lower())
+    return keys
+
+
+def build_route_lookup(schedule):
+    """Schedule builder: lower-cased route name -> set of route indexes"""
+    lookup = {}
+    for route in range(len(schedule.route_ids)):
+        for key in route_keys(schedule.route_ids[route], schedule.route_short_names[route]):
+            lookup.setdefault(key, set()).add(route)
+    return lookup
+
+
+def parse_routes(value):
+    """'35/38' or '35,38' -> {'35', '38'}"""
+    return {part.strip().lower() for part in value.replace('/', ',').split(',') if part.strip()}
+
+
+class TripDelay:
+    """Realtime state of one scheduled trip; delays propagate to later stops"""
+
+    __slots__ = ('sequences', 'delays', 'skipped', 'canceled', 'vehicle_id', 'start_date', 'arrivals', 'departures')
+
+    def __init__(self, updates, skipped, canceled, vehicle_id, start_date, stop_times=()):
+        updates.sort()
+        self.sequences = [sequence for sequence, _ in updates]
+        self.delays = [delay for _, delay in updates]
+        self.skipped = skipped
+        self.canceled = canceled
+        self.vehicle_id = vehicle_id
+        self.start_date = start_date  # YYYYMMDD int, or None when the feed omits it
+        # Live times along the trip's stop_times (seconds into the service day) for the
+        # planner's inner loops; infinite where the vehicle will not stop
+        self.arrivals, self.departures = [], []
+        for sequence, arrival, departure in stop_times:
+            if canceled or sequence in skipped:
+                arrival = departure = float('inf')
+            else:
+                delay = self.delay_at(sequence)
+                arrival, departure = arrival + delay, departure + delay
+            self.arrivals.append(arrival)
+            self.departures.append(departure)
+
+    def delay_at(self, sequence):
+        i = bisect.bisect_right(self.sequences, sequence) - 1
+        return self.delays[i] if i >= 0 else 0
+
+
+def trip_pattern(schedule, trip):
+    """The planner pattern a trip runs on, or -1 (schedules built without patterns have none)"""
+    return schedule.trip_patterns[trip] if len(schedule.trip_patterns) else -1
+
+
+class DelayOverlay:
+    """Immutable view of the realtime delays for one schedule, replaced whole on each tick
+
+    by_trip maps trip -> TripDelay as by_trip[trip >> TRIP_CHUNK_BITS][trip &
+    TRIP_CHUNK_MASK]. A tick copies the list of chunks and only the chunks
+    holding changed trips; the others (EMPTY_CHUNK for trips without updates)
+    are shared with the previous version. Per pattern with realtime trips it
+    keeps how late and how early any of them runs (-1 collects trips without
+    one), which bounds the timetable searches, and the routes with realtime trips.
+    """
+
+    def __init__(self, schedule=None, version=0, by_trip=(), trip_count=0, patterns=None, routes=frozenset(),
+                 start_dates=frozenset()):
+        self.schedule = schedule
+        self.version = version
+        self.by_trip = by_trip
+        self.trip_count = trip_count
+        self.patterns = patterns or {}  # pattern -> (max seconds late, max seconds early)
+        self.routes = routes  # route indexes with realtime trips
+        self.start_dates = start_dates
+        self.max_late = max((late for late, _ in self.patterns.values()), default=0)
+        self.max_early = max((early for _, early in self.patterns.values()), default=0)
+
+    def __len__(self):
+        return self.trip_count
+
+    def get(self, trip, stamp=None):
+        """TripDelay for a trip running on service date `stamp` (YYYYMMDD), or None"""
+        if not self.trip_count:
+            return None
+        trip_delay = self.by_trip[trip >> TRIP_CHUNK_BITS][trip & TRIP_CHUNK_MASK]
+        if trip_delay is not None and stamp is not None and trip_delay.start_date not in (None, stamp):
+            return None
+        return trip_delay
+
+    def derive(self, changes, version, pattern_trips, route_counts, start_date_counts):
+        """The next version: `changes` maps trip -> new TripDelay (None when dropped)
+
+        pattern_trips / route_counts / start_date_counts describe the trips of
+        the new version (kept up to date by the caller); only the patterns of
+        changed trips have their bounds recomputed.
+        """
+        schedule = self.schedule
+        by_trip = list(self.by_trip) if changes else self.by_trip
+        patterns = dict(self.patterns) if changes else self.patterns
+        copied = set()
+        touched = set()
+        for trip, trip_delay in changes.items():
+            chunk = trip >> TRIP_CHUNK_BITS
+            if chunk not in copied:
+                by_trip[chunk] = list(by_trip[chunk])
+                copied.add(chunk)
+            by_trip[chunk][trip & TRIP_CHUNK_MASK] = trip_delay
+            touched.add(trip_pattern(schedule, trip))
+        for pattern in touched:
+            late = early = 0
+            for trip_delay in pattern_trips.get(pattern, {}).values():
+                late = max(late, max(0, max(trip_delay.delays, default=0)))
+                early = max(early, max(0, -min(trip_delay.delays, default=0)))
+            if pattern in pattern_trips:
+                patterns[pattern] = (late, early)
+            else:
+                patterns.pop(pattern, None)
+        routes = frozenset(route_counts) if changes else self.routes
+        start_dates = frozenset(start_date_counts) if changes else self.start_dates
+        trip_count = sum(route_counts.values())
+        return DelayOverlay(schedule, version, by_trip, trip_count, patterns, routes, start_dates)
+
+    @classmethod
+    def empty(cls, schedule):
+        """Version 0 for a schedule: every trip on its timetable"""
+        chunks = (len(schedule.trip_ids) >> TRIP_CHUNK_BITS) + 1
+        return cls(schedule, 0, [EMPTY_CHUNK] * chunks)
+
+
+EMPTY_OVERLAY = DelayOverlay()
+
+
+class ArrivalsEngine:
+    """Next-arrival queries over a ScheduleStore plus the latest realtime feeds"""
+
+    def __init__(self, store):
+        self.store = store
+        self.schedule = None  # schedule the overlay's trip indexes refer to
+        self.overlay = EMPTY_OVERLAY  # published view; swapped whole at the end of each tick
+        self.trips = {}  # working trip index -> TripDelay, patched in place by each tick
+        self.pattern_trips = {}  # pattern -> {trip: TripDelay} of the working trips
+        self.route_counts = {}  # route -> working trips on it
+        self.start_date_counts = {}  # start_date -> working trips with it
+        self.entity_bodies = {}  # feed entity id -> serialized entity last applied
+        self.entity_trips = {}  # feed entity id -> trip index
+        self.vehicles = None  # latest vehicle-positions snapshot
+        self.vehicles_by_trip = {}
+        self.ticks = 0
+        self.reparsed = 0
+        self._services = {}  # (schedule version, date) -> active service set
+
+    # realtime overlay
+
+    def apply_trip_updates(self, snapshot):
+        """Trip-updates feed builder: patch the overlay with the entities that changed"""
+        schedule = self.store.schedule
+        if schedule is None:
+            return None
+        if schedule is not self.schedule:
+            # New static schedule: trip indexes changed, so re-parse everything
+            self.trips, self.entity_bodies, self.entity_trips = {}, {}, {}
+            self.pattern_trips, self.route_counts, self.start_date_counts = {}, {}, {}
+            self.schedule = schedule
+            self.overlay = DelayOverlay.empty(schedule)
+        seen = set()
+        changes = {}  # trip -> TripDelay, or None once no entity updates it
+        changed = 0
+        for entity, body in zip(snapshot.entities, snapshot.entity_bodies):
+            entity_id = entity.get('id')
+            if 'trip_update' not in entity or entity_id is None:
+                continue
+            seen.add(entity_id)
+            if self.entity_bodies.get(entity_id) == body:
+                continue
+            changed += 1
+            self.entity_bodies[entity_id] = body
+            trip, trip_delay = self._parse_trip_update(schedule, entity['trip_update'])
+            previous = self.entity_trips.pop(entity_id, None)
+            if previous is not None and previous != trip:
+                self._set_trip(schedule, previous, None, changes)
+            if trip is not None:
+                self.entity_trips[entity_id] = trip
+                self._set_trip(schedule, trip, trip_delay, changes)
+        for entity_id in list(self.entity_bodies):
+            if entity_id not in seen:
+                del self.entity_bodies[entity_id]
+                trip = self.entity_trips.pop(entity_id, None)
+                if trip is not None:
+                    self._set_trip(schedule, trip, None, changes)
+        # Single reference swap; unchanged chunks of the previous version are shared
+        self.overlay = self.overlay.derive(changes, snapshot.version, self.pattern_trips,
+                                           self.route_counts, self.start_date_counts)
+        self.ticks += 1
+        self.reparsed += changed
+        return {'trips': len(self.trips), 'changed': changed}
+
+    def _set_trip(self, schedule, trip, trip_delay, changes):
+        """Replace (or with None drop) a working trip, keeping the per-pattern/route/date tallies"""
+        pattern, route = trip_pattern(schedule, trip), schedule.trip_routes[trip]
+        previous = self.trips.pop(trip, None)
+        if previous is not None:
+            trips = self.pattern_trips[pattern]
+            del trips[trip]
+            if not trips:
+                del self.pattern_trips[pattern]
+            for counts, key in ((self.route_counts, route), (self.start_date_counts, previous.start_date)):
+                counts[key] -= 1
+                if not counts[key]:
+                    del counts[key]
+        if trip_delay is not None:
+            self.trips[trip] = trip_delay
+            self.pattern_trips.setdefault(pattern, {})[trip] = trip_delay
+            for counts, key in ((self.route_counts, route), (self.start_date_counts, trip_delay.start_date)):
+                counts[key] = counts.get(key, 0) + 1
+        if previous is not None or trip_delay is not None:
+            changes[trip] = trip_delay
+
+    def apply_vehicle_positions(self, snapshot):
+        """Vehicle-positions feed builder: index vehicles by trip_id"""
+        by_trip = {}
+        for entity in snapshot.entities:
+            vehicle = entity.get('vehicle')
+            trip_id = ((vehicle or {}).get('trip') or {}).get('trip_id')
+            if trip_id:
+                by_trip[trip_id] = vehicle
+        self.vehicles_by_trip = by_trip
+        self.vehicles = snapshot
+        return {'trips': len(by_trip)}
+
+    def _parse_trip_update(self, schedule, trip_update):
+        descriptor = trip_update.get('trip') or {}
+        trip = schedule.trip_ids.get(descriptor.get('trip_id'))
+        if trip is None:
+            return None, None
+        start_date = descriptor.get('start_date')
+        start_date = int(start_date) if start_date and start_date.isdigit() else None
+        rows = schedule.trip_stop_times(trip)
+        day_start = None
+        updates, skipped = [], set()
+        for update in trip_update.get('stop_time_update', []):
+            sequence = update.get('stop_sequence')
+            row = self._find_row(schedule, rows, sequence, update.get('stop_id'))
+            if row is None:
+                continue
+            sequence = schedule.st_sequences[row]
+            relationship = update.get('schedule_relationship')
+            if relationship == 'SKIPPED':
+                skipped.add(sequence)
+                continue
+            if relationship == 'NO_DATA':
+                updates.append((sequence, 0))
+                continue
+            event = update.get('arrival') or update.get('departure') or {}
+            delay = event.get('delay')
+            if delay is None and event.get('time'):
+                if day_start is None:
+                    day_start = self._trip_day_start(schedule, start_date)
+                delay = int(event['time']) - (day_start + schedule.st_arrivals[row])
+            if delay is not None and abs(delay) <= MAX_TRACKED_DELAY:
+                updates.append((sequence, int(delay)))
+        if not updates and trip_update.get('delay') is not None and abs(trip_update['delay']) <= MAX_TRACKED_DELAY:
+            updates.append((-1, int(trip_update['delay'])))  # trip-level delay applies to every stop
+        canceled = descriptor.get('schedule_relationship') == 'CANCELED'
+        vehicle_id = (trip_update.get('vehicle') or {}).get('id')
+        stop_times = zip(schedule.st_sequences[rows.start:rows.stop], schedule.st_arrivals[rows.start:rows.stop],
+                         schedule.st_departures[rows.start:rows.stop])
+        return trip, TripDelay(updates, skipped, canceled, vehicle_id, start_date, stop_times)
+
+    @staticmethod
+    def _find_row(schedule, rows, sequence, stop_id):
+        if sequence is not None:
+            for row in rows:
+                if schedule.st_sequences[row] == sequence:
+                    return row
+            return None
+        stop = schedule.stop_ids.get(stop_id) if stop_id else None
+        if stop is None:
+            return None
+        for row in rows:
+            if schedule.st_stops[row] == stop:
+                return row
+        return None
+
+    def _trip_day_start(self, schedule, start_date):
+        timezone = ZoneInfo(schedule.timezone)
+        if start_date:
+            day = datetime.date(start_date // 10000, start_date // 100 % 100, start_date % 100)
+        else:
+            day = datetime.datetime.now(timezone).date()
+        return service_day_start(day, timezone)
+
+    # queries
+
+    def _active_services(self, schedule, day):
+        key = (schedule.version, day)
+        services = self._services.get(key, False)
+        if services is False:
+            if len(self._services) > 8:
+                self._services.clear()
+            services = self._services[key] = schedule.active_services(day)
+        return services
+
+    def route_indexes(self, schedule, routes):
+        lookup = schedule.indexes.get('route_names') or {}
+        return set().union(*(lookup.get(route, ()) for route in routes)) if routes else None
+
+    def current_overlay(self, schedule):
+        """The published delay overlay if it was built against `schedule`, else an empty one"""
+        overlay = self.overlay
+        return overlay if overlay.schedule is schedule else EMPTY_OVERLAY
+
+    def route_in_realtime(self, schedule, route_indexes):
+        """Whether the realtime overlay currently has trips for any of the routes"""
+        routes = self.current_overlay(schedule).routes
+        if not route_indexes:
+            return bool(routes)
+        return not routes.isdisjoint(route_indexes)
+
+    def next_arrivals(self, schedule, stops, limit=10, route_indexes=None, now=None, horizon=PREDICTION_HORIZON,
+                      overlay=None):
+        """Up to `limit` (arrival epoch, delay, row, trip, realtime) tuples at the stops, soonest first
+
+        Rows and trips index `schedule`; describe them with the same schedule
+        and overlay (default: current_overlay(schedule)).
+        """
+        now = now if now is not None else time.time()
+        overlay = overlay if overlay is not None else self.current_overlay(schedule)
+        max_late, max_early = overlay.max_late, overlay.max_early
+        timezone = ZoneInfo(schedule.timezone)
+        today = datetime.datetime.fromtimestamp(now, timezone).date()
+
+        offsets, departures, stop_rows = schedule.stop_offsets, schedule.stop_departures, schedule.stop_rows
+        st_trips, st_arrivals, st_sequences = schedule.st_trips, schedule.st_arrivals, schedule.st_sequences
+        trip_services, trip_routes = schedule.trip_services, schedule.trip_routes
+        best = []  # max-heap of (-arrival, ...) holding the current `limit` soonest
+        # Trips from yesterday's service day run past midnight with times beyond 24:00
+        for day in (today - datetime.timedelta(days=1), today):
+            day_start = service_day_start(day, timezone)
+            stamp = date_stamp(day)
+            services = self._active_services(schedule, day)
+            seconds_now = now - day_start
+            for stop in stops:
+                low, high = offsets[stop], offsets[stop + 1]
+                start = bisect.bisect_left(departures, seconds_now - max_late - DEPARTED_GRACE, low, high)
+                for i in range(start, high):
+                    scheduled = departures[i]
+                    earliest = day_start + scheduled - max_early
+                    if earliest > now + horizon or (len(best) >= limit and earliest > -best[0][0]):
+                        break
+                    row = stop_rows[i]
+                    trip = st_trips[row]
+                    if services is not None and trip_services[trip] not in services:
+                        continue
+                    if route_indexes is not None and trip_routes[trip] not in route_indexes:
+                        continue
+                    delay, realtime = 0, False
+                    trip_delay = overlay.get(trip, stamp)
+                    if trip_delay is not None:
+                        if trip_delay.canceled or st_sequences[row] in trip_delay.skipped:
+                            continue
+                        delay, realtime = trip_delay.delay_at(st_sequences[row]), True
+                    arrival = day_start + st_arrivals[row] + delay
+                    if arrival < now - DEPARTED_GRACE:
+                        continue
+                    item = (-arrival, delay, row, trip, realtime)
+                    if len(best) < limit:
+                        heapq.heappush(best, item)
+                    elif arrival < -best[0][0]:
+                        heapq.heapreplace(best, item)
+        return sorted((-arrival, delay, row, trip, realtime) for arrival, delay, row, trip, realtime in best)
+
+    def describe_arrival(self, schedule, arrival, delay, row, trip, realtime, now=None, overlay=None):
+        """JSON-ready prediction in the shape the Flutter client reads, for a next_arrivals() tuple"""
+        now = now if now is not None else time.time()
+        overlay = overlay if overlay is not None else self.current_overlay(schedule)
+        route = schedule.trip_routes[trip]
+        stop = schedule.st_stops[row]
+        trip_id = schedule.trip_ids[trip]
+        trip_delay = overlay.get(trip) if realtime else None
+        vehicle_id = trip_delay.vehicle_id if trip_delay is not None else None
+        if not vehicle_id:
+            vehicle = self.vehicles_by_trip.get(trip_id)
+            vehicle_id = ((vehicle or {}).get('vehicle') or {}).get('id')
+        return {
+            'route_id': schedule.route_short_names[route] or schedule.route_ids[route],
+            'trip_id': trip_id,
+            'vehicle_id': vehicle_id or '',
+            'headsign': schedule.headsigns[schedule.trip_headsigns[trip]],
+            'stop_id': schedule.stop_ids[stop],
+            'stop_name': schedule.stop_names[stop],
+            'arrival_time': iso_utc(arrival),
+            'scheduled_time': iso_utc(arrival - delay),
+            'minutes_until_arrival': max(0, round((arrival - now) / 60)),
+            'delay': delay,
+            'realtime': realtime,
+        }
+
+    def live_vehicles(self, routes=None, now=None):
+        """JSON-ready vehicles from the latest positions feed, joined with headsign and next-stop ETA"""
+        snapshot = self.vehicles
+        if snapshot is None:
+            return []
+        schedule = self.store.schedule
+        now = now if now is not None else time.time()
+        vehicles = []
+        for entity in snapshot.entities:
+            vehicle = entity.get('vehicle')
+            if not vehicle:
+                continue
+            trip_descriptor = vehicle.get('trip') or {}
+            route_id = trip_descriptor.get('route_id') or ''
+            trip = schedule.trip_ids.get(trip_descriptor.get('trip_id')) if schedule is not None else None
+            route_name = route_id
+            if trip is not None:
+                route = schedule.trip_routes[trip]
+                route_id = schedule.route_ids[route]
+                route_name = schedule.route_short_names[route] or route_id
+            if routes and not (route_keys(route_id, route_name) & routes):
+                continue
+            position = vehicle.get('position') or {}
+            timestamp = vehicle.get('timestamp')
+            record = {
+                'vehicle_id': (vehicle.get('vehicle') or {}).get('id') or entity.get('id'),
+                'route_id': route_name,
+                'trip_id': trip_descriptor.get('trip_id'),
+                'latitude': position.get('latitude'),
+                'longitude': position.get('longitude'),
+                'bearing': position.get('bearing'),
+                'speed': position.get('speed'),
+                'headsign': schedule.headsigns[schedule.trip_headsigns[trip]] if trip is not None else '',
+                'stop_id': vehicle.get('stop_id'),
+                'next_stop_name': None,
+                'minutes_until_next_stop': None,
+                'last_update': iso_utc(int(timestamp)) if timestamp else None,
+            }
+            if trip is not None:
+                arrival = self._next_stop_arrival(schedule, trip, vehicle.get('stop_id'), now)
+                if arrival is not None:
+                    stop, arrival_time = arrival
+                    record['stop_id'] = schedule.stop_ids[stop]
+                    record['next_stop_name'] = schedule.stop_names[stop]
+                    record['minutes_until_next_stop'] = max(0, round((arrival_time - now) / 60))
+            record['stop_name'] = record['next_stop_name']
+            vehicles.append(record)
+        return vehicles
+
+    def _next_stop_arrival(self, schedule, trip, stop_id, now):
+        """(stop, predicted epoch) of the vehicle's next stop on its trip, or None"""
+        rows = schedule.trip_stop_times(trip)
+        if not rows:
+            return None
+        trip_delay = self.current_overlay(schedule).get(trip)
+        day_start = self._trip_day_start(schedule, trip_delay.start_date if trip_delay else None)
+        stop = schedule.stop_ids.get(stop_id) if stop_id else None
+        for row in rows:
+            delay = trip_delay.delay_at(schedule.st_sequences[row]) if trip_delay else 0
+            arrival = day_start + schedule.st_arrivals[row] + delay
+            if (stop is not None and schedule.st_stops[row] == stop) or (stop is None and arrival >= now):
+                return schedule.st_stops[row], arrival
+        return None
+
+    def stop_family(self, schedule, stop):
+        """A stop plus its platforms when it is a parent station"""
+        if schedule.stop_offsets[stop + 1] > schedule.stop_offsets[stop]:
+            return [stop]  # has departures of its own, so not a station
+        parents = schedule.stop_parents
+        children = [child for child in range(len(parents)) if parents[child] == stop]
+        return [stop] + children
+
+    def stats(self):
+        return {
+            'realtime_trips': len(self.overlay),
+            'overlay_version': self.overlay.version,
+            'max_late_seconds': self.overlay.max_late,
+            'max_early_seconds': self.overlay.max_early,
+            'ticks': self.ticks,
+            'trip_updates_reparsed': self.reparsed,
+        }
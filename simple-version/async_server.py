@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Asyncio HTTP front-end for the LA Transit server
+Multiplexes all client connections on one event loop. Requests whose handler
+offers a coroutine (the upstream API proxies) are served on the loop itself;
+everything else (static files, mock data) runs the regular handler methods
+in a bounded thread pool. Streaming handlers may take over the connection,
+and large file bodies go out with loop.sendfile after the buffered headers.
+"""
+
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from server_pool import SERVER_WORKERS, SERVER_BACKLOG, KEEPALIVE_TIMEOUT, MAX_REQUEST_BODY
+
+MAX_REQUEST_HEAD = 64 * 1024
+
+
+class AsyncHTTPServer:
+    """Serve a BaseHTTPRequestHandler subclass from an asyncio event loop"""
+
+    # Handlers may leave a (file, offset, count) body in handler.file_body instead of writing it
+    file_bodies = True
+
+    def __init__(self, server_address, RequestHandlerClass, engine=None, workers=None, backlog=None):
+        self.server_address = server_address
+        self.RequestHandlerClass = RequestHandlerClass
+        self.engine = engine
+        self.workers = max(1, workers if workers is not None else SERVER_WORKERS)
+        self.backlog = max(1, backlog if backlog is not None else SERVER_BACKLOG)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="http-worker")
+        self.loop = None
+        self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.server_close()
+
+    def serve_forever(self):
+        asyncio.run(self.serve())
+
+    def shutdown(self):
+        """Stop serve_forever() from another thread"""
+        if self.loop is not None and self._server is not None:
+            self.loop.call_soon_threadsafe(self._server.close)
+
+    def server_close(self):
+        self.executor.shutdown(wait=False)
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        if self.engine is not None:
+            self.engine.bind(self.loop)
+        host, port = self.server_address
+        server = self._server = await asyncio.start_server(
+            self._handle_connection, host or None, port,
+            backlog=self.backlog, limit=MAX_REQUEST_HEAD,
+        )
+        self.server_address = server.sockets[0].getsockname()[:2]  # the real port when 0 was asked for
+        async with server:
+            try:
+                await server.serve_forever()
+            except asyncio.CancelledError:
+                pass  # shutdown()
+
+    async def _handle_connection(self, reader, writer):
+        client_address = writer.get_extra_info('peername') or ('', 0)
+        served = 0
+        try:
+            while True:
+                raw_request = await self._read_request(reader)
+                if raw_request is None:
+                    break
+                handler = self._make_handler(raw_request, client_address[:2], served)
+                served += 1
+                if handler.parsed:
+                    stream_dispatch = getattr(handler, 'stream_dispatch', None)
+                    stream = stream_dispatch(writer) if stream_dispatch else None
+                    if stream is not None:
+                        await stream  # long-lived response that owns the connection
+                        break
+                    await self._dispatch(handler)
+                writer.write(handler.wfile.getvalue())
+                if handler.file_body is not None and not await self._send_file_body(writer, *handler.file_body):
+                    break  # the file shrank under us; the framing is broken
+                await writer.drain()
+                if handler.close_connection:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Read one request (head plus Content-Length body); None when the client is done
+
+        A bad or oversized Content-Length yields just the head: the handler's
+        parse_request answers it with 400 / 413 and closes the connection.
+        """
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            return None
+        length = 0
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                try:
+                    length = int(value.strip())
+                except ValueError:
+                    return head
+        if length < 0 or length > MAX_REQUEST_BODY:
+            return head
+        body = await reader.readexactly(length) if length else b""
+        return head + body
+
+    async def _send_file_body(self, writer, f, offset, count):
+        """Send count bytes of f from offset after what is already buffered; False if it ran short
+
+        The kernel copies the file pages to the socket (os.sendfile) where the
+        transport allows it, so the body never passes through this process.
+        """
+        with f:
+            sent = await self.loop.sendfile(writer.transport, f, offset, count)
+        return sent == count
+
+    def _make_handler(self, raw_request, client_address, served=0):
+        """Build a handler around an in-memory request without running its handle() loop
+
+        served is how many requests this connection has already carried.
+        """
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        handler.request = None
+        handler.connection = None
+        handler.client_address = client_address
+        handler.server = self
+        handler.directory = os.getcwd()
+        handler.rfile = io.BytesIO(raw_request)
+        handler.wfile = io.BytesIO()
+        handler.file_body = None
+        handler.close_connection = True
+        handler.requests_served = served
+        handler.raw_requestline = handler.rfile.readline(65537)
+        handler.parsed = handler.parse_request()
+        return handler
+
+    async def _dispatch(self, handler):
+        async_dispatch = getattr(handler, 'async_dispatch', None)
+        coro = async_dispatch() if async_dispatch else None
+        try:
+            if coro is not None:
+                await coro
+            else:
+                await self.loop.run_in_executor(self.executor, self._dispatch_sync, handler)
+        except Exception as e:
+            print(f"❌ Request handling error: {e}")
+            if not handler.wfile.getvalue():
+                handler.send_error(500, f"Internal server error: {str(e)}")
+
+    @staticmethod
+    def _dispatch_sync(handler):
+        method = getattr(handler, 'do_' + handler.command, None)
+        if method is None:
+            handler.send_error(501, f"Unsupported method ({handler.command!r})")
+            return
+        method()
@@ -4,20 +4,43 @@ Comprehensive LA Transit App Server with All API Support
 Handles Swiftly, WeatherMap, and TomTom API requests
 """
 
+import asyncio
+import html
 import http.server
-import socketserver
+import io
 import urllib.request
 import urllib.parse
 import json
-import ssl
 import os
 import datetime
+import email.utils
+import time
 import math
 from urllib.error import HTTPError, URLError
 
+from server_pool import PooledTCPServer, KEEPALIVE_TIMEOUT, KEEPALIVE_MAX_REQUESTS, MAX_REQUEST_BODY
+from async_server import AsyncHTTPServer
+from proxy_engine import UPSTREAM_GATE, ProxyEngine, UpstreamBusy
+from gtfs_realtime import FeedDecoder, DecodeError, looks_like_protobuf
+from realtime_feed import FeedPoller, RealtimeFeeds
+from vehicle_index import VehicleIndex, parse_spatial_query
+from vehicle_delta import VehicleDeltaLog
+from realtime_stream import StreamHub, StreamFilter, SSE_HEADERS
+from gtfs_static import GTFSError
+from schedule_snapshot import ScheduleStore, SnapshotError
+from stop_index import StopIndex, MAX_STOP_RESULTS
+from arrivals import ArrivalsEngine, MAX_PREDICTIONS, build_route_lookup, parse_routes
+from journey_planner import JourneyPlanner, MAX_TRANSFERS, MATRIX_MAX_MINUTES, MAX_MATRIX_POINTS
+from isochrone import Isochrones, MAX_ISOCHRONE_MINUTES
+from venue_transit import VenueTransit
+from geocoder import Geocoder, NominatimUpstream, MAX_GEOCODE_RESULTS, normalize_query
+from static_assets import SENDFILE_MIN_BYTES, StaticAssets, parse_byte_range
+from response_compression import COMPRESS_MIN_BYTES, CompressionCache, negotiate_encoding
+
 # API Configuration - Using placeholders for real-time data keys
 SWIFTLY_API_KEY = 'YOUR_SWIFTLY_API_KEY_HERE'
 SWIFTLY_BASE_URL = 'https://api.goswift.ly'
+SWIFTLY_AGENCY = os.getenv('SWIFTLY_AGENCY', 'lametro')
 
 WEATHERMAP_API_KEY = 'YOUR_OPENWEATHERMAP_API_KEY_HERE'
 WEATHERMAP_BASE_URL = 'https://api.openweathermap.org/data/2.5'
@@ -32,7 +55,183 @@ DEFAULT_LAT = float(os.getenv('DEFAULT_LAT', '34.0522'))
 DEFAULT_LON = float(os.getenv('DEFAULT_LON', '-118.2437'))
 DEFAULT_CITY = os.getenv('DEFAULT_CITY', 'Los Angeles')
 
+# Serving mode: 'asyncio' (single event loop, local handlers in a worker pool) or 'threaded' (worker pool
+# only; each upstream call holds a worker until it returns, at most MAX_UPSTREAM_WAITS at a time)
+SERVER_MODE = os.getenv('SERVER_MODE', 'asyncio')
+
+# Shared upstream fetcher; every proxied call is a task on its event loop
+PROXY_ENGINE = ProxyEngine()
+
+# Background-polled GTFS-RT feeds keyed by '<agency>/<feed>' (see build_realtime_feeds)
+REALTIME_FEEDS = RealtimeFeeds()
+
+# Static GTFS schedule (stops, routes, trips, stop_times) mapped from a compiled
+# snapshot; SCHEDULE_STORE.schedule is None when no feed is available
+SCHEDULE_STORE = ScheduleStore()
+SCHEDULE_STORE.add_builder('stops', StopIndex)
+SCHEDULE_STORE.add_builder('route_names', build_route_lookup)
+SCHEDULE_STORE.add_builder('planner', JourneyPlanner)
+
+# Next-arrival predictions: scheduled departures per stop plus a TripUpdates delay overlay
+ARRIVALS = ArrivalsEngine(SCHEDULE_STORE)
+
+# Reachability overlays, cached per (origin grid cell, departure bucket)
+ISOCHRONES = Isochrones(SCHEDULE_STORE)
+
+# Nearest stops and transit times attached to event venues
+VENUE_TRANSIT = VenueTransit(SCHEDULE_STORE)
+
+# Forward geocoding (/api/geocode) through a SQLite-backed normalized-query cache
+GEOCODER = Geocoder(NominatimUpstream(PROXY_ENGINE.fetch))
+
+# login.html / the main app page, held in memory with ETags and gzip/brotli variants
+STATIC_ASSETS = StaticAssets()
+
+# gzip/deflate bytes of long-lived JSON bodies, so each is compressed once
+COMPRESSION = CompressionCache()
+
+# Server-Sent Events fan-out of feed ticks (/api/stream)
+STREAM_HUB = StreamHub()
+
+# One stateful GTFS-RT decoder per feed path (reuses unchanged entities between polls)
+GTFS_RT_DECODERS = {}
+
+# Upstream response cache lifetimes in seconds (0 disables caching)
+CACHE_TTLS = {
+    'swiftly/vehicle-positions': 10,
+    'swiftly/trip-updates': 15,
+    'swiftly/alerts': 60,
+    'swiftly': 10,
+    'weather': 600,
+    'tomtom': 60,
+    'places': 3600,
+    'ticketmaster': 300,
+}
+
+
+def cache_ttl(api_path):
+    """Pick the cache TTL for an API path (without the '/api/' prefix)"""
+    provider = api_path.split('/', 1)[0].split('?', 1)[0]
+    if provider == 'swiftly':
+        for feed in ('vehicle-positions', 'trip-updates', 'alerts'):
+            if feed in api_path:
+                return CACHE_TTLS[f'swiftly/{feed}']
+    return CACHE_TTLS.get(provider, 0)
+
+
+def realtime_feed_key(api_path):
+    """'swiftly/real-time/lametro/gtfs-rt-vehicle-positions?x=1' -> 'lametro/gtfs-rt-vehicle-positions'"""
+    path = api_path.split('?', 1)[0][len('swiftly/'):]
+    if path.startswith('real-time/'):
+        path = path[len('real-time/'):]
+    return path
+
 class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
+    # Persistent connections: every response is framed by Content-Length, or
+    # closes the connection when it cannot be (event streams)
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body are separate writes; don't wait on delayed ACKs
+    requests_served = 0  # on this connection
+    request_parsed = False
+    
+    def handle_one_request(self):
+        # An idle keep-alive connection gives its worker back after KEEPALIVE_TIMEOUT
+        self.connection.settimeout(KEEPALIVE_TIMEOUT)
+        super().handle_one_request()
+    
+    def parse_request(self):
+        """Parse the request head and read its Content-Length body, so the next request starts cleanly"""
+        self.request_parsed = False
+        self.request_body = b''
+        self.response_code = None
+        if not super().parse_request():
+            return False
+        self.response_code = None  # an interim 100 Continue does not start the response
+        self.requests_served += 1
+        if self.requests_served >= KEEPALIVE_MAX_REQUESTS:
+            self.close_connection = True
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.send_error(411, "Chunked request bodies are not supported")
+            return False
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_REQUEST_BODY:
+            self.send_error(400 if length < 0 else 413, "Invalid or oversized Content-Length")
+            return False
+        self.request_body = self.rfile.read(length) if length else b''
+        if self.connection is not None:
+            self.connection.settimeout(None)  # the idle timeout only covers waiting for a request
+        self.request_parsed = True
+        return True
+    
+    def send_response_only(self, code, message=None):
+        self.response_code = code
+        self.response_framed = False
+        self.connection_header_sent = False
+        super().send_response_only(code, message)
+    
+    def send_header(self, keyword, value):
+        name = keyword.lower()
+        if name == 'content-length':
+            self.response_framed = True
+        elif name == 'connection':
+            self.connection_header_sent = True
+        super().send_header(keyword, value)
+    
+    def end_headers(self):
+        """Decide whether the connection outlives this response and say so"""
+        code = getattr(self, 'response_code', None)
+        if code is not None and code >= 200 and not getattr(self, 'connection_header_sent', True):
+            bodyless = code in (204, 304) or self.command == 'HEAD'
+            if not (self.response_framed or bodyless):
+                self.close_connection = True  # the body ends when the connection does
+            saturated = getattr(self.server, 'saturated', None)
+            if not self.close_connection and saturated is not None and saturated():
+                self.close_connection = True  # hand this worker to a waiting connection
+            if self.close_connection:
+                self.send_header('Connection', 'close')
+            else:
+                if self.request_version == 'HTTP/1.0':
+                    self.send_header('Connection', 'keep-alive')
+                self.send_header('Keep-Alive', f"timeout={int(KEEPALIVE_TIMEOUT)}, "
+                                               f"max={KEEPALIVE_MAX_REQUESTS - self.requests_served}")
+        super().end_headers()
+    
+    def send_error(self, code, message=None, explain=None):
+        """send_error that keeps the connection open after a well-formed request
+        
+        The stock version always closes it; here that only happens when the
+        request itself could not be parsed or a response was already started.
+        """
+        if not self.request_parsed:
+            super().send_error(code, message, explain)
+            return
+        if self.response_code is not None:
+            print(f"❌ Error {code} after a response was started: {message}")
+            self.close_connection = True
+            return
+        shortmsg, longmsg = self.responses.get(code, ('???', '???'))
+        message = shortmsg if message is None else message
+        explain = longmsg if explain is None else explain
+        self.log_error("code %d, message %s", code, message)
+        self.send_response(code, message)
+        body = b''
+        if code >= 200 and code not in (204, 205, 304):
+            body = (self.error_message_format % {'code': code, 'message': html.escape(message, quote=False),
+                                                 'explain': html.escape(explain, quote=False)}).encode('utf-8', 'replace')
+            self.send_header('Content-Type', self.error_content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD' and body:
+            self.wfile.write(body)
+    
+    def log_error(self, format, *args):
+        if format.startswith('Request timed out'):
+            return  # idle keep-alive connection reaching KEEPALIVE_TIMEOUT
+        super().log_error(format, *args)
+    
     def do_GET(self):
         print(f"\n🔍 Request: {self.path}")
         
@@ -47,7 +246,7 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
             self.serve_main_html()
         else:
             # Serve static files from current directory
-            super().do_GET()
+            self.serve_static_file()
     
     def do_POST(self):
         print(f"\n🔍 POST Request: {self.path}")
@@ -63,9 +262,10 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
-    def handle_places_api(self, api_path):
+    async def handle_places_api(self, api_path):
         """Handle Google Places API requests"""
         try:
             # Check if this is an autocomplete request (with or without query params)
@@ -87,21 +287,14 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
                 print(f"🗺️ Google Places Autocomplete: {input_text}")
                 
                 # Make request to Google Places API
-                with urllib.request.urlopen(places_url) as response:
-                    data = response.read().decode('utf-8')
-                    places_data = json.loads(data)
-                    
-                    print(f"✅ Google Places response: {len(places_data.get('predictions', []))} suggestions")
-                    
-                    # Send response with CORS headers
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-                    self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-                    self.end_headers()
-                    self.wfile.write(data.encode('utf-8'))
-                    
+                response = await PROXY_ENGINE.fetch(places_url, ttl=cache_ttl(api_path))
+                data = response.read()
+                places_data = json.loads(data)
+                
+                print(f"✅ Google Places response: {len(places_data.get('predictions', []))} suggestions")
+                
+                self.send_json_body(data, cacheable=cache_ttl(api_path) > 0)
+                
             else:
                 print(f"❌ Unknown Places API endpoint: {api_path}")
                 self.send_error(404, f"Places API endpoint not found: {api_path}")
@@ -112,47 +305,144 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
 
     def serve_login_page(self):
         """Serve the login page as default"""
-        try:
-            html_file = 'login.html'
-            print(f"📄 Serving login page: {html_file}")
+        self.serve_static_asset('login.html', 'text/html', "Login page")
 
-            with open(html_file, 'rb') as f:
-                content = f.read()
+    def serve_main_html(self):
+        """Serve the correct main HTML file"""
+        self.serve_static_asset('index-working-with-location-sharing.html', 'text/html; charset=utf-8', "HTML file")
 
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.send_header('Content-length', str(len(content)))
-            self.end_headers()
-            self.wfile.write(content)
+    def serve_static_asset(self, html_file, content_type, label):
+        """Serve a file from the in-memory asset cache with ETag revalidation and precompressed variants"""
+        try:
+            asset = STATIC_ASSETS.get(html_file, content_type)
         except FileNotFoundError:
-            print(f"❌ Login page not found: {html_file}")
-            self.send_error(404, "Login page not found")
+            print(f"❌ {label} not found: {html_file}")
+            self.send_error(404, f"{label} not found: {html_file}")
+            return
         except Exception as e:
-            print(f"❌ Error serving login page: {e}")
-            self.send_error(500, f"Error serving login page: {str(e)}")
+            print(f"❌ Error serving {html_file}: {e}")
+            self.send_error(500, f"Error serving {html_file}: {str(e)}")
+            return
 
-    def serve_main_html(self):
-        """Serve the correct main HTML file"""
-        try:
-            # Serve the correct HTML file
-            html_file = 'index-working-with-location-sharing.html'
-            print(f"📄 Serving main HTML file: {html_file}")
+        coding, body = asset.negotiate(self.headers.get('Accept-Encoding'))
+        headers = (('ETag', asset.variant_etag(coding)), ('Cache-Control', 'no-cache'), ('Vary', 'Accept-Encoding'))
+        if asset.matches(self.headers.get('If-None-Match')):
+            print(f"📄 Not modified: {html_file}")
+            self.send_response(304)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            return
 
-            with open(html_file, 'rb') as f:
-                content = f.read()
+        headers += (('Access-Control-Allow-Origin', '*'),)
+        if coding == 'identity' and len(body) >= SENDFILE_MIN_BYTES:
+            # Large raw body: let the kernel copy it from the file (supports Range)
+            print(f"📄 Serving {html_file} from disk ({len(body)} bytes)")
+            self.send_file(asset.path, asset.content_type, headers, asset.etag)
+            return
 
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.send_header('Access-Control-Allow-Origin', '*')
+        print(f"📄 Serving {html_file} ({coding}, {len(body)} bytes)")
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if coding != 'identity':
+            self.send_header('Content-Encoding', coding)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def serve_static_file(self):
+        """Static files: large ones and Range requests via send_file, the rest as SimpleHTTPRequestHandler does"""
+        path = self.translate_path(self.path)
+        try:
+            large = os.path.isfile(path) and os.path.getsize(path) >= SENDFILE_MIN_BYTES
+        except OSError:
+            large = False
+        if not (large or (self.headers.get('Range') and os.path.isfile(path))):
+            super().do_GET()
+            return
+        try:
+            modified = os.stat(path).st_mtime
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+        since = self.headers.get('If-Modified-Since')
+        if since and not self.headers.get('If-None-Match'):
+            try:
+                if int(modified) <= email.utils.parsedate_to_datetime(since).timestamp():
+                    self.send_response(304)
+                    self.send_header('Last-Modified', self.date_time_string(modified))
+                    self.end_headers()
+                    return
+            except (TypeError, ValueError, IndexError, OverflowError):
+                pass
+        last_modified = self.date_time_string(modified)
+        self.send_file(path, self.guess_type(path), (('Last-Modified', last_modified),), last_modified)
+    
+    def send_file(self, path, content_type, headers=(), validator=None):
+        """Send a file (or the byte range asked for) with os.sendfile when it is large
+        
+        validator is the ETag or Last-Modified value an If-Range header must
+        match for its Range to apply. In asyncio mode there is no socket here:
+        a large body is handed to the front-end as file_body, which sends it
+        with loop.sendfile once the buffered headers are out.
+        """
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            status, first, last = 200, 0, size - 1
+            if_range = self.headers.get('If-Range')
+            if self.headers.get('Range') and (if_range is None or if_range == validator):
+                try:
+                    byte_range = parse_byte_range(self.headers.get('Range'), size)
+                except ValueError:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f"bytes */{size}")
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if byte_range is not None:
+                    status, (first, last) = 206, byte_range
+            count = last - first + 1
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(count))
+            self.send_header('Accept-Ranges', 'bytes')
+            if status == 206:
+                self.send_header('Content-Range', f"bytes {first}-{last}/{size}")
+            for name, value in headers:
+                self.send_header(name, value)
             self.end_headers()
-            self.wfile.write(content)
-
-        except FileNotFoundError:
-            print(f"❌ HTML file not found: {html_file}")
-            self.send_error(404, f"HTML file not found: {html_file}")
-        except Exception as e:
-            print(f"❌ Error serving HTML: {e}")
-            self.send_error(500, f"Error serving HTML: {str(e)}")
+            if self.command == 'HEAD' or count <= 0:
+                return
+            if self.connection is None and getattr(self.server, 'file_bodies', False) and count >= SENDFILE_MIN_BYTES:
+                # The front-end owns the connection; give it a descriptor of its own to send from
+                self.file_body = (os.fdopen(os.dup(f.fileno()), 'rb'), first, count)
+                return
+            if self.connection is not None and hasattr(os, 'sendfile') and count >= SENDFILE_MIN_BYTES:
+                # Zero-copy: the kernel moves file pages straight to the socket
+                offset = first
+                while count > 0:
+                    sent = os.sendfile(self.connection.fileno(), f.fileno(), offset, count)
+                    if sent == 0:
+                        break
+                    offset += sent
+                    count -= sent
+            else:
+                f.seek(first)
+                while count > 0:
+                    chunk = f.read(min(count, 64 * 1024))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    count -= len(chunk)
+            if count > 0:
+                self.close_connection = True  # the file shrank under us; the framing is broken
     
     def handle_api_request(self):
         """Handle API requests by proxying to external APIs"""
@@ -161,30 +451,539 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
             api_path = self.path[5:]  # Remove '/api/' prefix
             print(f"📡 API Path: {api_path}")
             
-            # Handle different API endpoints
-            if api_path.startswith('swiftly/'):
-                self.handle_swiftly_api(api_path)
-            elif api_path.startswith('weather/'):
-                self.handle_weather_api(api_path)
-            elif api_path.startswith('tomtom/'):
-                self.handle_tomtom_api(api_path)
-            elif api_path.startswith('places/'):
-                self.handle_places_api(api_path)
-            elif api_path.startswith('ticketmaster'):
-                self.handle_ticketmaster_api(api_path)
-            else:
+            handler = self.find_api_handler(api_path)
+            if handler is None:
                 print(f"❌ Unknown API endpoint: {api_path}")
                 self.send_error(404, f"API endpoint not found: {api_path}")
+            elif asyncio.iscoroutinefunction(handler):
+                self.run_async_handler(handler(api_path))
+            else:
+                handler(api_path)
                 
         except Exception as e:
             print(f"❌ API Error: {e}")
             self.send_error(500, f"Internal server error: {str(e)}")
     
-    def handle_swiftly_api(self, api_path):
+    def find_api_handler(self, api_path):
+        """Map an API path (without the '/api/' prefix) to its handler method"""
+        if api_path.startswith('stream'):
+            return self.handle_stream_api
+        elif api_path.startswith('transit/stops'):
+            return self.handle_transit_stops
+        elif api_path.startswith('transit/predictions'):
+            return self.handle_transit_predictions
+        elif api_path.startswith('transit/vehicles'):
+            return self.handle_transit_vehicles
+        elif api_path.startswith('plan'):
+            return self.handle_plan_api
+        elif api_path.startswith('isochrone'):
+            return self.handle_isochrone_api
+        elif api_path.startswith('matrix'):
+            return self.handle_matrix_api
+        elif api_path.startswith('geocode'):
+            return self.handle_geocode_api
+        elif api_path.startswith('swiftly/'):
+            if REALTIME_FEEDS.snapshot(realtime_feed_key(api_path)) is not None:
+                return self.handle_realtime_snapshot
+            return self.handle_swiftly_api
+        elif api_path.startswith('weather/'):
+            return self.handle_weather_api
+        elif api_path.startswith('tomtom/'):
+            return self.handle_tomtom_api
+        elif api_path.startswith('places/'):
+            return self.handle_places_api
+        elif api_path.startswith('ticketmaster'):
+            return self.handle_ticketmaster_api
+        elif api_path.startswith('stats'):
+            return self.handle_stats_api
+        return None
+    
+    def run_async_handler(self, coro):
+        """Run an async API handler on the proxy engine loop from a worker thread
+        
+        The worker blocks until the handler finishes. Answers from the proxy
+        or geocode caches come back at once; the first fetch that has to wait
+        on an upstream claims one of the server's upstream_waits slots, and
+        when none is free the request gets a 503 instead of holding a worker.
+        The response is buffered and written from this thread so a slow client
+        never blocks the event loop.
+        """
+        claimed = []  # [True] once this request holds a slot
+        
+        def claim_upstream_wait():
+            if not claimed and self.server.begin_upstream_wait():
+                claimed.append(True)
+            return bool(claimed)
+        
+        client_wfile, self.wfile = self.wfile, io.BytesIO()
+        gate = UPSTREAM_GATE.set(claim_upstream_wait)  # copied into the task's context by PROXY_ENGINE.run
+        try:
+            PROXY_ENGINE.run(coro)
+        except UpstreamBusy:
+            print(f"⚠️  {self.server.upstream_waits} upstream calls in flight - rejecting {self.path}")
+            self.wfile = io.BytesIO()
+            body = json.dumps({'success': False, 'error': 'Too many upstream requests in flight', 'data': []})
+            self.send_json_body(body.encode('utf-8'), 503, headers=(('Retry-After', '1'),))
+        finally:
+            UPSTREAM_GATE.reset(gate)
+            if claimed:
+                self.server.end_upstream_wait()
+            buffered, self.wfile = self.wfile, client_wfile
+            self.wfile.write(buffered.getvalue())
+    
+    def async_dispatch(self):
+        """Return a coroutine that serves this request on the event loop, or None
+        
+        Used by AsyncHTTPServer: upstream API proxies run as loop tasks, all
+        other requests go through the regular do_* methods in a worker thread.
+        """
+        if self.command in ('GET', 'POST') and self.path.startswith('/api/'):
+            api_path = self.path[5:]
+            handler = self.find_api_handler(api_path)
+            if asyncio.iscoroutinefunction(handler):
+                print(f"\n🔍 {self.command} Request: {self.path}")
+                return handler(api_path)
+        return None
+    
+    def handle_stats_api(self, api_path):
+        """Report upstream connection pool, latency and cache statistics"""
+        stats = {
+            'mode': SERVER_MODE,
+            'upstream': PROXY_ENGINE.stats(),
+            'cache': PROXY_ENGINE.cache.stats(),
+            'coalesced_requests': PROXY_ENGINE.coalesced,
+            'feeds': REALTIME_FEEDS.stats(),
+            'stream': STREAM_HUB.stats(),
+            'schedule': SCHEDULE_STORE.stats(),
+            'arrivals': ARRIVALS.stats(),
+            'isochrones': ISOCHRONES.stats(),
+            'venues': VENUE_TRANSIT.stats(),
+            'geocode': GEOCODER.stats(),
+            'static': STATIC_ASSETS.stats(),
+            'compression': COMPRESSION.stats()
+        }
+        if SERVER_MODE != 'asyncio':
+            stats['upstream_waits'] = {'limit': self.server.upstream_waits, 'rejected': self.server.upstream_rejected}
+        self.send_json(stats)
+    
+    def send_json(self, payload, status=200):
+        """Send a JSON response with CORS headers"""
+        self.send_json_body(json.dumps(payload).encode('utf-8'), status)
+    
+    def send_json_body(self, body, status=200, headers=(), cacheable=False, content_type='application/json'):
+        """Send already-encoded JSON with CORS headers, compressed when the client accepts it
+        
+        cacheable marks a body object that is itself cached and sent again
+        (feed snapshots, isochrones, upstream responses held by the proxy
+        cache), so its compressed bytes are kept; leave it off for bodies
+        built or fetched for this request alone.
+        """
+        coding = None
+        if len(body) >= COMPRESS_MIN_BYTES and ('json' in content_type or content_type.startswith('text/')):
+            coding = negotiate_encoding(self.headers.get('Accept-Encoding'))
+        if coding is not None:
+            body = COMPRESSION.get(body, coding, cacheable)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if coding is not None:
+            self.send_header('Content-Encoding', coding)
+        self.send_header('Vary', 'Accept-Encoding')
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def query_float(self, params, *names):
+        """First of the named query parameters as a float, or None when absent"""
+        for name in names:
+            value = params.get(name, [''])[0].strip()
+            if value:
+                return float(value)
+        return None
+    
+    def handle_transit_stops(self, api_path):
+        """Stops near lat/lon, stops whose name starts with `name`, or both ranked by distance"""
+        schedule = SCHEDULE_STORE.schedule
+        if schedule is None:
+            self.send_json({'success': False, 'error': 'Static GTFS schedule not loaded', 'data': []}, 503)
+            return
+        
+        params = self.query_params()
+        try:
+            name = params.get('name', [''])[0].strip()
+            lat = self.query_float(params, 'lat')
+            lon = self.query_float(params, 'lon', 'lng')
+            radius = self.query_float(params, 'radius')
+            limit = max(1, min(int(params.get('limit', ['10'])[0]), MAX_STOP_RESULTS))
+            if not name and (lat is None or lon is None):
+                raise ValueError("name or lat and lon are required")
+        except ValueError as e:
+            self.send_json({'success': False, 'error': f"Invalid stops query: {e}", 'data': []}, 400)
+            return
+        
+        index = schedule.indexes['stops']
+        results = index.search(name, lat, lon, limit, radius)
+        self.send_json({
+            'success': True,
+            'data': [index.describe(stop, meters) for meters, stop in results]
+        })
+    
+    def handle_transit_predictions(self, api_path):
+        """Next arrivals at a stop (stop_id, or stop_name / lat-lon), optionally for given routes"""
+        schedule = SCHEDULE_STORE.schedule
+        if schedule is None:
+            self.send_json({'success': False, 'error': 'Static GTFS schedule not loaded', 'data': []}, 503)
+            return
+        
+        params = self.query_params()
+        try:
+            routes = parse_routes(params.get('route', [''])[0])
+            stop_id = params.get('stop_id', [''])[0].strip()
+            stop_name = params.get('stop_name', [''])[0].strip()
+            lat = self.query_float(params, 'lat')
+            lon = self.query_float(params, 'lon', 'lng')
+            radius = self.query_float(params, 'radius')
+            limit = max(1, min(int(params.get('limit', ['10'])[0]), MAX_PREDICTIONS))
+            if not stop_id and not stop_name and (lat is None or lon is None):
+                raise ValueError("stop_id, stop_name or lat and lon are required")
+        except ValueError as e:
+            self.send_json({'success': False, 'error': f"Invalid predictions query: {e}", 'data': []}, 400)
+            return
+        
+        route_indexes = ARRIVALS.route_indexes(schedule, routes)
+        if stop_id:
+            stop = schedule.stop_ids.get(stop_id)
+            if stop is None:
+                self.send_json({'success': False, 'error': f"Unknown stop_id {stop_id}", 'data': []}, 404)
+                return
+            candidates = [stop]
+        else:
+            candidates = [stop for _, stop in schedule.indexes['stops'].search(stop_name, lat, lon, 5, radius)]
+        
+        # The first matching stop actually served (by the requested routes) wins; rows are
+        # ranked and described against the same schedule and overlay even if a tick lands meanwhile
+        now = time.time()
+        overlay = ARRIVALS.current_overlay(schedule)
+        arrivals = []
+        if not routes or route_indexes:
+            for stop in candidates:
+                arrivals = ARRIVALS.next_arrivals(schedule, ARRIVALS.stop_family(schedule, stop), limit,
+                                                  route_indexes, now, overlay=overlay)
+                if arrivals:
+                    break
+        self.send_json({
+            'success': True,
+            'routeFoundInCache': ARRIVALS.route_in_realtime(schedule, route_indexes),
+            'data': [ARRIVALS.describe_arrival(schedule, *arrival, now=now, overlay=overlay) for arrival in arrivals]
+        })
+    
+    def handle_transit_vehicles(self, api_path):
+        """Live vehicles (optionally for given routes) with headsign and next-stop ETA"""
+        if ARRIVALS.vehicles is None:
+            self.send_json({'success': False, 'error': 'Vehicle positions not yet available', 'data': []}, 503)
+            return
+        vehicles = ARRIVALS.live_vehicles(parse_routes(self.query_params().get('route', [''])[0]))
+        self.send_json({'success': True, 'data': vehicles})
+    
+    def query_point(self, params, *names):
+        """'lat,lon' from the first named query parameter present, or None"""
+        for name in names:
+            value = params.get(name, [''])[0].strip()
+            if value:
+                lat, lon = (float(part) for part in value.split(','))
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    raise ValueError(f"{name} is out of range")
+                return lat, lon
+        return None
+    
+    def query_time(self, params, *names):
+        """Epoch seconds from epoch seconds / milliseconds or an ISO 8601 parameter; now when absent"""
+        for name in names:
+            value = params.get(name, [''])[0].strip()
+            if not value or value == 'now':
+                continue
+            try:
+                number = float(value)
+            except ValueError:
+                moment = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+                if moment.tzinfo is None:
+                    raise ValueError(f"{name} needs a UTC offset")
+                return moment.timestamp()
+            return number / 1000 if number > 1e11 else number
+        return time.time()
+    
+    def handle_plan_api(self, api_path):
+        """Transit journeys between two points (RAPTOR over the static schedule)
+        
+        Responds in the Google Directions shape the app already parses
+        (routes -> legs -> steps with transit_details).
+        """
+        schedule = SCHEDULE_STORE.schedule
+        if schedule is None:
+            self.send_json({'success': False, 'status': 'UNAVAILABLE',
+                            'error': 'Static GTFS schedule not loaded', 'routes': []}, 503)
+            return
+        
+        params = self.query_params()
+        try:
+            origin = self.query_point(params, 'from', 'origin')
+            destination = self.query_point(params, 'to', 'destination')
+            if origin is None or destination is None:
+                raise ValueError("from and to (lat,lon) are required")
+            depart = self.query_time(params, 'departure_time', 'depart')
+            max_transfers = max(0, min(int(params.get('max_transfers', [str(MAX_TRANSFERS)])[0]), 8))
+            realtime = params.get('realtime', ['1'])[0] not in ('0', 'false')
+        except ValueError as e:
+            self.send_json({'success': False, 'status': 'INVALID_REQUEST',
+                            'error': f"Invalid plan query: {e}", 'routes': []}, 400)
+            return
+        
+        started = time.perf_counter()
+        # Live TripUpdate delays apply through the current overlay (swapped whole on each feed tick)
+        overlay = ARRIVALS.overlay if realtime else None
+        routes = schedule.indexes['planner'].plan(origin, destination, depart, max_transfers, overlay)
+        print(f"🧭 Planned {len(routes)} journeys in {(time.perf_counter() - started) * 1000:.1f} ms")
+        self.send_json({
+            'success': True,
+            'status': 'OK' if routes else 'ZERO_RESULTS',
+            'routes': routes
+        })
+    
+    def handle_isochrone_api(self, api_path):
+        """Stops and grid cells reachable from lat/lon within `minutes` by transit and walking"""
+        schedule = SCHEDULE_STORE.schedule
+        if schedule is None:
+            self.send_json({'success': False, 'error': 'Static GTFS schedule not loaded', 'data': []}, 503)
+            return
+        
+        params = self.query_params()
+        try:
+            lat = self.query_float(params, 'lat')
+            lon = self.query_float(params, 'lon', 'lng')
+            if lat is None or lon is None:
+                raise ValueError("lat and lon are required")
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError("lat/lon is out of range")
+            minutes = int(params.get('minutes', ['30'])[0])
+            if not 1 <= minutes <= MAX_ISOCHRONE_MINUTES:
+                raise ValueError(f"minutes must be between 1 and {MAX_ISOCHRONE_MINUTES}")
+            depart = self.query_time(params, 'depart', 'departure_time')
+            realtime = params.get('realtime', ['1'])[0] not in ('0', 'false')
+        except ValueError as e:
+            self.send_json({'success': False, 'error': f"Invalid isochrone query: {e}", 'data': []}, 400)
+            return
+        
+        started = time.perf_counter()
+        body, hit = ISOCHRONES.get(lat, lon, minutes, depart, ARRIVALS.overlay if realtime else None)
+        print(f"🗺️  Isochrone ({minutes} min, {'cached' if hit else 'computed'}) in {(time.perf_counter() - started) * 1000:.1f} ms")
+        self.send_json_body(body, cacheable=True)
+    
+    async def handle_geocode_api(self, api_path):
+        """Coordinates for a free-form LA address or place name (q=...), best match first"""
+        params = self.query_params()
+        try:
+            query = params.get('q', params.get('address', ['']))[0]
+            if not normalize_query(query):
+                raise ValueError("q must name an address or place")
+            limit = int(params.get('limit', ['1'])[0])
+            if not 1 <= limit <= MAX_GEOCODE_RESULTS:
+                raise ValueError(f"limit must be between 1 and {MAX_GEOCODE_RESULTS}")
+        except ValueError as e:
+            self.send_json({'success': False, 'error': f"Invalid geocode query: {e}", 'data': []}, 400)
+            return
+        
+        started = time.perf_counter()
+        try:
+            places, source = await GEOCODER.geocode(query, limit)
+        except (URLError, ValueError, KeyError) as e:
+            print(f"❌ Geocoding upstream error: {e}")
+            self.send_json({'success': False, 'error': f"Geocoding service unavailable: {e}", 'data': []}, 502)
+            return
+        print(f"📍 Geocoded {query!r} ({source}) in {(time.perf_counter() - started) * 1000:.2f} ms")
+        self.send_json({
+            'success': True,
+            'status': 'OK' if places else 'ZERO_RESULTS',
+            'query': query,
+            'source': source,
+            'data': places
+        })
+    
+    def handle_matrix_api(self, api_path):
+        """Transit travel times from many origins to many destinations (Distance Matrix shape)
+        
+        GET takes origins / destinations as 'lat,lon|lat,lon'; POST takes a JSON
+        body with the same keys holding [lat, lon] pairs or {lat, lon} objects.
+        """
+        schedule = SCHEDULE_STORE.schedule
+        if schedule is None:
+            self.send_json({'success': False, 'status': 'UNAVAILABLE',
+                            'error': 'Static GTFS schedule not loaded', 'rows': []}, 503)
+            return
+        
+        params = self.query_params()
+        try:
+            body = self.read_json_body() if self.command == 'POST' else {}
+            origins = self.matrix_points(body.get('origins', params.get('origins', [''])[0]), 'origins')
+            destinations = self.matrix_points(body.get('destinations', params.get('destinations', [''])[0]),
+                                              'destinations')
+            times = {name: [str(body[name])] for name in ('departure_time', 'depart') if name in body} or params
+            depart = self.query_time(times, 'departure_time', 'depart')
+            max_minutes = int(body.get('max_minutes', params.get('max_minutes', [str(MATRIX_MAX_MINUTES)])[0]))
+            max_minutes = max(1, min(max_minutes, MATRIX_MAX_MINUTES))
+            realtime = str(body.get('realtime', params.get('realtime', ['1'])[0])).lower() not in ('0', 'false')
+        except ValueError as e:
+            self.send_json({'success': False, 'status': 'INVALID_REQUEST',
+                            'error': f"Invalid matrix query: {e}", 'rows': []}, 400)
+            return
+        
+        started = time.perf_counter()
+        overlay = ARRIVALS.overlay if realtime else None
+        rows = schedule.indexes['planner'].matrix(origins, destinations, depart, overlay=overlay,
+                                                  max_minutes=max_minutes)
+        print(f"🧮 Matrix {len(origins)}x{len(destinations)} in {(time.perf_counter() - started) * 1000:.1f} ms")
+        self.send_json({'success': True, 'status': 'OK', 'rows': rows})
+    
+    def matrix_points(self, value, name):
+        """[(lat, lon)] from 'lat,lon|lat,lon' or a JSON list of pairs / {lat, lon} objects"""
+        if isinstance(value, str):
+            value = [part for part in value.split('|') if part.strip()]
+        if not isinstance(value, list) or not value:
+            raise ValueError(f"{name} are required")
+        if len(value) > MAX_MATRIX_POINTS:
+            raise ValueError(f"at most {MAX_MATRIX_POINTS} {name}")
+        points = []
+        for point in value:
+            if isinstance(point, str):
+                point = point.split(',')
+            elif isinstance(point, dict):
+                point = (point.get('lat', point.get('latitude')), point.get('lon', point.get('lng', point.get('longitude'))))
+            try:
+                lat, lon = (float(part) for part in point)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} must be lat,lon points")
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError(f"{name} point is out of range")
+            points.append((lat, lon))
+        return points
+    
+    def read_json_body(self):
+        """Decoded JSON object from the request body ({} when empty)"""
+        if not self.request_body:
+            return {}
+        try:
+            body = json.loads(self.request_body)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"body is not JSON ({e})")
+        if not isinstance(body, dict):
+            raise ValueError("body must be a JSON object")
+        return body
+    
+    def query_params(self):
+        return urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+    
+    def spatial_query(self):
+        """bbox / lat-lon-radius filter requested by the client, or None"""
+        return parse_spatial_query(self.query_params())
+    
+    def start_stream(self):
+        """Validate a stream request and send the SSE headers; the StreamFilter or None on error"""
+        try:
+            stream_filter = StreamFilter.from_query(self.query_params())
+        except ValueError as e:
+            self.send_error(400, f"Invalid stream query: {e}")
+            return None
+        if STREAM_HUB.is_full():
+            self.send_error(503, "Too many stream subscribers")
+            return None
+        
+        self.send_response(200)
+        for name, value in SSE_HEADERS:
+            self.send_header(name, value)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.end_headers()
+        return stream_filter
+    
+    def handle_stream_api(self, api_path):
+        """Push vehicle deltas, trip updates and alerts as Server-Sent Events
+        
+        In threaded mode the connection is handed to the engine loop so the
+        worker thread is freed immediately.
+        """
+        stream_filter = self.start_stream()
+        self.close_connection = True
+        if stream_filter is None:
+            return
+        self.wfile.flush()
+        sock = self.server.detach_request(self.request)
+        PROXY_ENGINE.submit(STREAM_HUB.serve_socket(stream_filter, sock))
+    
+    def stream_dispatch(self, writer):
+        """Coroutine streaming /api/stream on an asyncio-mode connection, or None
+        
+        Claims every request do_GET / do_POST would route to handle_stream_api,
+        which needs a detachable socket that only threaded mode has.
+        """
+        if self.command not in ('GET', 'POST') or not self.path.startswith('/api/'):
+            return None
+        if self.find_api_handler(self.path[5:]) != self.handle_stream_api:
+            return None
+        return self.serve_stream(writer)
+    
+    async def serve_stream(self, writer):
+        stream_filter = self.start_stream()
+        preamble = self.wfile.getvalue()
+        if stream_filter is None:
+            writer.write(preamble)
+            await writer.drain()
+            return
+        await STREAM_HUB.serve(stream_filter, writer, preamble)
+    
+    def handle_realtime_snapshot(self, api_path):
+        """Answer a polled GTFS-RT feed from the latest in-memory snapshot"""
+        snapshot = REALTIME_FEEDS.snapshot(realtime_feed_key(api_path))
+        body = snapshot.body
+        
+        index = snapshot.indexes.get('vehicles')
+        delta = snapshot.indexes.get('deltas')
+        if index is not None:
+            try:
+                spatial = self.spatial_query()
+                since = self.query_params().get('since', [None])[0]
+                since = int(since) if since is not None else None
+                if since is not None and spatial is not None:
+                    raise ValueError("since cannot be combined with bbox or radius")
+            except ValueError as e:
+                self.send_json({'success': False, 'error': f"Invalid vehicle query: {e}", 'data': []}, 400)
+                return
+            if spatial is not None:
+                body = index.encode(snapshot.feed['header'], index.query(spatial))
+            elif since is not None and delta is not None:
+                # Only vehicles added, moved or removed since the client's version
+                body = delta.encode(since)
+        
+        self.send_json_body(body, headers=(('X-Feed-Version', str(snapshot.version)),
+                                           ('X-Feed-Source', snapshot.source)),
+                            cacheable=body is snapshot.body)
+    
+    async def handle_swiftly_api(self, api_path):
         """Handle Swiftly API requests"""
         try:
             print(f"🚇 Handling Swiftly API: {api_path}")
             
+            spatial = None
+            if 'vehicle-positions' in api_path:
+                try:
+                    spatial = self.spatial_query()
+                except ValueError as e:
+                    self.send_json({'success': False, 'error': f"Invalid vehicle query: {e}", 'data': []}, 400)
+                    return
+            
             # Extract the path after 'swiftly/'
             swiftly_path = api_path.replace('swiftly/', '')
             
@@ -212,37 +1011,27 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
             
             print(f"📤 Making request to: {url}")
             
-            with urllib.request.urlopen(req, context=ssl.create_default_context(), timeout=10) as response:
-                data = response.read()
-                content_type = response.headers.get('Content-Type', 'application/json')
+            response = await PROXY_ENGINE.fetch(req, ttl=cache_ttl(api_path))
+            data = response.read()
+            content_type = response.headers.get('Content-Type', 'application/json')
+            
+            print(f"✅ Swiftly API response: {len(data)} bytes")
+            
+            # Check if this is a real-time endpoint that returns protobuf
+            if 'gtfs-rt' in api_path:
+                # Real-time endpoints return GTFS-RT protobuf; decode it to JSON
+                json_data = self.decode_realtime_feed(api_path, response)
                 
-                print(f"✅ Swiftly API response: {len(data)} bytes")
-                
-                # Check if this is a real-time endpoint that returns protobuf
-                if 'gtfs-rt' in api_path:
-                    # For real-time data, always return mock data in JSON format
-                    # because the real API returns protobuf which causes parsing errors
-                    print("🔄 Real-time endpoint detected - returning mock JSON data")
-                    mock_data = self.generate_realtime_mock_data(api_path)
-                    json_data = json.dumps(mock_data).encode('utf-8')
-                    
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-                    self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-                    self.end_headers()
-                    self.wfile.write(json_data)
-                else:
-                    # For regular API calls, return as-is
-                    self.send_response(200)
-                    self.send_header('Content-Type', content_type)
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-                    self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-                    self.end_headers()
-                    self.wfile.write(data)
+                if spatial is not None:
+                    feed = json.loads(json_data)
+                    index = VehicleIndex(feed.get('entity', []))
+                    json_data = index.encode(feed.get('header', {}), index.query(spatial))
                 
+                self.send_json_body(json_data, cacheable=spatial is None and cache_ttl(api_path) > 0)
+            else:
+                # For regular API calls, return as-is
+                self.send_json_body(data, cacheable=cache_ttl(api_path) > 0, content_type=content_type)
+            
         except HTTPError as e:
             print(f"❌ Swiftly API HTTP Error: {e.code} - {e.reason}")
             # Return mock data instead of error
@@ -256,7 +1045,38 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
             # Return mock data instead of error
             self.handle_swiftly_mock_data(api_path)
     
-    def generate_realtime_mock_data(self, api_path):
+    def decode_realtime_feed(self, api_path, response):
+        """Convert a GTFS-RT upstream response to the JSON body sent to clients
+        
+        The encoded JSON is kept on the (cached) upstream response, so cache
+        hits do not decode the feed again. Falls back to mock data if the
+        payload cannot be decoded.
+        """
+        if response.decoded is not None:
+            return response.decoded
+        
+        data = response.read()
+        if not looks_like_protobuf(data, response.headers.get('Content-Type', '')):
+            # Upstream already answered in JSON
+            response.decoded = data
+            return data
+        
+        feed_key = api_path.split('?', 1)[0]
+        decoder = GTFS_RT_DECODERS.get(feed_key)
+        if decoder is None:
+            decoder = GTFS_RT_DECODERS[feed_key] = FeedDecoder()
+        try:
+            feed = decoder.decode(data)
+        except DecodeError as e:
+            print(f"❌ GTFS-RT decode error ({e}) - returning mock JSON data")
+            return json.dumps(self.generate_realtime_mock_data(api_path)).encode('utf-8')
+        
+        print(f"🔄 Decoded GTFS-RT feed: {len(feed['entity'])} entities")
+        response.decoded = json.dumps(feed).encode('utf-8')
+        return response.decoded
+    
+    @staticmethod
+    def generate_realtime_mock_data(api_path):
         """Generate mock real-time data for GTFS-RT endpoints"""
         import time
         import random
@@ -348,6 +1168,34 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
                     } for i in range(1, 6)
                 ]
             }
+        elif 'alerts' in api_path:
+            # Mock service alerts on a couple of LA Metro routes
+            la_alerts = [
+                {"route": "66", "effect": "DETOUR", "cause": "CONSTRUCTION",
+                 "text": "Line 66 detoured around 8th St due to construction"},
+                {"route": "206", "effect": "SIGNIFICANT_DELAYS", "cause": "TRAFFIC",
+                 "text": "Line 206 running up to 15 minutes late"}
+            ]
+            
+            return {
+                "header": {
+                    "gtfs_realtime_version": "2.0",
+                    "timestamp": current_time,
+                    "incrementality": "FULL_DATASET"
+                },
+                "entity": [
+                    {
+                        "id": f"alert_{i}",
+                        "alert": {
+                            "active_period": [{"start": current_time - 3600, "end": current_time + 7200}],
+                            "informed_entity": [{"agency_id": "LACMTA", "route_id": alert["route"]}],
+                            "cause": alert["cause"],
+                            "effect": alert["effect"],
+                            "header_text": {"translation": [{"text": alert["text"], "language": "en"}]}
+                        }
+                    } for i, alert in enumerate(la_alerts, 1)
+                ]
+            }
         else:
             return {"error": "Unknown real-time endpoint"}
 
@@ -411,19 +1259,13 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
                 ]
             }
             
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-            self.end_headers()
-            self.wfile.write(json.dumps(mock_data).encode())
+            self.send_json(mock_data)
             
         except Exception as e:
             print(f"❌ Swiftly Mock Data Error: {e}")
             self.send_error(500, f"Mock data error: {str(e)}")
     
-    def handle_weather_api(self, api_path):
+    async def handle_weather_api(self, api_path):
         """Handle WeatherMap API requests"""
         try:
             print(f"🌤️ Handling WeatherMap API: {api_path}")
@@ -447,21 +1289,15 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
             
             print(f"📤 Making request to: {url}")
             
-            with urllib.request.urlopen(req, context=ssl.create_default_context(), timeout=10) as response:
-                data = response.read()
-                content_type = response.headers.get('Content-Type', 'application/json')
-                
-                print(f"✅ WeatherMap API response: {len(data)} bytes")
-                
-                # Send response
-                self.send_response(200)
-                self.send_header('Content-Type', content_type)
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-                self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-                self.end_headers()
-                self.wfile.write(data)
-                
+            response = await PROXY_ENGINE.fetch(req, ttl=cache_ttl(api_path))
+            data = response.read()
+            content_type = response.headers.get('Content-Type', 'application/json')
+            
+            print(f"✅ WeatherMap API response: {len(data)} bytes")
+            
+            # Send response
+            self.send_json_body(data, cacheable=cache_ttl(api_path) > 0, content_type=content_type)
+            
         except HTTPError as e:
             print(f"❌ WeatherMap API HTTP Error: {e.code} - {e.reason}")
             # Return mock data instead of error
@@ -524,19 +1360,13 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
                 "cod": 200
             }
             
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-            self.end_headers()
-            self.wfile.write(json.dumps(mock_data).encode())
+            self.send_json(mock_data)
             
         except Exception as e:
             print(f"❌ WeatherMap Mock Data Error: {e}")
             self.send_error(500, f"Mock data error: {str(e)}")
     
-    def handle_tomtom_api(self, api_path):
+    async def handle_tomtom_api(self, api_path):
         """Handle TomTom Traffic API requests"""
         try:
             print(f"🚦 Handling TomTom Traffic API: {api_path}")
@@ -560,21 +1390,15 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
             
             print(f"📤 Making request to: {url}")
             
-            with urllib.request.urlopen(req, context=ssl.create_default_context(), timeout=10) as response:
-                data = response.read()
-                content_type = response.headers.get('Content-Type', 'application/json')
-                
-                print(f"✅ TomTom Traffic API response: {len(data)} bytes")
-                
-                # Send response
-                self.send_response(200)
-                self.send_header('Content-Type', content_type)
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-                self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-                self.end_headers()
-                self.wfile.write(data)
-                
+            response = await PROXY_ENGINE.fetch(req, ttl=cache_ttl(api_path))
+            data = response.read()
+            content_type = response.headers.get('Content-Type', 'application/json')
+            
+            print(f"✅ TomTom Traffic API response: {len(data)} bytes")
+            
+            # Send response
+            self.send_json_body(data, cacheable=cache_ttl(api_path) > 0, content_type=content_type)
+            
         except HTTPError as e:
             print(f"❌ TomTom Traffic API HTTP Error: {e.code} - {e.reason}")
             # Return mock data instead of error
@@ -588,7 +1412,7 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
             # Return mock data instead of error
             self.handle_tomtom_mock_data(api_path)
     
-    def handle_ticketmaster_api(self, api_path):
+    async def handle_ticketmaster_api(self, api_path):
         """Handle Ticketmaster Discovery API requests"""
         try:
             print(f"🎟️ Handling Ticketmaster API: {api_path}")
@@ -629,89 +1453,84 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
             
             print(f"📤 Making request to Ticketmaster API...")
             
-            with urllib.request.urlopen(req, context=ssl.create_default_context(), timeout=10) as response:
-                data = response.read()
-                ticketmaster_data = json.loads(data.decode('utf-8'))
-                
-                all_events = ticketmaster_data.get('_embedded', {}).get('events', [])
+            response = await PROXY_ENGINE.fetch(req, ttl=cache_ttl(api_path))
+            data = response.read()
+            ticketmaster_data = json.loads(data.decode('utf-8'))
+            
+            all_events = ticketmaster_data.get('_embedded', {}).get('events', [])
+            
+            # Filter to only show today's events
+            today_str = datetime.datetime.now().strftime('%Y-%m-%d')
+            events = []
+            for event in all_events:
+                start_date = event.get('dates', {}).get('start', {})
+                event_date = start_date.get('localDate', '')
+                if event_date == today_str:
+                    events.append(event)
+            
+            if events:
+                print(f"✅ Ticketmaster API success: {len(events)} events found for today (filtered from {len(all_events)} total)")
                 
-                # Filter to only show today's events
-                today_str = datetime.datetime.now().strftime('%Y-%m-%d')
-                events = []
-                for event in all_events:
+                # Format response for frontend
+                formatted_events = []
+                for event in events:
+                    # Extract event details
+                    event_name = event.get('name', 'Event')
+                    event_url = event.get('url', '')
+                    
+                    # Get venue information
+                    venues = event.get('_embedded', {}).get('venues', [])
+                    venue = venues[0] if venues else {}
+                    
+                    # Build address
+                    address_lines = []
+                    if venue.get('address', {}).get('line1'):
+                        address_lines.append(venue.get('address', {}).get('line1'))
+                    if venue.get('city', {}).get('name'):
+                        address_lines.append(venue.get('city', {}).get('name'))
+                    if venue.get('state', {}).get('name'):
+                        address_lines.append(venue.get('state', {}).get('name'))
+                    if venue.get('postalCode'):
+                        address_lines.append(venue.get('postalCode'))
+                    
+                    full_address = ', '.join(address_lines) if address_lines else venue.get('name', '')
+                    
+                    # Get start date/time
                     start_date = event.get('dates', {}).get('start', {})
-                    event_date = start_date.get('localDate', '')
-                    if event_date == today_str:
-                        events.append(event)
-                
-                if events:
-                    print(f"✅ Ticketmaster API success: {len(events)} events found for today (filtered from {len(all_events)} total)")
+                    start_local = start_date.get('localDate', '')
+                    if start_date.get('localTime'):
+                        start_local += ' ' + start_date.get('localTime')
                     
-                    # Format response for frontend
-                    formatted_events = []
-                    for event in events:
-                        # Extract event details
-                        event_name = event.get('name', 'Event')
-                        event_url = event.get('url', '')
-                        
-                        # Get venue information
-                        venues = event.get('_embedded', {}).get('venues', [])
-                        venue = venues[0] if venues else {}
-                        
-                        # Build address
-                        address_lines = []
-                        if venue.get('address', {}).get('line1'):
-                            address_lines.append(venue.get('address', {}).get('line1'))
-                        if venue.get('city', {}).get('name'):
-                            address_lines.append(venue.get('city', {}).get('name'))
-                        if venue.get('state', {}).get('name'):
-                            address_lines.append(venue.get('state', {}).get('name'))
-                        if venue.get('postalCode'):
-                            address_lines.append(venue.get('postalCode'))
-                        
-                        full_address = ', '.join(address_lines) if address_lines else venue.get('name', '')
-                        
-                        # Get start date/time
-                        start_date = event.get('dates', {}).get('start', {})
-                        start_local = start_date.get('localDate', '')
-                        if start_date.get('localTime'):
-                            start_local += ' ' + start_date.get('localTime')
-                        
-                        formatted_events.append({
-                            'name': event_name,
-                            'venue': {
-                                'name': venue.get('name', ''),
-                                'address': {
-                                    'localized_address_display': full_address,
-                                    'address_1': venue.get('address', {}).get('line1', ''),
-                                    'city': venue.get('city', {}).get('name', ''),
-                                    'region': venue.get('state', {}).get('name', '')
-                                },
-                                'latitude': venue.get('location', {}).get('latitude'),
-                                'longitude': venue.get('location', {}).get('longitude')
-                            },
-                            'start': {
-                                'local': start_local,
-                                'utc': start_date.get('dateTime', '')
+                    formatted_events.append({
+                        'name': event_name,
+                        'venue': {
+                            'name': venue.get('name', ''),
+                            'address': {
+                                'localized_address_display': full_address,
+                                'address_1': venue.get('address', {}).get('line1', ''),
+                                'city': venue.get('city', {}).get('name', ''),
+                                'region': venue.get('state', {}).get('name', '')
                             },
-                            'url': event_url,
-                            'description': event.get('info', '') or event.get('description', '')
-                        })
-                    
-                    response_data = {'events': formatted_events}
-                else:
-                    print(f"ℹ️ No events found")
-                    response_data = {'events': []}
-                
-                # Send response
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-                self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-                self.end_headers()
-                self.wfile.write(json.dumps(response_data).encode('utf-8'))
+                            'latitude': venue.get('location', {}).get('latitude'),
+                            'longitude': venue.get('location', {}).get('longitude')
+                        },
+                        'start': {
+                            'local': start_local,
+                            'utc': start_date.get('dateTime', '')
+                        },
+                        'url': event_url,
+                        'description': event.get('info', '') or event.get('description', '')
+                    })
                 
+                await self.add_venue_transit(lat, lng, formatted_events)
+                response_data = {'events': formatted_events}
+            else:
+                print(f"ℹ️ No events found")
+                response_data = {'events': []}
+            
+            # Send response
+            self.send_json(response_data)
+            
         except HTTPError as e:
             error_data = e.read().decode('utf-8') if hasattr(e, 'read') else str(e)
             print(f"❌ Ticketmaster API HTTP Error: {e.code} - {error_data}")
@@ -723,6 +1542,38 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
             print(f"❌ Ticketmaster API Error: {e}")
             self.send_error(500, f"Ticketmaster API Error: {str(e)}")
     
+    async def add_venue_transit(self, lat, lng, events):
+        """Attach nearest stops and a transit ETA from lat/lng to each event venue, in one batch
+
+        Best effort: if the lookup fails the events are left without `transit`.
+        """
+        if SCHEDULE_STORE.schedule is None:
+            return
+        try:
+            origin = (float(lat), float(lng))
+        except ValueError:
+            return
+        located = []
+        for event in events:
+            try:
+                located.append((event, (float(event['venue']['latitude']), float(event['venue']['longitude']))))
+            except (TypeError, ValueError):
+                continue
+        if not located:
+            return
+        started = time.perf_counter()
+        try:
+            # CPU-bound search; keep it off the event loop shared with upstream fetches
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, VENUE_TRANSIT.enrich, origin, [venue for _, venue in located], time.time(), ARRIVALS.overlay)
+        except Exception as e:
+            # Best effort: the events still go out, just without a transit object
+            print(f"⚠️  Venue transit failed, sending events without it: {e}")
+            return
+        for (event, _), transit in zip(located, results):
+            event['transit'] = transit
+        print(f"🚏 Venue transit for {len(located)} events in {(time.perf_counter() - started) * 1000:.1f} ms")
+    
     def handle_tomtom_mock_data(self, api_path):
         """Handle TomTom Traffic API requests with mock data when real API fails"""
         try:
@@ -766,18 +1617,61 @@ class ComprehensiveLATransitHandler(http.server.SimpleHTTPRequestHandler):
                 }
             }
             
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
-            self.end_headers()
-            self.wfile.write(json.dumps(mock_data).encode())
+            self.send_json(mock_data)
             
         except Exception as e:
             print(f"❌ TomTom Traffic Mock Data Error: {e}")
             self.send_error(500, f"Mock data error: {str(e)}")
 
+def build_realtime_feeds():
+    """Register background pollers for the Swiftly vehicle-positions, trip-updates and alerts feeds"""
+    # Without a key every poll would be rejected upstream; publish mock ticks instead
+    live = SWIFTLY_API_KEY != 'YOUR_SWIFTLY_API_KEY_HERE'
+    headers = {
+        'Authorization': SWIFTLY_API_KEY,
+        'Accept': 'application/x-protobuf, application/json',
+        'User-Agent': 'LA-Transit-App/1.0'
+    }
+    for feed in ('vehicle-positions', 'trip-updates', 'alerts'):
+        path = f"{SWIFTLY_AGENCY}/gtfs-rt-{feed}"
+        REALTIME_FEEDS.add(path, FeedPoller(
+            name=f"Swiftly {feed}",
+            url=f"{SWIFTLY_BASE_URL}/real-time/{path}",
+            headers=headers,
+            fallback=lambda path=path: ComprehensiveLATransitHandler.generate_realtime_mock_data(path),
+            live=live
+        ))
+    
+    # Viewport / proximity queries on vehicle-positions use a grid rebuilt every tick,
+    # and polling clients can ask for only the vehicles that changed (?since=<version>)
+    vehicle_positions = REALTIME_FEEDS.get(f"{SWIFTLY_AGENCY}/gtfs-rt-vehicle-positions")
+    vehicle_positions.add_builder(
+        'vehicles', lambda snapshot: VehicleIndex(snapshot.entities, snapshot.entity_bodies))
+    vehicle_positions.add_builder('deltas', VehicleDeltaLog().record)
+    
+    # Predictions join the static schedule with each tick; only changed trip updates are re-parsed
+    trip_updates = REALTIME_FEEDS.get(f"{SWIFTLY_AGENCY}/gtfs-rt-trip-updates")
+    vehicle_positions.add_builder('arrivals', ARRIVALS.apply_vehicle_positions)
+    trip_updates.add_builder('arrivals', ARRIVALS.apply_trip_updates)
+    
+    STREAM_HUB.attach({
+        'vehicles': vehicle_positions,
+        'trips': trip_updates,
+        'alerts': REALTIME_FEEDS.get(f"{SWIFTLY_AGENCY}/gtfs-rt-alerts"),
+    })
+
+def load_static_schedule():
+    """Map the compiled schedule snapshot, building it from the GTFS zip when needed"""
+    try:
+        schedule = SCHEDULE_STORE.load()
+    except (OSError, GTFSError, SnapshotError, ValueError) as e:
+        print(f"❌ Static schedule load error: {e}")
+        return
+    if schedule is None:
+        print(f"⚠️  No static GTFS feed at {SCHEDULE_STORE.gtfs_path} - schedule endpoints disabled")
+        return
+    print(f"🗓️  Loaded {schedule} in {SCHEDULE_STORE.loaded_in * 1000:.0f} ms")
+
 def main():
     PORT = 8002  # Match the port your frontend is expecting
     
@@ -796,12 +1690,32 @@ def main():
     print(f"   • Swiftly API: http://localhost:{PORT}/api/swiftly/real-time/lametro/gtfs-rt-vehicle-positions")
     print(f"   • WeatherMap API: http://localhost:{PORT}/api/weather/weather?q=Los Angeles")
     print(f"   • TomTom Traffic API: http://localhost:{PORT}/api/tomtom/incidentDetails/s3/34.0522,-118.2437/10/2/true/true/true/true/true/true/true")
+    print(f"   • Transit stops: http://localhost:{PORT}/api/transit/stops?lat={DEFAULT_LAT}&lon={DEFAULT_LON}")
+    print(f"   • Arrival predictions: http://localhost:{PORT}/api/transit/predictions?route=66&stop_name=Union Station")
+    print(f"   • Journey planner: http://localhost:{PORT}/api/plan?from=34.0562,-118.2365&to=34.0407,-118.2468")
+    print(f"   • Live vehicles: http://localhost:{PORT}/api/transit/vehicles?route=66")
+    print(f"   • Upstream stats: http://localhost:{PORT}/api/stats")
+    print(f"   • Realtime stream (SSE): http://localhost:{PORT}/api/stream?route=66")
     print()
     print("🌐 Your app can now make requests to all APIs via this server!")
     print("🔄 Press Ctrl+C to stop the server")
     
-    with socketserver.TCPServer(("", PORT), ComprehensiveLATransitHandler) as httpd:
-        print(f"\n✅ Server started successfully on port {PORT}")
+    if SERVER_MODE == 'asyncio':
+        httpd = AsyncHTTPServer(("", PORT), ComprehensiveLATransitHandler, engine=PROXY_ENGINE)
+    else:
+        httpd = PooledTCPServer(("", PORT), ComprehensiveLATransitHandler)
+        PROXY_ENGINE.start()
+    
+    load_static_schedule()
+    PROXY_ENGINE.submit(SCHEDULE_STORE.watch())
+    build_realtime_feeds()
+    REALTIME_FEEDS.start(PROXY_ENGINE)
+    
+    with httpd:
+        print(f"\n✅ Server started successfully on port {PORT} ({SERVER_MODE} mode)")
+        print(f"🧵 Worker pool: {httpd.workers} threads, backlog {httpd.backlog}")
+        if SERVER_MODE != 'asyncio':
+            print(f"⏳ Upstream waits: at most {httpd.upstream_waits} workers blocked on upstream calls")
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
@@ -5,7 +5,6 @@ Handles static files and API requests for the LA Transit application
 """
 
 import http.server
-import socketserver
 import json
 import urllib.request
 import urllib.parse
@@ -16,6 +15,8 @@ from datetime import datetime
 import time
 import sys
 
+from server_pool import PooledTCPServer
+
 # Configuration
 PORT = 8000
 SWIFTLY_API_BASE_URL = "https://api.goswift.ly"
@@ -463,8 +464,9 @@ def main():
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
     # Create the server
-    with socketserver.TCPServer(("", PORT), EnhancedLATransitHandler) as httpd:
+    with PooledTCPServer(("", PORT), EnhancedLATransitHandler) as httpd:
         print(f"\n🚇 Enhanced LA Transit Server starting on port {PORT}")
+        print(f"🧵 Worker pool: {httpd.workers} threads, backlog {httpd.backlog}")
         print(f"📁 Serving files from: {os.getcwd()}")
         print(f"🌐 Open your browser to: http://localhost:{PORT}")
         print(f"🤖 Enhanced chatbot: http://localhost:{PORT}/enhanced-chatbot-test.html")
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Forward geocoding with a persistent normalized-query cache
+Queries are normalized (case, punctuation, spacing, street-type spellings and
+a trailing "Los Angeles, CA") so "123 S. Main St." and "123 south main street"
+share one entry. Answers live in an in-memory LRU in front of a local SQLite
+table, so warm lookups never leave the process and a restart keeps what was
+learned. Misses go to a pluggable upstream: anything with an async
+search(query, limit) returning place records; NominatimUpstream by default.
+"""
+
+import asyncio
+import collections
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import urllib.parse
+import urllib.request
+
+GEOCODE_URL = os.getenv('GEOCODE_URL', 'https://nominatim.openstreetmap.org')
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH', 'geocode_cache.sqlite3')
+GEOCODE_CACHE_TTL = float(os.getenv('GEOCODE_CACHE_TTL', str(30 * 86400)))  # places rarely move
+GEOCODE_NEGATIVE_TTL = float(os.getenv('GEOCODE_NEGATIVE_TTL', '86400'))  # queries with no match
+GEOCODE_MEMORY_ENTRIES = int(os.getenv('GEOCODE_MEMORY_ENTRIES', '10000'))
+GEOCODE_MIN_INTERVAL = float(os.getenv('GEOCODE_MIN_INTERVAL', '1.0'))  # Nominatim usage policy: 1 request/s
+GEOCODE_VIEWBOX = os.getenv('GEOCODE_VIEWBOX', '-118.95,34.35,-117.65,33.65')  # LA County, preferred not bounded
+GEOCODE_REGION = 'Los Angeles, CA'  # appended to every upstream query
+MAX_GEOCODE_RESULTS = 5  # fetched and cached per query; requests take a prefix
+
+# Spellings folded onto one form; applied per word after punctuation is removed
+ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'av': 'ave', 'boulevard': 'blvd', 'drive': 'dr', 'road': 'rd',
+    'place': 'pl', 'court': 'ct', 'lane': 'ln', 'parkway': 'pkwy', 'highway': 'hwy', 'terrace': 'ter',
+    'square': 'sq', 'circle': 'cir', 'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+    'mount': 'mt', 'saint': 'st', 'fort': 'ft', 'and': '&',
+}
+REGION_SUFFIXES = ('los angeles ca usa', 'los angeles ca', 'los angeles california', 'los angeles',
+                   'la ca usa', 'la ca', 'ca usa', 'ca')
+
+
+def _words(query):
+    text = unicodedata.normalize('NFKC', query or '').casefold()
+    return re.findall(r'[\w&#]+', re.sub(r"[’'`]", '', text))
+
+
+def _strip_region(text):
+    """(text without a trailing region such as 'los angeles ca', whether it had one)"""
+    for suffix in REGION_SUFFIXES:
+        if text.endswith(' ' + suffix):
+            return text[:-len(suffix) - 1], True
+    return text, False
+
+
+def normalize_query(query):
+    """Cache key for a free-form place query: ' 123 S. Main Street, Los Angeles, CA' -> '123 s main st'
+
+    Lossy on purpose (Saint and Street both become 'st'); only the cache sees
+    it, upstream searches get the query as the user typed it.
+    """
+    return _strip_region(' '.join(ABBREVIATIONS.get(word, word) for word in _words(query)))[0]
+
+
+class NominatimUpstream:
+    """Nominatim /search client on a fetch coroutine (ProxyEngine.fetch), one request per min_interval"""
+
+    name = 'nominatim'
+
+    def __init__(self, fetch, base_url=None, min_interval=None):
+        self.fetch = fetch
+        self.base_url = (base_url or GEOCODE_URL).rstrip('/')
+        self.min_interval = GEOCODE_MIN_INTERVAL if min_interval is None else min_interval
+        self._next_slot = 0.0
+
+    async def search(self, query, limit):
+        """[{display_name, latitude, longitude, category, type}] best match first"""
+        if not _strip_region(' '.join(_words(query)))[1]:
+            query = f"{query}, {GEOCODE_REGION}"
+        params = urllib.parse.urlencode({
+            'format': 'jsonv2', 'q': query, 'limit': limit,
+            'countrycodes': 'us', 'viewbox': GEOCODE_VIEWBOX, 'bounded': 0,
+        })
+        req = urllib.request.Request(f"{self.base_url}/search?{params}")
+        req.add_header('User-Agent', 'LA-Transit-App/1.0')
+        # Space calls out on the loop clock; a burst of misses queues rather than getting blocked upstream
+        now = asyncio.get_running_loop().time()
+        slot, self._next_slot = max(now, self._next_slot), max(now, self._next_slot) + self.min_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        response = await self.fetch(req)
+        places = json.loads(response.read().decode('utf-8'))
+        return [{
+            'display_name': place.get('display_name', ''),
+            'latitude': float(place['lat']),
+            'longitude': float(place['lon']),
+            'category': place.get('category', place.get('class', '')),
+            'type': place.get('type', ''),
+        } for place in places if 'lat' in place and 'lon' in place]
+
+
+class GeocodeCache:
+    """Normalized query -> place records: an in-memory LRU over a SQLite table
+
+    One connection is shared by all threads behind a lock. recall() only
+    looks in memory and is safe on the event loop; load() and put() touch
+    the database and belong in an executor.
+    """
+
+    def __init__(self, path=None, memory_entries=None):
+        self.path = path or GEOCODE_CACHE_PATH
+        self.memory_entries = memory_entries or GEOCODE_MEMORY_ENTRIES
+        self._memory = collections.OrderedDict()  # key -> (expires, places)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS geocode ('
+                         'query TEXT PRIMARY KEY, places TEXT NOT NULL, expires REAL NOT NULL)')
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.warm()
+
+    def warm(self):
+        """Load the most recent unexpired rows into memory (called at startup)"""
+        with self._lock:
+            rows = self._db.execute('SELECT query, places, expires FROM geocode WHERE expires > ? '
+                                    'ORDER BY expires DESC LIMIT ?', (time.time(), self.memory_entries)).fetchall()
+            for query, places, expires in reversed(rows):
+                self._memory[query] = (expires, json.loads(places))
+        if rows:
+            print(f"📍 Loaded {len(rows)} cached geocodes from {self.path}")
+
+    def recall(self, key):
+        """Unexpired places for a normalized query from memory, or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return entry[1]
+
+    def load(self, key):
+        """Unexpired places for a normalized query from the database (kept in memory after), or None"""
+        with self._lock:
+            row = self._db.execute('SELECT places, expires FROM geocode WHERE query = ?', (key,)).fetchone()
+            if row is None or row[1] <= time.time():
+                self.misses += 1
+                return None
+            places = json.loads(row[0])
+            self._remember(key, row[1], places)
+            self.disk_hits += 1
+            return places
+
+    def put(self, key, places, ttl):
+        expires = time.time() + ttl
+        with self._lock:
+            self._remember(key, expires, places)
+            self._db.execute('INSERT OR REPLACE INTO geocode (query, places, expires) VALUES (?, ?, ?)',
+                             (key, json.dumps(places), expires))
+
+    def _remember(self, key, expires, places):
+        self._memory[key] = (expires, places)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            rows = self._db.execute('SELECT COUNT(*) FROM geocode').fetchone()[0]
+        return {
+            'path': self.path,
+            'memory_entries': len(self._memory),
+            'disk_entries': rows,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+        }
+
+
+class Geocoder:
+    """Cached forward geocoding over an upstream with an async search(query, limit)"""
+
+    def __init__(self, upstream, cache=None, ttl=None, negative_ttl=None):
+        self.upstream = upstream
+        self.cache = cache if cache is not None else GeocodeCache()
+        self.ttl = ttl or GEOCODE_CACHE_TTL
+        self.negative_ttl = negative_ttl or GEOCODE_NEGATIVE_TTL
+        self.upstream_calls = 0
+        self._pending = {}  # key -> future of the disk lookup / upstream search in flight
+
+    async def geocode(self, query, limit=1):
+        """(places, source) for a free-form query; source is 'memory', 'disk' or the upstream's name
+
+        Raises ValueError for a query with nothing left after normalizing, and
+        whatever the upstream raises (nothing is cached for a failed search).
+        """
+        key = normalize_query(query)
+        if not key:
+            raise ValueError("query is empty")
+        places = self.cache.recall(key)
+        if places is not None:
+            return places[:limit], 'memory'
+        places, source = await self._resolve(key, query.strip())
+        return places[:limit], source
+
+    async def _resolve(self, key, query):
+        """(places, source) for a memory miss; concurrent misses for one key share the work"""
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[key] = future
+        try:
+            # SQLite reads and writes (and the WAL fsync) stay off the loop
+            places, source = await loop.run_in_executor(None, self.cache.load, key), 'disk'
+            if places is None:
+                self.upstream_calls += 1
+                places, source = await self.upstream.search(query, MAX_GEOCODE_RESULTS), self.upstream.name
+                await loop.run_in_executor(None, self.cache.put, key, places,
+                                           self.ttl if places else self.negative_ttl)
+            future.set_result((places, source))
+            return places, source
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:  # also UpstreamBusy, which waiters must see too
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't log it as never retrieved
+            raise
+        finally:
+            del self._pending[key]
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats.update({'upstream': getattr(self.upstream, 'name', type(self.upstream).__name__),
+                      'upstream_calls': self.upstream_calls})
+        return stats
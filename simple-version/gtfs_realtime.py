@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+GTFS-Realtime FeedMessage decoder (no protobuf dependency)
+Decodes the protobuf wire format of vehicle positions, trip updates and
+service alerts into the JSON shape the app clients already read
+(proto field names, e.g. entity[].trip_update.stop_time_update[]).
+
+Benchmark against a recorded feed (optionally followed by the next poll):
+    python gtfs_realtime.py feed.pb [next-feed.pb] [--repeat 50]
+or against a synthetic feed of N vehicles:
+    python gtfs_realtime.py --synthetic 2000
+"""
+
+import json
+import struct
+import sys
+import time
+
+_unpack_float = struct.Struct('<f').unpack_from
+_unpack_double = struct.Struct('<d').unpack_from
+_pack_float = struct.Struct('<f').pack
+_pack_double = struct.Struct('<d').pack
+
+
+class DecodeError(ValueError):
+    """Raised when a payload is not a valid GTFS-RT protobuf message"""
+
+
+# Enum value names from gtfs-realtime.proto
+INCREMENTALITY = {0: 'FULL_DATASET', 1: 'DIFFERENTIAL'}
+TRIP_SCHEDULE_RELATIONSHIP = {0: 'SCHEDULED', 1: 'ADDED', 2: 'UNSCHEDULED', 3: 'CANCELED',
+                              5: 'REPLACEMENT', 6: 'DUPLICATED', 7: 'DELETED'}
+STOP_SCHEDULE_RELATIONSHIP = {0: 'SCHEDULED', 1: 'SKIPPED', 2: 'NO_DATA', 3: 'UNSCHEDULED'}
+VEHICLE_STOP_STATUS = {0: 'INCOMING_AT', 1: 'STOPPED_AT', 2: 'IN_TRANSIT_TO'}
+CONGESTION_LEVEL = {0: 'UNKNOWN_CONGESTION_LEVEL', 1: 'RUNNING_SMOOTHLY', 2: 'STOP_AND_GO',
+                    3: 'CONGESTION', 4: 'SEVERE_CONGESTION'}
+OCCUPANCY_STATUS = {0: 'EMPTY', 1: 'MANY_SEATS_AVAILABLE', 2: 'FEW_SEATS_AVAILABLE',
+                    3: 'STANDING_ROOM_ONLY', 4: 'CRUSHED_STANDING_ROOM_ONLY', 5: 'FULL',
+                    6: 'NOT_ACCEPTING_PASSENGERS', 7: 'NO_DATA_AVAILABLE', 8: 'NOT_BOARDABLE'}
+ALERT_CAUSE = {1: 'UNKNOWN_CAUSE', 2: 'OTHER_CAUSE', 3: 'TECHNICAL_PROBLEM', 4: 'STRIKE',
+               5: 'DEMONSTRATION', 6: 'ACCIDENT', 7: 'HOLIDAY', 8: 'WEATHER', 9: 'MAINTENANCE',
+               10: 'CONSTRUCTION', 11: 'POLICE_ACTIVITY', 12: 'MEDICAL_EMERGENCY'}
+ALERT_EFFECT = {1: 'NO_SERVICE', 2: 'REDUCED_SERVICE', 3: 'SIGNIFICANT_DELAYS', 4: 'DETOUR',
+                5: 'ADDITIONAL_SERVICE', 6: 'MODIFIED_SERVICE', 7: 'OTHER_EFFECT',
+                8: 'UNKNOWN_EFFECT', 9: 'STOP_MOVED', 10: 'NO_EFFECT', 11: 'ACCESSIBILITY_ISSUE'}
+SEVERITY_LEVEL = {1: 'UNKNOWN_SEVERITY', 2: 'INFO', 3: 'WARNING', 4: 'SEVERE'}
+WHEELCHAIR_ACCESSIBLE = {0: 'NO_VALUE', 1: 'UNKNOWN', 2: 'WHEELCHAIR_ACCESSIBLE',
+                         3: 'WHEELCHAIR_INACCESSIBLE'}
+
+# Field kinds
+STRING, UINT, INT, BOOL, ENUM, FLOAT, DOUBLE, MESSAGE = range(8)
+# Wire type each kind is encoded with, indexed by kind
+KIND_WIRE_TYPES = (2, 0, 0, 0, 0, 5, 1, 2)
+
+# Message schemas: field number -> (name, kind, enum names or sub-schema, repeated)
+TRANSLATION = {
+    1: ('text', STRING, None, False),
+    2: ('language', STRING, None, False),
+}
+TRANSLATED_STRING = {
+    1: ('translation', MESSAGE, TRANSLATION, True),
+}
+TRIP_DESCRIPTOR = {
+    1: ('trip_id', STRING, None, False),
+    2: ('start_time', STRING, None, False),
+    3: ('start_date', STRING, None, False),
+    4: ('schedule_relationship', ENUM, TRIP_SCHEDULE_RELATIONSHIP, False),
+    5: ('route_id', STRING, None, False),
+    6: ('direction_id', UINT, None, False),
+}
+VEHICLE_DESCRIPTOR = {
+    1: ('id', STRING, None, False),
+    2: ('label', STRING, None, False),
+    3: ('license_plate', STRING, None, False),
+    4: ('wheelchair_accessible', ENUM, WHEELCHAIR_ACCESSIBLE, False),
+}
+POSITION = {
+    1: ('latitude', FLOAT, None, False),
+    2: ('longitude', FLOAT, None, False),
+    3: ('bearing', FLOAT, None, False),
+    4: ('odometer', DOUBLE, None, False),
+    5: ('speed', FLOAT, None, False),
+}
+VEHICLE_POSITION = {
+    1: ('trip', MESSAGE, TRIP_DESCRIPTOR, False),
+    2: ('position', MESSAGE, POSITION, False),
+    3: ('current_stop_sequence', UINT, None, False),
+    4: ('current_status', ENUM, VEHICLE_STOP_STATUS, False),
+    5: ('timestamp', UINT, None, False),
+    6: ('congestion_level', ENUM, CONGESTION_LEVEL, False),
+    7: ('stop_id', STRING, None, False),
+    8: ('vehicle', MESSAGE, VEHICLE_DESCRIPTOR, False),
+    9: ('occupancy_status', ENUM, OCCUPANCY_STATUS, False),
+    10: ('occupancy_percentage', UINT, None, False),
+}
+STOP_TIME_EVENT = {
+    1: ('delay', INT, None, False),
+    2: ('time', INT, None, False),
+    3: ('uncertainty', INT, None, False),
+    4: ('scheduled_time', INT, None, False),
+}
+STOP_TIME_UPDATE = {
+    1: ('stop_sequence', UINT, None, False),
+    2: ('arrival', MESSAGE, STOP_TIME_EVENT, False),
+    3: ('departure', MESSAGE, STOP_TIME_EVENT, False),
+    4: ('stop_id', STRING, None, False),
+    5: ('schedule_relationship', ENUM, STOP_SCHEDULE_RELATIONSHIP, False),
+    7: ('departure_occupancy_status', ENUM, OCCUPANCY_STATUS, False),
+}
+TRIP_UPDATE = {
+    1: ('trip', MESSAGE, TRIP_DESCRIPTOR, False),
+    2: ('stop_time_update', MESSAGE, STOP_TIME_UPDATE, True),
+    3: ('vehicle', MESSAGE, VEHICLE_DESCRIPTOR, False),
+    4: ('timestamp', UINT, None, False),
+    5: ('delay', INT, None, False),
+}
+TIME_RANGE = {
+    1: ('start', UINT, None, False),
+    2: ('end', UINT, None, False),
+}
+ENTITY_SELECTOR = {
+    1: ('agency_id', STRING, None, False),
+    2: ('route_id', STRING, None, False),
+    3: ('route_type', INT, None, False),
+    4: ('trip', MESSAGE, TRIP_DESCRIPTOR, False),
+    5: ('stop_id', STRING, None, False),
+    6: ('direction_id', UINT, None, False),
+}
+ALERT = {
+    1: ('active_period', MESSAGE, TIME_RANGE, True),
+    5: ('informed_entity', MESSAGE, ENTITY_SELECTOR, True),
+    6: ('cause', ENUM, ALERT_CAUSE, False),
+    7: ('effect', ENUM, ALERT_EFFECT, False),
+    8: ('url', MESSAGE, TRANSLATED_STRING, False),
+    10: ('header_text', MESSAGE, TRANSLATED_STRING, False),
+    11: ('description_text', MESSAGE, TRANSLATED_STRING, False),
+    12: ('tts_header_text', MESSAGE, TRANSLATED_STRING, False),
+    13: ('tts_description_text', MESSAGE, TRANSLATED_STRING, False),
+    14: ('severity_level', ENUM, SEVERITY_LEVEL, False),
+}
+FEED_ENTITY = {
+    1: ('id', STRING, None, False),
+    2: ('is_deleted', BOOL, None, False),
+    3: ('trip_update', MESSAGE, TRIP_UPDATE, False),
+    4: ('vehicle', MESSAGE, VEHICLE_POSITION, False),
+    5: ('alert', MESSAGE, ALERT, False),
+}
+FEED_HEADER = {
+    1: ('gtfs_realtime_version', STRING, None, False),
+    2: ('incrementality', ENUM, INCREMENTALITY, False),
+    3: ('timestamp', UINT, None, False),
+}
+FEED_MESSAGE = {
+    1: ('header', MESSAGE, FEED_HEADER, False),
+    2: ('entity', MESSAGE, FEED_ENTITY, True),
+}
+
+
+def _decode_message(buf, pos, end, schema):
+    """Decode one message from buf[pos:end] using a schema table"""
+    message = {}
+    while pos < end:
+        # Field tag (varint); GTFS-RT tags are almost always one byte
+        tag = buf[pos]
+        pos += 1
+        if tag & 0x80:
+            tag &= 0x7f
+            shift = 7
+            while True:
+                byte = buf[pos]
+                pos += 1
+                tag |= (byte & 0x7f) << shift
+                if not byte & 0x80:
+                    break
+                shift += 7
+        wire_type = tag & 7
+
+        if wire_type == 0 or wire_type == 2:
+            value = buf[pos]
+            pos += 1
+            if value & 0x80:
+                value &= 0x7f
+                shift = 7
+                while True:
+                    byte = buf[pos]
+                    pos += 1
+                    value |= (byte & 0x7f) << shift
+                    if not byte & 0x80:
+                        break
+                    shift += 7
+            if wire_type == 2:
+                start = pos
+                pos += value
+                if pos > end:
+                    raise DecodeError("Length-delimited field runs past end of message")
+        elif wire_type == 5 or wire_type == 1:
+            start = pos
+            pos += 4 if wire_type == 5 else 8
+            if pos > end:
+                raise DecodeError("Fixed-width field runs past end of message")
+        else:
+            raise DecodeError(f"Unsupported wire type {wire_type}")
+
+        spec = schema.get(tag >> 3)
+        if spec is None:
+            continue  # unknown or extension field
+        name, kind, arg, repeated = spec
+        if wire_type != KIND_WIRE_TYPES[kind]:
+            raise DecodeError(f"Field {name} has wire type {wire_type}, expected {KIND_WIRE_TYPES[kind]}")
+
+        if kind == MESSAGE:
+            value = _decode_message(buf, start, pos, arg)
+        elif kind == STRING:
+            value = buf[start:pos].decode('utf-8', 'replace')
+        elif kind == FLOAT:
+            value = round(_unpack_float(buf, start)[0], 6)
+        elif kind == DOUBLE:
+            value = _unpack_double(buf, start)[0]
+        elif kind == ENUM:
+            value = arg.get(value, value)
+        elif kind == INT:
+            if value >= 1 << 63:
+                value -= 1 << 64
+        elif kind == BOOL:
+            value = bool(value)
+
+        if repeated:
+            items = message.get(name)
+            if items is None:
+                message[name] = [value]
+            else:
+                items.append(value)
+        else:
+            message[name] = value
+    if pos != end:
+        raise DecodeError("Truncated protobuf message")
+    return message
+
+
+def _read_varint(buf, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+class FeedDecoder:
+    """Stateful FeedMessage decoder for a feed that is polled repeatedly
+
+    Between polls most entities are byte-for-byte identical (a vehicle only
+    changes when its next AVL ping arrives), so entities whose serialized
+    bytes match the previous feed reuse the previously decoded dict instead
+    of being decoded again. Decoded entities are shared between feeds and
+    must be treated as read-only.
+    """
+
+    def __init__(self, reuse_entities=True):
+        self.reuse_entities = reuse_entities
+        self._previous = {}
+        self.decoded = 0
+        self.reused = 0
+
+    def decode(self, data):
+        """Decode a serialized GTFS-RT FeedMessage into a JSON-ready dict"""
+        if not data:
+            raise DecodeError("Empty feed")
+        buf = data if isinstance(data, bytes) else bytes(data)
+        previous = self._previous
+        current = {}
+        header = None
+        entities = []
+        pos = 0
+        end = len(buf)
+        try:
+            while pos < end:
+                tag, pos = _read_varint(buf, pos)
+                wire_type = tag & 7
+                if wire_type != 2:
+                    # FeedMessage has no scalar fields; skip unknown ones
+                    if wire_type == 0:
+                        _, pos = _read_varint(buf, pos)
+                    elif wire_type in (1, 5):
+                        pos += 8 if wire_type == 1 else 4
+                        if pos > end:
+                            raise DecodeError("Fixed-width field runs past end of message")
+                    else:
+                        raise DecodeError(f"Unsupported wire type {wire_type}")
+                    continue
+                length, pos = _read_varint(buf, pos)
+                start = pos
+                pos += length
+                if pos > end:
+                    raise DecodeError("Length-delimited field runs past end of message")
+                number = tag >> 3
+                if number == 2:
+                    raw = buf[start:pos] if self.reuse_entities else None
+                    entity = previous.get(raw) if raw is not None else None
+                    if entity is None:
+                        entity = _decode_message(buf, start, pos, FEED_ENTITY)
+                        self.decoded += 1
+                    else:
+                        self.reused += 1
+                    if raw is not None:
+                        current[raw] = entity
+                    entities.append(entity)
+                elif number == 1:
+                    header = _decode_message(buf, start, pos, FEED_HEADER)
+        except IndexError:
+            raise DecodeError("Truncated protobuf message") from None
+        if header is None:
+            raise DecodeError("FeedMessage has no header")
+        header.setdefault('incrementality', 'FULL_DATASET')
+        self._previous = current
+        return {'header': header, 'entity': entities}
+
+
+def decode_feed(data):
+    """Decode a serialized GTFS-RT FeedMessage into a JSON-ready dict"""
+    return FeedDecoder(reuse_entities=False).decode(data)
+
+
+def looks_like_protobuf(data, content_type=''):
+    """True when an upstream payload should be decoded rather than passed through"""
+    if 'json' in content_type.lower():
+        return False
+    stripped = data[:1]
+    # A FeedMessage starts with field 1 (header), length-delimited: tag byte 0x0a
+    return stripped == b'\x0a'
+
+
+# --- Encoding (used to build synthetic feeds for benchmarks and local testing) ---
+
+def _encode_varint(value):
+    if value < 0:
+        value += 1 << 64
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _encode_message(message, schema):
+    by_name = {spec[0]: (number, spec) for number, spec in schema.items()}
+    out = bytearray()
+    for name, value in message.items():
+        if name not in by_name:
+            continue
+        number, (_, kind, arg, repeated) = by_name[name]
+        for item in (value if repeated else [value]):
+            if kind == MESSAGE:
+                payload = _encode_message(item, arg)
+                out += _encode_varint(number << 3 | 2) + _encode_varint(len(payload)) + payload
+            elif kind == STRING:
+                payload = str(item).encode('utf-8')
+                out += _encode_varint(number << 3 | 2) + _encode_varint(len(payload)) + payload
+            elif kind == FLOAT:
+                out += _encode_varint(number << 3 | 5) + _pack_float(item)
+            elif kind == DOUBLE:
+                out += _encode_varint(number << 3 | 1) + _pack_double(item)
+            else:
+                if kind == ENUM and isinstance(item, str):
+                    item = {v: k for k, v in arg.items()}[item]
+                out += _encode_varint(number << 3) + _encode_varint(int(item))
+    return bytes(out)
+
+
+def encode_feed(feed):
+    """Serialize a FeedMessage dict (the decode_feed() shape) to protobuf bytes"""
+    return _encode_message(feed, FEED_MESSAGE)
+
+
+def synthetic_vehicle_feed(count, timestamp=None):
+    """Build a vehicle-positions feed with count buses spread around downtown LA"""
+    timestamp = timestamp or int(time.time())
+    entities = []
+    for i in range(count):
+        entities.append({
+            'id': f'vehicle_{i}',
+            'vehicle': {
+                'trip': {'trip_id': f'trip_{i}', 'route_id': str(2 + i % 300),
+                         'start_date': time.strftime('%Y%m%d'), 'direction_id': i % 2},
+                'position': {'latitude': 33.7 + (i % 97) * 0.007, 'longitude': -118.6 + (i % 89) * 0.008,
+                             'bearing': float(i % 360), 'speed': float(i % 20)},
+                'current_stop_sequence': i % 40,
+                'current_status': 'IN_TRANSIT_TO',
+                'timestamp': timestamp - i % 60,
+                'stop_id': str(1000 + i % 13000),
+                'vehicle': {'id': str(3000 + i), 'label': str(3000 + i)},
+            },
+        })
+    return {'header': {'gtfs_realtime_version': '2.0', 'incrementality': 'FULL_DATASET',
+                       'timestamp': timestamp}, 'entity': entities}
+
+
+def main(argv):
+    repeat = 50
+    if '--repeat' in argv:
+        repeat = int(argv[argv.index('--repeat') + 1])
+    if '--synthetic' in argv:
+        count = int(argv[argv.index('--synthetic') + 1])
+        feed = synthetic_vehicle_feed(count)
+        data = encode_feed(feed)
+        # Next poll: every fourth vehicle has reported a new position
+        for entity in feed['entity'][::4]:
+            entity['vehicle']['timestamp'] += 30
+        next_data = encode_feed(feed)
+        source = f"synthetic feed ({count} vehicles)"
+    elif len(argv) > 1 and not argv[1].startswith('--'):
+        with open(argv[1], 'rb') as f:
+            data = f.read()
+        next_data = argv[2:3] and not argv[2].startswith('--') and open(argv[2], 'rb').read() or data
+        source = argv[1]
+    else:
+        print(__doc__)
+        return 1
+
+    feed = decode_feed(data)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        decode_feed(data)
+    full = (time.perf_counter() - started) / repeat
+
+    decoder = FeedDecoder()
+    decoder.decode(data)
+    started = time.perf_counter()
+    for i in range(repeat):
+        decoder.decode(next_data if i % 2 == 0 else data)
+    incremental = (time.perf_counter() - started) / repeat
+
+    print(f"📦 {source}: {len(data):,} bytes protobuf, {len(feed['entity']):,} entities")
+    print(f"⏱️  full decode: {full * 1000:.2f} ms/feed (avg of {repeat})")
+    print(f"⏱️  repeated poll decode: {incremental * 1000:.2f} ms/feed "
+          f"({decoder.reused:,} entities reused, {decoder.decoded:,} decoded)")
+    print(f"🧾 JSON size: {len(json.dumps(feed)):,} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+"""
+Static GTFS schedule loader for the LA Transit server
+Streams stops.txt, routes.txt, trips.txt, stop_times.txt and the service
+calendar out of a GTFS zip into array-backed columns. String IDs are interned into integer indexes once,
+so the multi-million-row stop_times table is five int32 columns instead of a
+dict per row.
+
+Usage: python gtfs_static.py gtfs.zip [--compare]
+       python gtfs_static.py --synthetic out.zip [--trips N]
+"""
+
+import csv
+import io
+import os
+import random
+import sys
+import time
+import zipfile
+from array import array
+
+from transfer_graph import build_transfer_graph
+
+GTFS_STATIC_PATH = os.getenv('GTFS_STATIC_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gtfs_static.zip'))
+
+NO_TIME = -1  # stop time left blank in the feed (non-timepoint) before interpolation
+DEFAULT_TIMEZONE = os.getenv('TRANSIT_TIMEZONE', 'America/Los_Angeles')  # when agency.txt has none
+
+WEEKDAY_COLUMNS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+SERVICE_ADDED, SERVICE_REMOVED = 1, 2  # calendar_dates exception_type
+
+
+class GTFSError(ValueError):
+    """Raised when a GTFS feed is missing required files or columns"""
+
+
+class StringPool:
+    """Interns string IDs to dense integer indexes"""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.index = {value: i for i, value in enumerate(self.values)}
+
+    def intern(self, value):
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+    def get(self, value, default=None):
+        return self.index.get(value, default)
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def __len__(self):
+        return len(self.values)
+
+
+def parse_time(value):
+    """'HH:MM:SS' (hours may exceed 23) to seconds after midnight; NO_TIME when blank"""
+    value = value.strip()
+    if not value:
+        return NO_TIME
+    hours, minutes, seconds = value.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def format_time(seconds):
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def _open_table(archive, name, required=True):
+    """csv.reader over one GTFS table plus a column-name -> position map"""
+    try:
+        raw = archive.open(name)
+    except KeyError:
+        if required:
+            raise GTFSError(f"GTFS feed is missing {name}")
+        return None, {}
+    reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+    header = next(reader, [])
+    return reader, {column.strip(): i for i, column in enumerate(header)}
+
+
+def _columns(columns, name, *required, optional=()):
+    missing = [column for column in required if column not in columns]
+    if missing:
+        raise GTFSError(f"{name} is missing columns: {', '.join(missing)}")
+    return [columns[c] for c in required] + [columns.get(c) for c in optional]
+
+
+class Schedule:
+    """Columnar static GTFS tables; row i of every column in a table is one record
+
+    stop_times are ordered by (trip, stop_sequence) and trip_offsets[t]:trip_offsets[t + 1]
+    is the slice of stop_times belonging to trip t. stop_rows lists the stop_times
+    rows again grouped by stop and ordered by departure, with stop_offsets[s]:stop_offsets[s + 1]
+    covering stop s and stop_departures holding the matching departure times.
+
+    Trips sharing a stop sequence form a pattern (a RAPTOR "route"), split further so
+    no trip overtakes another: pattern_trips[pattern_trip_offsets[p]:...] is then
+    ordered by departure at every stop, and pattern_departures repeats those times
+    position-major (pattern_time_offsets[p] + position * trips + i) for plain bisects.
+    stop_pattern_refs / stop_pattern_positions
+    list, per stop, each pattern serving it and the stop's position in that pattern.
+    transfer_offsets / transfer_stops / transfer_seconds are the walking graph
+    between nearby stops (see transfer_graph).
+    """
+
+    def __init__(self):
+        self.version = None
+        self.timezones = []  # agency_timezone per agency
+        # stops
+        self.stop_ids = StringPool()
+        self.stop_names = []
+        self.stop_lats = array('d')
+        self.stop_lons = array('d')
+        self.stop_parents = array('i')  # stop index of parent_station, -1 when none
+        # routes
+        self.route_ids = StringPool()
+        self.route_short_names = []
+        self.route_long_names = []
+        self.route_types = array('i')
+        # trips
+        self.trip_ids = StringPool()
+        self.trip_routes = array('i')
+        self.trip_services = array('i')
+        self.trip_headsigns = array('i')
+        self.trip_directions = array('b')  # -1 when not given
+        self.service_ids = StringPool()
+        self.headsigns = StringPool()
+        # stop_times
+        self.st_trips = array('i')
+        self.st_stops = array('i')
+        self.st_arrivals = array('i')
+        self.st_departures = array('i')
+        self.st_sequences = array('i')
+        self.trip_offsets = array('i')
+        # departures by stop
+        self.stop_offsets = array('i')
+        self.stop_rows = array('i')
+        self.stop_departures = array('i')
+        # trip patterns
+        self.trip_patterns = array('i')
+        self.pattern_stop_offsets = array('i')
+        self.pattern_stops = array('i')
+        self.pattern_trip_offsets = array('i')
+        self.pattern_trips = array('i')
+        self.pattern_time_offsets = array('i')
+        self.pattern_departures = array('i')
+        self.stop_pattern_offsets = array('i')
+        self.stop_pattern_refs = array('i')
+        self.stop_pattern_positions = array('i')
+        # walking transfers (CSR adjacency)
+        self.transfer_offsets = array('i')
+        self.transfer_stops = array('i')
+        self.transfer_seconds = array('i')
+        # calendar.txt: weekday bitmask (Monday = bit 0) and date range as YYYYMMDD ints
+        self.cal_services = array('i')
+        self.cal_days = array('i')
+        self.cal_starts = array('i')
+        self.cal_ends = array('i')
+        # calendar_dates.txt exceptions
+        self.cd_services = array('i')
+        self.cd_dates = array('i')
+        self.cd_types = array('b')
+        self.indexes = {}  # derived lookup structures, rebuilt per schedule
+
+    def __repr__(self):
+        return (f"<Schedule {len(self.stop_ids)} stops, {len(self.route_ids)} routes, "
+                f"{len(self.trip_ids)} trips, {len(self.st_trips)} stop times>")
+
+    @property
+    def stop_count(self):
+        return len(self.stop_ids)
+
+    @property
+    def pattern_count(self):
+        return len(self.pattern_trip_offsets) - 1
+
+    def trip_stop_times(self, trip):
+        """Range of stop_time rows for a trip index"""
+        return range(self.trip_offsets[trip], self.trip_offsets[trip + 1])
+
+    @property
+    def timezone(self):
+        return self.timezones[0] if len(self.timezones) else DEFAULT_TIMEZONE
+
+    def active_services(self, day):
+        """Service indexes running on a date, or None when the feed has no calendar"""
+        if not len(self.cal_services) and not len(self.cd_services):
+            return None
+        stamp = day.year * 10000 + day.month * 100 + day.day
+        bit = 1 << day.weekday()
+        active = {self.cal_services[i] for i in range(len(self.cal_services))
+                  if self.cal_days[i] & bit and self.cal_starts[i] <= stamp <= self.cal_ends[i]}
+        for i in range(len(self.cd_services)):
+            if self.cd_dates[i] == stamp:
+                if self.cd_types[i] == SERVICE_ADDED:
+                    active.add(self.cd_services[i])
+                else:
+                    active.discard(self.cd_services[i])
+        return active
+
+    def nbytes(self):
+        """Approximate size of the numeric columns"""
+        return sum(column.itemsize * len(column) for column in self.__dict__.values()
+                   if isinstance(column, (array, memoryview)))
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'stops': len(self.stop_ids),
+            'routes': len(self.route_ids),
+            'trips': len(self.trip_ids),
+            'stop_times': len(self.st_trips),
+            'patterns': self.pattern_count,
+            'transfers': len(self.transfer_stops),
+            'column_bytes': self.nbytes(),
+        }
+
+
+def load_schedule(path=None):
+    """Load a GTFS zip into a Schedule"""
+    path = path or GTFS_STATIC_PATH
+    schedule = Schedule()
+    with zipfile.ZipFile(path) as archive:
+        _load_agency(schedule, archive)
+        _load_stops(schedule, archive)
+        _load_routes(schedule, archive)
+        _load_trips(schedule, archive)
+        _load_stop_times(schedule, archive)
+        _load_calendar(schedule, archive)
+    _build_stop_departures(schedule)
+    _build_patterns(schedule)
+    _build_transfers(schedule)
+    stat = os.stat(path)
+    schedule.version = f"{int(stat.st_mtime)}-{stat.st_size}"
+    return schedule
+
+
+def _load_agency(schedule, archive):
+    reader, columns = _open_table(archive, 'agency.txt', required=False)
+    if reader is None or 'agency_timezone' not in columns:
+        return
+    tz_col = columns['agency_timezone']
+    schedule.timezones.extend(row[tz_col] for row in reader if row)
+
+
+def _load_stops(schedule, archive):
+    reader, columns = _open_table(archive, 'stops.txt')
+    id_col, name_col, lat_col, lon_col, parent_col = _columns(
+        columns, 'stops.txt', 'stop_id', 'stop_name', 'stop_lat', 'stop_lon',
+        optional=('parent_station',))
+    parents = []
+    intern = schedule.stop_ids.intern
+    for row in reader:
+        if not row:
+            continue
+        intern(row[id_col])
+        schedule.stop_names.append(row[name_col])
+        schedule.stop_lats.append(float(row[lat_col] or 0))
+        schedule.stop_lons.append(float(row[lon_col] or 0))
+        parents.append(row[parent_col] if parent_col is not None else '')
+    # parent_station may refer to a stop listed further down
+    get = schedule.stop_ids.get
+    schedule.stop_parents.extend(get(parent, -1) if parent else -1 for parent in parents)
+
+
+def _load_routes(schedule, archive):
+    reader, columns = _open_table(archive, 'routes.txt', required=False)
+    if reader is None:
+        return
+    id_col, short_col, long_col, type_col = _columns(
+        columns, 'routes.txt', 'route_id',
+        optional=('route_short_name', 'route_long_name', 'route_type'))
+    for row in reader:
+        if not row:
+            continue
+        schedule.route_ids.intern(row[id_col])
+        schedule.route_short_names.append(row[short_col] if short_col is not None else '')
+        schedule.route_long_names.append(row[long_col] if long_col is not None else '')
+        schedule.route_types.append(int(row[type_col] or 3) if type_col is not None else 3)
+
+
+def _load_trips(schedule, archive):
+    reader, columns = _open_table(archive, 'trips.txt')
+    route_col, service_col, trip_col, headsign_col, direction_col = _columns(
+        columns, 'trips.txt', 'route_id', 'service_id', 'trip_id',
+        optional=('trip_headsign', 'direction_id'))
+    route_ids = schedule.route_ids
+    trip_intern = schedule.trip_ids.intern
+    service_intern = schedule.service_ids.intern
+    headsign_intern = schedule.headsigns.intern
+    for row in reader:
+        if not row:
+            continue
+        trip_intern(row[trip_col])
+        route = route_ids.get(row[route_col])
+        if route is None:
+            # Tolerate trips whose route is missing from routes.txt
+            route = route_ids.intern(row[route_col])
+            schedule.route_short_names.append(row[route_col])
+            schedule.route_long_names.append('')
+            schedule.route_types.append(3)
+        schedule.trip_routes.append(route)
+        schedule.trip_services.append(service_intern(row[service_col]))
+        schedule.trip_headsigns.append(headsign_intern(row[headsign_col] if headsign_col is not None else ''))
+        direction = row[direction_col] if direction_col is not None else ''
+        schedule.trip_directions.append(int(direction) if direction else -1)
+
+
+def _load_stop_times(schedule, archive):
+    reader, columns = _open_table(archive, 'stop_times.txt')
+    trip_col, arrival_col, departure_col, stop_col, sequence_col = _columns(
+        columns, 'stop_times.txt', 'trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence')
+    trip_index = schedule.trip_ids.index
+    stop_index = schedule.stop_ids.index
+    trips, stops = schedule.st_trips, schedule.st_stops
+    arrivals, departures, sequences = schedule.st_arrivals, schedule.st_departures, schedule.st_sequences
+    times = {}  # a feed has far fewer distinct time strings than rows
+
+    def seconds(value):
+        parsed = times.get(value)
+        if parsed is None:
+            parsed = times[value] = parse_time(value)
+        return parsed
+
+    ordered = True
+    last = (-1, -1)
+    skipped = 0
+    for row in reader:
+        if not row:
+            continue
+        trip = trip_index.get(row[trip_col])
+        stop = stop_index.get(row[stop_col])
+        if trip is None or stop is None:
+            skipped += 1
+            continue
+        sequence = int(row[sequence_col])
+        arrival = seconds(row[arrival_col])
+        departure = seconds(row[departure_col])
+        trips.append(trip)
+        stops.append(stop)
+        arrivals.append(arrival if arrival != NO_TIME else departure)
+        departures.append(departure if departure != NO_TIME else arrival)
+        sequences.append(sequence)
+        if ordered and (trip, sequence) < last:
+            ordered = False
+        last = (trip, sequence)
+    if skipped:
+        print(f"⚠️  Skipped {skipped} stop_times rows with unknown trip or stop")
+    if not ordered:
+        _sort_stop_times(schedule)
+    _build_trip_offsets(schedule)
+    _interpolate_times(schedule)
+
+
+def _parse_date(value):
+    return int(value.strip().replace('-', ''))
+
+
+def _load_calendar(schedule, archive):
+    service_intern = schedule.service_ids.intern
+    reader, columns = _open_table(archive, 'calendar.txt', required=False)
+    if reader is not None:
+        service_col, start_col, end_col, *day_cols = _columns(
+            columns, 'calendar.txt', 'service_id', 'start_date', 'end_date', *WEEKDAY_COLUMNS)
+        for row in reader:
+            if not row:
+                continue
+            schedule.cal_services.append(service_intern(row[service_col]))
+            schedule.cal_days.append(sum(1 << bit for bit, col in enumerate(day_cols) if row[col].strip() == '1'))
+            schedule.cal_starts.append(_parse_date(row[start_col]))
+            schedule.cal_ends.append(_parse_date(row[end_col]))
+    reader, columns = _open_table(archive, 'calendar_dates.txt', required=False)
+    if reader is not None:
+        service_col, date_col, type_col = _columns(
+            columns, 'calendar_dates.txt', 'service_id', 'date', 'exception_type')
+        for row in reader:
+            if not row:
+                continue
+            schedule.cd_services.append(service_intern(row[service_col]))
+            schedule.cd_dates.append(_parse_date(row[date_col]))
+            schedule.cd_types.append(int(row[type_col]))
+
+
+def _build_stop_departures(schedule):
+    """Group stop_times rows by stop, ordered by departure, for bisect lookups"""
+    stops, departures = schedule.st_stops, schedule.st_departures
+    if len(stops) >= 1 << 24:
+        raise GTFSError(f"{len(stops)} stop_times rows exceed the 16M rows the stop index supports")
+    # Pack (stop, departure, row) into one int per row so a plain int sort orders them
+    keys = sorted((stops[row] << 18 | departures[row]) << 24 | row
+                  for row in range(len(stops)) if departures[row] != NO_TIME)
+    counts = [0] * (len(schedule.stop_ids) + 1)
+    rows = array('i')
+    times = array('i')
+    row_mask = (1 << 24) - 1
+    time_mask = (1 << 18) - 1
+    for key in keys:
+        rows.append(key & row_mask)
+        times.append(key >> 24 & time_mask)
+        counts[(key >> 42) + 1] += 1
+    offsets = array('i', counts)
+    for s in range(1, len(offsets)):
+        offsets[s] += offsets[s - 1]
+    schedule.stop_offsets, schedule.stop_rows, schedule.stop_departures = offsets, rows, times
+
+
+def _build_patterns(schedule):
+    """Group trips into FIFO patterns over identical stop sequences"""
+    stops, departures, offsets = schedule.st_stops, schedule.st_departures, schedule.trip_offsets
+    by_sequence = {}
+    for trip in range(len(schedule.trip_ids)):
+        by_sequence.setdefault(tuple(stops[offsets[trip]:offsets[trip + 1]]), []).append(trip)
+
+    patterns = []  # (stop sequence, trips ordered by departure)
+    for sequence, trips in by_sequence.items():
+        if not sequence:
+            continue
+        trips.sort(key=lambda trip: departures[offsets[trip]])
+        groups = []
+        for trip in trips:
+            times = departures[offsets[trip]:offsets[trip + 1]]
+            # Join the first group whose latest trip this one never overtakes
+            for group in groups:
+                last = group[-1]
+                if all(a <= b for a, b in zip(departures[offsets[last]:offsets[last + 1]], times)):
+                    group.append(trip)
+                    break
+            else:
+                groups.append([trip])
+        patterns.extend((sequence, group) for group in groups)
+
+    trip_patterns = array('i', [-1]) * len(schedule.trip_ids)
+    stop_offsets, stop_list = array('i', [0]), array('i')
+    trip_offsets, trip_list = array('i', [0]), array('i')
+    time_offsets, pattern_departures = array('i'), array('i')
+    serving = [[] for _ in range(len(schedule.stop_ids))]
+    for pattern, (sequence, trips) in enumerate(patterns):
+        stop_list.extend(sequence)
+        stop_offsets.append(len(stop_list))
+        trip_list.extend(trips)
+        trip_offsets.append(len(trip_list))
+        time_offsets.append(len(pattern_departures))
+        for position in range(len(sequence)):
+            pattern_departures.extend(departures[offsets[trip] + position] for trip in trips)
+        for trip in trips:
+            trip_patterns[trip] = pattern
+        for position, stop in enumerate(sequence):
+            serving[stop].append((pattern, position))
+    refs, positions, serving_offsets = array('i'), array('i'), array('i', [0])
+    for pairs in serving:
+        for pattern, position in pairs:
+            refs.append(pattern)
+            positions.append(position)
+        serving_offsets.append(len(refs))
+
+    schedule.trip_patterns = trip_patterns
+    schedule.pattern_stop_offsets, schedule.pattern_stops = stop_offsets, stop_list
+    schedule.pattern_trip_offsets, schedule.pattern_trips = trip_offsets, trip_list
+    schedule.pattern_time_offsets, schedule.pattern_departures = time_offsets, pattern_departures
+    schedule.stop_pattern_offsets = serving_offsets
+    schedule.stop_pattern_refs, schedule.stop_pattern_positions = refs, positions
+
+
+def _build_transfers(schedule):
+    graph = build_transfer_graph(list(schedule.stop_lats), list(schedule.stop_lons))
+    schedule.transfer_offsets, schedule.transfer_stops, schedule.transfer_seconds = graph
+
+
+def _sort_stop_times(schedule):
+    """Reorder stop_times by (trip, stop_sequence) when the feed isn't grouped that way"""
+    trips, sequences = schedule.st_trips, schedule.st_sequences
+    order = sorted(range(len(trips)), key=lambda i: (trips[i], sequences[i]))
+    for name in ('st_trips', 'st_stops', 'st_arrivals', 'st_departures', 'st_sequences'):
+        column = getattr(schedule, name)
+        setattr(schedule, name, array(column.typecode, (column[i] for i in order)))
+
+
+def _build_trip_offsets(schedule):
+    """CSR offsets: stop_times of trip t are rows trip_offsets[t]:trip_offsets[t + 1]"""
+    counts = [0] * (len(schedule.trip_ids) + 1)
+    for trip in schedule.st_trips:
+        counts[trip + 1] += 1
+    offsets = array('i', counts)
+    for t in range(1, len(offsets)):
+        offsets[t] += offsets[t - 1]
+    schedule.trip_offsets = offsets
+
+
+def _interpolate_times(schedule):
+    """Fill blank non-timepoint times linearly between the surrounding timepoints of a trip"""
+    arrivals, departures, offsets = schedule.st_arrivals, schedule.st_departures, schedule.trip_offsets
+    for trip in range(len(offsets) - 1):
+        start, end = offsets[trip], offsets[trip + 1]
+        previous = None
+        for row in range(start, end):
+            if arrivals[row] == NO_TIME:
+                continue
+            if previous is not None and row - previous > 1:
+                step = (arrivals[row] - departures[previous]) / (row - previous)
+                for gap in range(previous + 1, row):
+                    arrivals[gap] = departures[gap] = int(departures[previous] + step * (gap - previous))
+            previous = row
+
+
+def synthetic_gtfs(path, stops=13000, routes=150, trips=20000, stops_per_trip=40, seed=1):
+    """Write a GTFS zip shaped like a large bus network (for benchmarks)"""
+    rng = random.Random(seed)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('agency.txt', 'agency_id,agency_name,agency_url,agency_timezone\n'
+                                       'LACMTA,Metro - Los Angeles,https://www.metro.net,America/Los_Angeles\n')
+        archive.writestr('calendar.txt', 'service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,'
+                                         'start_date,end_date\nDEC24-WEEKDAY,1,1,1,1,1,1,1,20240101,20301231\n')
+        lines = ['stop_id,stop_code,stop_name,stop_lat,stop_lon,parent_station']
+        for s in range(stops):
+            lines.append(f"{1000 + s},{1000 + s},Street {s % 900} / Avenue {s // 900},"
+                         f"{33.7 + rng.random() * 0.6:.6f},{-118.7 + rng.random() * 0.8:.6f},")
+        archive.writestr('stops.txt', '\n'.join(lines) + '\n')
+        lines = ['route_id,route_short_name,route_long_name,route_type']
+        lines += [f"{r}-13167,{r},Metro Local Line {r},3" for r in range(2, 2 + routes)]
+        archive.writestr('routes.txt', '\n'.join(lines) + '\n')
+        route_stops = [rng.sample(range(stops), stops_per_trip) for _ in range(routes)]
+        trip_lines = ['route_id,service_id,trip_id,trip_headsign,direction_id']
+        time_lines = ['trip_id,arrival_time,departure_time,stop_id,stop_sequence']
+        for t in range(trips):
+            route = t % routes
+            direction = t // routes % 2
+            sequence = route_stops[route] if direction == 0 else route_stops[route][::-1]
+            trip_id = f"{60000000 + t}-DEC24"
+            trip_lines.append(f"{2 + route}-13167,DEC24-WEEKDAY,{trip_id},Line {2 + route} {'East' if direction else 'West'},{direction}")
+            clock = 4 * 3600 + (t // routes) * 300 % (20 * 3600)
+            for i, stop in enumerate(sequence):
+                stamp = format_time(clock) if i % 4 == 0 or i == len(sequence) - 1 else ''
+                time_lines.append(f"{trip_id},{stamp},{stamp},{1000 + stop},{i + 1}")
+                clock += 90
+        archive.writestr('trips.txt', '\n'.join(trip_lines) + '\n')
+        archive.writestr('stop_times.txt', '\n'.join(time_lines) + '\n')
+
+
+def rss_megabytes():
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _load_dict_rows(path):
+    """Baseline for --compare: every stop_times row as a dict"""
+    with zipfile.ZipFile(path) as archive:
+        with archive.open('stop_times.txt') as raw:
+            return list(csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')))
+
+
+def main(argv):
+    if '--synthetic' in argv:
+        path = argv[argv.index('--synthetic') + 1]
+        trips = int(argv[argv.index('--trips') + 1]) if '--trips' in argv else 20000
+        started = time.perf_counter()
+        synthetic_gtfs(path, trips=trips)
+        print(f"📦 Wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
+        return 0
+    paths = [arg for arg in argv if not arg.startswith('--')]
+    if not paths:
+        print("Usage: python gtfs_static.py gtfs.zip [--compare] | --synthetic out.zip [--trips N]")
+        return 1
+    path = paths[0]
+
+    before = rss_megabytes()
+    started = time.perf_counter()
+    schedule = load_schedule(path)
+    elapsed = time.perf_counter() - started
+    print(f"🚌 {schedule}")
+    print(f"⏱️  Columnar load: {elapsed:.2f}s, RSS +{rss_megabytes() - before:.0f} MB "
+          f"(columns {schedule.nbytes() / 1e6:.0f} MB)")
+
+    if '--compare' in argv:
+        del schedule
+        before = rss_megabytes()
+        started = time.perf_counter()
+        rows = _load_dict_rows(path)
+        elapsed = time.perf_counter() - started
+        print(f"⏱️  Dict-per-row stop_times: {elapsed:.2f}s, RSS +{rss_megabytes() - before:.0f} MB "
+              f"({len(rows)} rows)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
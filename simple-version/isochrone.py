@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Transit isochrones: everywhere reachable within a time budget
+A one-to-all RAPTOR search from the origin gives the earliest arrival at every
+stop; whatever budget is left at a stop is spent walking, which marks the grid
+cells around it; the cells are returned as one rectangle per run along each
+grid row. Origins snap to the centre of an ISOCHRONE_CELL grid cell and
+departures to an ISOCHRONE_BUCKET window, so map-overlay requests from the
+same neighbourhood in the same few minutes share one cached, encoded response.
+"""
+
+import json
+import math
+import os
+import threading
+
+from arrivals import iso_utc
+from journey_planner import MAX_ACCESS_METERS
+from response_cache import ResponseCache
+from transfer_graph import DEGREE_METERS, WALK_DETOUR, WALK_SPEED
+
+ISOCHRONE_CELL = float(os.getenv('ISOCHRONE_CELL', '0.0025'))  # degrees, ~280 m of latitude
+ISOCHRONE_BUCKET = int(os.getenv('ISOCHRONE_BUCKET', '300'))  # seconds of departure time sharing a result
+ISOCHRONE_CACHE_TTL = float(os.getenv('ISOCHRONE_CACHE_TTL', '300'))
+ISOCHRONE_CACHE_BYTES = int(os.getenv('ISOCHRONE_CACHE_BYTES', str(16 * 1024 * 1024)))
+MAX_ISOCHRONE_MINUTES = 120
+
+
+class Isochrones:
+    """Cached isochrones over the current schedule of a ScheduleStore"""
+
+    def __init__(self, store, cell=None, bucket=None):
+        self.store = store
+        self.cell = cell or ISOCHRONE_CELL
+        self.bucket = bucket or ISOCHRONE_BUCKET
+        self.cache = ResponseCache(ISOCHRONE_CACHE_BYTES)
+        self.computed = 0
+        self._lock = threading.Lock()
+
+    def get(self, lat, lon, minutes, depart, overlay=None):
+        """(encoded JSON, cache hit) for the grid cell holding lat/lon and the bucket holding `depart`"""
+        schedule = self.store.schedule
+        row, col = math.floor(lat / self.cell), math.floor(lon / self.cell)
+        bucket = int(depart // self.bucket)
+        live_version = overlay.version if overlay is not None and overlay.schedule is schedule else None
+        key = (schedule.version, row, col, bucket, minutes, live_version)
+        body = self.cache.get(key)
+        if body is not None:
+            return body, True
+        origin = ((row + 0.5) * self.cell, (col + 0.5) * self.cell)
+        isochrone = self.compute(schedule, origin, minutes, bucket * self.bucket, overlay)
+        body = json.dumps(isochrone).encode('utf-8')
+        self.cache.put(key, body, ISOCHRONE_CACHE_TTL, len(body))
+        with self._lock:
+            self.computed += 1
+        return body, False
+
+    def compute(self, schedule, origin, minutes, depart, overlay=None):
+        """Reached stops (nearest first in time) and the walkable grid cells as a GeoJSON MultiPolygon"""
+        budget = minutes * 60
+        index = schedule.indexes['stops']
+        reached = schedule.indexes['planner'].reachable(origin, depart, budget, overlay=overlay)
+        stops = []
+        for stop, seconds in sorted(reached.items(), key=lambda item: item[1]):
+            record = index.describe(stop)
+            record['minutes'] = round(seconds / 60, 1)
+            stops.append(record)
+        walks = [(origin[0], origin[1], budget)]
+        walks.extend((index.lats[stop], index.lons[stop], budget - seconds) for stop, seconds in reached.items())
+        return {
+            'success': True,
+            'origin': {'latitude': origin[0], 'longitude': origin[1]},
+            'departure_time': iso_utc(depart),
+            'minutes': minutes,
+            'stops': stops,
+            'polygon': {'type': 'MultiPolygon', 'coordinates': self._run_polygons(self._walkable_runs(walks))},
+        }
+
+    def _walkable_runs(self, walks):
+        """{grid row: merged [(first col, last col)]} of cells whose centre is in walking reach
+
+        walks are (lat, lon, seconds left) points; each covers a disc of walkable
+        radius, sliced into one column interval per grid row it crosses.
+        """
+        cell = self.cell
+        intervals = {}
+        for lat, lon, seconds in walks:
+            meters = min(seconds * (WALK_SPEED / WALK_DETOUR), MAX_ACCESS_METERS)
+            if meters <= 0:
+                continue
+            lon_meters = DEGREE_METERS * max(math.cos(math.radians(lat)), 1e-6)
+            for row in range(math.floor((lat - meters / DEGREE_METERS) / cell - 0.5),
+                             math.ceil((lat + meters / DEGREE_METERS) / cell - 0.5) + 1):
+                dy = ((row + 0.5) * cell - lat) * DEGREE_METERS
+                if abs(dy) > meters:
+                    continue
+                half = math.sqrt(meters * meters - dy * dy) / lon_meters
+                first, last = math.ceil((lon - half) / cell - 0.5), math.floor((lon + half) / cell - 0.5)
+                if first <= last:
+                    intervals.setdefault(row, []).append((first, last))
+        runs = {}
+        for row, spans in intervals.items():
+            spans.sort()
+            merged = [list(spans[0])]
+            for first, last in spans[1:]:
+                if first <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], last)
+                else:
+                    merged.append([first, last])
+            runs[row] = merged
+        return runs
+
+    def _run_polygons(self, runs):
+        """GeoJSON MultiPolygon coordinates with one rectangle per run of cells"""
+        cell = self.cell
+        polygons = []
+        for row in sorted(runs):
+            south, north = round(row * cell, 6), round((row + 1) * cell, 6)
+            for first, last in runs[row]:
+                west, east = round(first * cell, 6), round((last + 1) * cell, 6)
+                polygons.append([[[west, south], [east, south], [east, north], [west, north], [west, south]]])
+        return polygons
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['computed'] = self.computed
+        return stats
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Round-based (RAPTOR) public transit journey planner over the static schedule
+Each round extends every journey by one more vehicle: the patterns serving the
+stops improved in the previous round are scanned once, boarding the earliest
+catchable trip, followed by walking transfers from the stops reached. After k
+rounds the arrival labels hold the earliest arrival using at most k vehicles,
+so the journeys found form a Pareto set of arrival time versus transfers.
+
+Live delays come from the arrivals DelayOverlay rather than a copy of the
+timetable. Patterns without realtime trips keep the exact bisect over their
+FIFO departures; patterns with delayed trips widen the bisect by the pattern's
+largest delay and scan the few trips that could still be the earliest.
+"""
+
+import bisect
+import datetime
+import operator
+import os
+from zoneinfo import ZoneInfo
+
+from arrivals import (EMPTY_CHUNK, EMPTY_OVERLAY, TRIP_CHUNK_BITS, TRIP_CHUNK_MASK, date_stamp, iso_utc,
+                      service_day_start)
+from transfer_graph import WALK_DETOUR, walk_seconds
+from vehicle_index import haversine_meters
+
+MAX_ACCESS_METERS = float(os.getenv('PLAN_MAX_WALK', '800'))  # walk to the first / from the last stop
+MAX_TRANSFERS = int(os.getenv('PLAN_MAX_TRANSFERS', '4'))
+TRANSFER_SLACK = 60  # seconds to allow when changing vehicles
+ACCESS_STOPS = 25  # nearest stops considered at each end of a journey
+MATRIX_MAX_MINUTES = int(os.getenv('PLAN_MATRIX_MAX_MINUTES', '120'))  # longer trips report ZERO_RESULTS
+MAX_MATRIX_POINTS = int(os.getenv('PLAN_MATRIX_MAX_POINTS', '500'))  # origins or destinations per request
+INFINITY = float('inf')
+
+TRANSIT_MODES = {0: 'TRAM', 1: 'SUBWAY', 2: 'RAIL', 3: 'BUS', 4: 'FERRY', 5: 'CABLE_CAR', 6: 'GONDOLA',
+                 7: 'FUNICULAR', 11: 'TROLLEYBUS', 12: 'MONORAIL'}
+
+
+def encode_polyline(points):
+    """Google encoded polyline for [(lat, lon)]"""
+    chunks = []
+    previous = (0, 0)
+    for lat, lon in points:
+        current = (round(lat * 1e5), round(lon * 1e5))
+        for value in (current[0] - previous[0], current[1] - previous[1]):
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        previous = current
+    return ''.join(chunks)
+
+
+def _text_distance(meters):
+    return f"{meters / 1000:.1f} km" if meters >= 1000 else f"{int(meters)} m"
+
+
+def _text_duration(seconds):
+    minutes = max(1, round(seconds / 60))
+    return f"{minutes // 60} hr {minutes % 60} min" if minutes >= 60 else f"{minutes} min"
+
+
+class JourneyPlanner:
+    """Earliest-arrival journeys between two points on one schedule"""
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.stops = schedule.indexes['stops']
+        self._running = {}  # service date -> running-trip flags
+        self.headways = self._min_headways()
+        self.last_departure = max(schedule.pattern_departures, default=0)  # latest time past a day's origin
+
+    def _min_headways(self):
+        """Smallest gap between consecutive trips at any stop of each pattern"""
+        schedule = self.schedule
+        departures, time_offsets = schedule.pattern_departures, schedule.pattern_time_offsets
+        trip_offsets, stop_offsets = schedule.pattern_trip_offsets, schedule.pattern_stop_offsets
+        headways = []
+        for pattern in range(schedule.pattern_count):
+            count = trip_offsets[pattern + 1] - trip_offsets[pattern]
+            base = time_offsets[pattern]
+            gaps = [min(map(operator.sub, departures[row + 1:row + count], departures[row:row + count - 1]))
+                    for row in range(base, base + count * (stop_offsets[pattern + 1] - stop_offsets[pattern]), count)
+                    if count > 1]
+            headways.append(min(gaps, default=INFINITY))
+        return headways
+
+    def _running_trips(self, day):
+        """bytearray flagging the trips whose service runs on a date"""
+        if day not in self._running:
+            if len(self._running) > 8:
+                self._running.clear()
+            services = self.schedule.active_services(day)
+            trip_services = self.schedule.trip_services
+            self._running[day] = bytearray(1 if services is None or trip_services[trip] in services else 0
+                                           for trip in range(len(trip_services)))
+        return self._running[day]
+
+    def access_stops(self, lat, lon):
+        """{stop: walk seconds} for the served stops near a point"""
+        serving = self.schedule.stop_pattern_offsets
+        return {stop: walk_seconds(meters)
+                for meters, stop in self.stops.nearest(lat, lon, ACCESS_STOPS, MAX_ACCESS_METERS,
+                                                       accept=lambda stop: serving[stop + 1] > serving[stop])}
+
+    def _departure(self, depart, overlay):
+        """(service day start, seconds into that day, service days, overlay) for epoch `depart`
+
+        Service days are (offset from the returned day start, running trips,
+        date stamp). Yesterday's is included while its late trips (times past
+        24:00) can still be boarded, as in ArrivalsEngine.next_arrivals, so an
+        early-morning search sees both those and today's first departures.
+        """
+        schedule = self.schedule
+        timezone = ZoneInfo(schedule.timezone)
+        today = datetime.datetime.fromtimestamp(depart, timezone).date()
+        day_start = service_day_start(today, timezone)
+        start = int(depart - day_start)
+        days = [(0, self._running_trips(today), date_stamp(today))]
+        yesterday = today - datetime.timedelta(days=1)
+        offset = service_day_start(yesterday, timezone) - day_start  # -86400 except across a DST change
+        if start - offset <= self.last_departure:
+            days.insert(0, (offset, self._running_trips(yesterday), date_stamp(yesterday)))
+        overlay = overlay if overlay is not None and overlay.schedule is schedule else EMPTY_OVERLAY
+        return day_start, start, days, overlay
+
+    def plan(self, origin, destination, depart, max_transfers=MAX_TRANSFERS, overlay=None):
+        """Pareto-optimal journeys (arrival time versus transfers) departing at epoch `depart`, fastest first
+
+        overlay is the DelayOverlay to apply; it is read once, so a feed tick
+        swapping in a new one mid-query does not mix two versions.
+        """
+        day_start, start, days, overlay = self._departure(depart, overlay)
+        access = self.access_stops(*origin)
+        egress = self.access_stops(*destination)
+        journeys = []
+        direct = haversine_meters(origin[0], origin[1], destination[0], destination[1])
+        if direct <= MAX_ACCESS_METERS * 2:
+            journeys.append([{'mode': 'WALK', 'from': None, 'to': None,
+                              'departure': start, 'arrival': start + walk_seconds(direct),
+                              'meters': direct * WALK_DETOUR}])
+        if not access or not egress:
+            return self._describe(journeys, origin, destination, day_start)
+
+        rounds = self._raptor(access, egress, start, days, max_transfers + 1, overlay)
+        best = journeys[0][-1]['arrival'] if journeys else INFINITY
+        for k, (arrivals, _) in enumerate(rounds):
+            if k == 0:
+                continue
+            target, stop = min(((arrivals[stop] + walk, stop) for stop, walk in egress.items()),
+                               default=(INFINITY, None))
+            if target < best:
+                best = target
+                journeys.append(self._reconstruct(rounds, k, stop, egress, start, days, overlay))
+        journeys.sort(key=lambda legs: legs[-1]['arrival'])
+        return self._describe(journeys, origin, destination, day_start)
+
+    def reachable(self, origin, depart, budget, max_transfers=MAX_TRANSFERS, overlay=None):
+        """{stop: seconds after `depart`} for every stop reachable from `origin` within `budget` seconds
+
+        A one-to-all search: no destination, every round pruned at the deadline.
+        """
+        _, start, days, overlay = self._departure(depart, overlay)
+        access = self.access_stops(*origin)
+        if not access:
+            return {}
+        deadline = start + budget
+        rounds = self._raptor(access, {}, start, days, max_transfers + 1, overlay, deadline)
+        arrivals = rounds[-1][0]  # each round starts from the previous one's labels
+        return {stop: arrival - start for stop, arrival in enumerate(arrivals) if arrival <= deadline}
+
+    def matrix(self, origins, destinations, depart, max_transfers=MAX_TRANSFERS, overlay=None, max_minutes=None):
+        """Distance Matrix rows of transit travel times from every origin to every destination
+
+        Egress stops are found once per destination, and each distinct origin
+        runs a single one-to-all search that serves all destinations together.
+        """
+        _, start, days, overlay = self._departure(depart, overlay)
+        deadline = start + (max_minutes or MATRIX_MAX_MINUTES) * 60
+        egresses = {}
+        for point in destinations:
+            if point not in egresses:
+                egresses[point] = self.access_stops(*point)
+        searched = {}
+        rows = []
+        for origin in origins:
+            if origin not in searched:
+                searched[origin] = self._travel_times(origin, destinations, egresses, start, days,
+                                                      max_transfers, overlay, deadline)
+            rows.append({'elements': [
+                {'status': 'OK', 'duration': {'value': arrival - start, 'text': _text_duration(arrival - start)},
+                 'transfers': transfers} if arrival <= deadline else {'status': 'ZERO_RESULTS'}
+                for arrival, transfers in searched[origin]]})
+        return rows
+
+    def _travel_times(self, origin, destinations, egresses, start, days, max_transfers, overlay, deadline):
+        """[(earliest arrival, transfers)] from one origin to each destination"""
+        times = []
+        for destination in destinations:
+            direct = haversine_meters(origin[0], origin[1], destination[0], destination[1])
+            times.append((start + walk_seconds(direct), 0) if direct <= MAX_ACCESS_METERS * 2 else (INFINITY, 0))
+        access = self.access_stops(*origin)
+        reachable = [egresses[point] for point in destinations if egresses[point]]
+        if not access or not reachable:
+            return times
+        rounds = self._raptor(access, {}, start, days, max_transfers + 1, overlay, deadline, reachable)
+        for k in range(1, len(rounds)):
+            arrivals = rounds[k][0]
+            for i, point in enumerate(destinations):
+                arrival = min([arrivals[stop] + walk for stop, walk in egresses[point].items()], default=INFINITY)
+                if arrival < times[i][0]:
+                    times[i] = (arrival, k - 1)
+        return times
+
+    def _raptor(self, access, egress, start, days, max_rounds, overlay=EMPTY_OVERLAY, deadline=INFINITY,
+                destinations=()):
+        """Per-round (arrival at every stop, labels) from `access`, times in seconds past the first day's origin
+
+        Each pattern is scanned once per service day in `days`, in that day's
+        own times (shifted by its offset), so trips of two days mix freely.
+        """
+        schedule = self.schedule
+        stop_count = len(schedule.stop_ids)
+        pattern_stop_offsets, pattern_stops = schedule.pattern_stop_offsets, schedule.pattern_stops
+        pattern_trip_offsets, pattern_trips = schedule.pattern_trip_offsets, schedule.pattern_trips
+        time_offsets, pattern_departures = schedule.pattern_time_offsets, schedule.pattern_departures
+        serving_offsets = schedule.stop_pattern_offsets
+        serving_refs, serving_positions = schedule.stop_pattern_refs, schedule.stop_pattern_positions
+        trip_offsets = schedule.trip_offsets
+        arrivals_at, departures_at = schedule.st_arrivals, schedule.st_departures
+        delayed_patterns = overlay.patterns
+        headways = self.headways
+        service_days = []
+        for offset, running, stamp in days:
+            live_trips = overlay.by_trip  # chunks of 1 << TRIP_CHUNK_BITS trips, see DelayOverlay
+            if overlay.start_dates - {None, stamp}:
+                # Some updates are for another day's run of their trip; leave those on schedule
+                live_trips = [chunk if chunk is EMPTY_CHUNK else
+                              [None if trip_delay is None or trip_delay.start_date not in (None, stamp)
+                               else trip_delay for trip_delay in chunk] for chunk in live_trips]
+            service_days.append((offset, running, live_trips))
+        transfer_offsets = schedule.transfer_offsets
+        transfer_stops, transfer_seconds = schedule.transfer_stops, schedule.transfer_seconds
+
+        best = [INFINITY] * stop_count  # earliest arrival at each stop over all rounds
+        previous = [INFINITY] * stop_count
+        labels = {}
+        for stop, walk in access.items():
+            previous[stop] = best[stop] = start + walk
+            labels[stop] = ('access', walk)
+        rounds = [(previous, labels)]
+        marked = set(access)
+        target = deadline
+
+        for k in range(1, max_rounds):
+            # Earliest marked position along each pattern
+            queue = {}
+            for stop in marked:
+                for i in range(serving_offsets[stop], serving_offsets[stop + 1]):
+                    pattern, position = serving_refs[i], serving_positions[i]
+                    if queue.get(pattern, position + 1) > position:
+                        queue[pattern] = position
+            current = list(previous)
+            labels = {}
+            marked = set()
+            slack = TRANSFER_SLACK if k > 1 else 0
+            for pattern, first in queue.items():
+                stops_base = pattern_stop_offsets[pattern]
+                length = pattern_stop_offsets[pattern + 1] - stops_base
+                low = pattern_trip_offsets[pattern]
+                count = pattern_trip_offsets[pattern + 1] - low
+                times_base = time_offsets[pattern]
+                bounds = delayed_patterns.get(pattern)  # (max late, max early) when any trip is live
+                for day, (offset, running, live_trips) in enumerate(service_days):
+                    # Trip times below are the day's own; `offset` moves them onto the search clock
+                    day_target = target - offset
+                    high = count  # trips at or past this index are never better than the boarded one
+                    trip = live_arrivals = live_departures = None
+                    trip_base = board_stop = board_position = 0
+                    departure = INFINITY
+                    for position in range(first, length):
+                        stop = pattern_stops[stops_base + position]
+                        if trip is not None:
+                            if live_arrivals is None:
+                                arrival = arrivals_at[trip_base + position] + offset
+                                departure = departures_at[trip_base + position]
+                            else:
+                                arrival = live_arrivals[position] + offset
+                                departure = live_departures[position]
+                            if arrival < best[stop] and arrival < target:
+                                current[stop] = best[stop] = arrival
+                                labels[stop] = ('transit', trip, board_stop, board_position, position, day)
+                                marked.add(stop)
+                        ready = previous[stop] + slack - offset
+                        if ready >= day_target or (trip is not None and ready > departure):
+                            continue
+                        row = times_base + position * count
+                        if bounds is None:
+                            # Schedule-only pattern: earliest running trip leaving at or after `ready`
+                            i = bisect.bisect_left(pattern_departures, ready, row, row + high) - row
+                            while i < high:
+                                candidate = pattern_trips[low + i]
+                                if running[candidate]:
+                                    trip, trip_base = candidate, trip_offsets[candidate]
+                                    board_stop, board_position = stop, position
+                                    departure = pattern_departures[row + i]
+                                    high = i
+                                    break
+                                i += 1
+                            continue
+                        late, early = bounds
+                        if late + early <= headways[pattern]:
+                            # Delays too small to reorder trips: the first running trip leaving live at or
+                            # after `ready` is the earliest, and trips past the boarded one never are
+                            i = bisect.bisect_left(pattern_departures, ready - late, row, row + high)
+                            for i in range(i, row + high):
+                                candidate = pattern_trips[low + i - row]
+                                if not running[candidate]:
+                                    continue
+                                candidate_delay = live_trips[candidate >> TRIP_CHUNK_BITS][candidate & TRIP_CHUNK_MASK]
+                                scheduled = (pattern_departures[i] if candidate_delay is None
+                                             else candidate_delay.departures[position])
+                                if ready <= scheduled < INFINITY:
+                                    trip, trip_base = candidate, trip_offsets[candidate]
+                                    live_arrivals = candidate_delay.arrivals if candidate_delay is not None else None
+                                    live_departures = (candidate_delay.departures if candidate_delay is not None
+                                                       else None)
+                                    board_stop, board_position = stop, position
+                                    departure = scheduled
+                                    high = i - row
+                                    break
+                            continue
+                        # Delays may reorder trips: any scheduled within [ready - late, earliest found + early]
+                        chosen = -1
+                        earliest = departure if trip is not None else INFINITY
+                        first_i = bisect.bisect_left(pattern_departures, ready - late, row, row + count)
+                        last_i = row + count
+                        if earliest != INFINITY:
+                            last_i = bisect.bisect_left(pattern_departures, earliest + early, first_i, last_i)
+                        for i in range(first_i, last_i):
+                            scheduled = pattern_departures[i]
+                            if scheduled - early >= earliest:
+                                break
+                            candidate = pattern_trips[low + i - row]
+                            if not running[candidate]:
+                                continue
+                            candidate_delay = live_trips[candidate >> TRIP_CHUNK_BITS][candidate & TRIP_CHUNK_MASK]
+                            if candidate_delay is not None:
+                                scheduled = candidate_delay.departures[position]
+                            if ready <= scheduled < earliest:
+                                earliest, chosen = scheduled, candidate
+                        if chosen >= 0:
+                            trip, trip_base = chosen, trip_offsets[chosen]
+                            trip_delay = live_trips[chosen >> TRIP_CHUNK_BITS][chosen & TRIP_CHUNK_MASK]
+                            live_arrivals = trip_delay.arrivals if trip_delay is not None else None
+                            live_departures = trip_delay.departures if trip_delay is not None else None
+                            board_stop, board_position = stop, position
+                            departure = earliest
+            # Walking transfers from the stops a vehicle reached this round
+            for stop in list(marked):
+                if labels[stop][0] != 'transit':
+                    continue
+                for i in range(transfer_offsets[stop], transfer_offsets[stop + 1]):
+                    other, walk = transfer_stops[i], transfer_seconds[i]
+                    arrival = current[stop] + walk
+                    if arrival < best[other] and arrival < target:
+                        current[other] = best[other] = arrival
+                        labels[other] = ('walk', stop, walk)
+                        marked.add(other)
+            rounds.append((current, labels))
+            target = min([target] + [current[stop] + walk for stop, walk in egress.items()])
+            if destinations:
+                # Past the slowest destination's best arrival nothing can improve any of them
+                target = min(target, max(min(current[stop] + walk for stop, walk in stops.items())
+                                         for stops in destinations))
+            if not marked:
+                break
+            previous = current
+        return rounds
+
+    def _reconstruct(self, rounds, k, stop, egress, start, days, overlay=EMPTY_OVERLAY):
+        """Legs (in travel order) of the round-k journey ending at `stop`"""
+        schedule = self.schedule
+        legs = [{'mode': 'WALK', 'from': stop, 'to': None,
+                 'departure': rounds[k][0][stop], 'arrival': rounds[k][0][stop] + egress[stop]}]
+        while k >= 0:
+            # The latest round that improved this stop holds its label
+            while k > 0 and stop not in rounds[k][1]:
+                k -= 1
+            label = rounds[k][1][stop]
+            kind = label[0]
+            if kind == 'access':
+                legs.append({'mode': 'WALK', 'from': None, 'to': stop, 'departure': start, 'arrival': start + label[1]})
+                break
+            if kind == 'walk':
+                _, origin_stop, walk = label
+                arrival = rounds[k][0][stop]
+                legs.append({'mode': 'WALK', 'from': origin_stop, 'to': stop,
+                             'departure': arrival - walk, 'arrival': arrival})
+                stop = origin_stop
+                continue
+            _, trip, board_stop, board_position, alight_position, day = label
+            offset, _, stamp = days[day]
+            base = schedule.trip_offsets[trip]
+            trip_delay = overlay.get(trip, stamp)
+            board_delay = trip_delay.delay_at(schedule.st_sequences[base + board_position]) if trip_delay else 0
+            alight_delay = trip_delay.delay_at(schedule.st_sequences[base + alight_position]) if trip_delay else 0
+            legs.append({'mode': 'TRANSIT', 'trip': trip, 'from': board_stop, 'to': stop,
+                         'board': board_position, 'alight': alight_position,
+                         'departure': schedule.st_departures[base + board_position] + board_delay + offset,
+                         'arrival': schedule.st_arrivals[base + alight_position] + alight_delay + offset,
+                         'delay': alight_delay, 'realtime': trip_delay is not None})
+            stop = board_stop
+            k -= 1
+        legs.reverse()
+        if len(legs) > 1 and legs[1]['mode'] == 'TRANSIT':
+            # Leave just in time for the first vehicle instead of waiting at the stop
+            walk = legs[0]['arrival'] - legs[0]['departure']
+            legs[0]['arrival'] = legs[1]['departure']
+            legs[0]['departure'] = legs[1]['departure'] - walk
+        return legs
+
+    def _location(self, stop, point):
+        if stop is None:
+            return {'lat': point[0], 'lng': point[1]}
+        return {'lat': self.stops.lats[stop], 'lng': self.stops.lons[stop]}
+
+    def _describe(self, journeys, origin, destination, day_start):
+        """Journeys as Google Directions-style routes, so existing clients can read them"""
+        schedule = self.schedule
+        timezone = schedule.timezone
+        routes = []
+        for legs in journeys:
+            steps, path, summary = [], [], []
+            total_meters = 0.0
+            for leg in legs:
+                start_point = origin if leg['from'] is None and leg is legs[0] else None
+                end_point = destination if leg['to'] is None and leg is legs[-1] else None
+                start_location = self._location(leg['from'], start_point)
+                end_location = self._location(leg['to'], end_point)
+                seconds = leg['arrival'] - leg['departure']
+                step = {
+                    'travel_mode': 'WALKING' if leg['mode'] == 'WALK' else 'TRANSIT',
+                    'start_location': start_location,
+                    'end_location': end_location,
+                    'duration': {'value': seconds, 'text': _text_duration(seconds)},
+                }
+                if leg['mode'] == 'WALK':
+                    meters = leg.get('meters') or haversine_meters(start_location['lat'], start_location['lng'],
+                                                                   end_location['lat'], end_location['lng']) * WALK_DETOUR
+                    to_name = schedule.stop_names[leg['to']] if leg['to'] is not None else 'destination'
+                    step['html_instructions'] = f"Walk to {to_name}"
+                    path.extend([(start_location['lat'], start_location['lng']),
+                                 (end_location['lat'], end_location['lng'])])
+                else:
+                    trip = leg['trip']
+                    route = schedule.trip_routes[trip]
+                    short_name = schedule.route_short_names[route] or schedule.route_ids[route]
+                    headsign = schedule.headsigns[schedule.trip_headsigns[trip]]
+                    base = schedule.trip_offsets[trip]
+                    meters = 0.0
+                    previous = None
+                    for row in range(base + leg['board'], base + leg['alight'] + 1):
+                        stop = schedule.st_stops[row]
+                        point = (self.stops.lats[stop], self.stops.lons[stop])
+                        if previous is not None:
+                            meters += haversine_meters(previous[0], previous[1], point[0], point[1])
+                        path.append(point)
+                        previous = point
+                    summary.append(short_name)
+                    step['html_instructions'] = f"{TRANSIT_MODES.get(schedule.route_types[route], 'BUS').title()} towards {headsign}"
+                    step['transit_details'] = {
+                        'line': {
+                            'short_name': short_name,
+                            'name': schedule.route_long_names[route] or short_name,
+                            'vehicle': {'type': TRANSIT_MODES.get(schedule.route_types[route], 'BUS')},
+                        },
+                        'departure_stop': {'name': schedule.stop_names[leg['from']], 'location': start_location,
+                                           'stop_id': schedule.stop_ids[leg['from']]},
+                        'arrival_stop': {'name': schedule.stop_names[leg['to']], 'location': end_location,
+                                         'stop_id': schedule.stop_ids[leg['to']]},
+                        'departure_time': self._time(day_start + leg['departure'], timezone),
+                        'arrival_time': self._time(day_start + leg['arrival'], timezone),
+                        'headsign': headsign,
+                        'num_stops': leg['alight'] - leg['board'],
+                        'trip_id': schedule.trip_ids[trip],
+                        'delay': leg['delay'],
+                        'realtime': leg['realtime'],
+                    }
+                step['distance'] = {'value': int(meters), 'text': _text_distance(meters)}
+                total_meters += meters
+                steps.append(step)
+            departure, arrival = legs[0]['departure'], legs[-1]['arrival']
+            routes.append({
+                'summary': ', '.join(summary) or 'Walk',
+                'transfers': max(0, len(summary) - 1),
+                'legs': [{
+                    'start_location': {'lat': origin[0], 'lng': origin[1]},
+                    'end_location': {'lat': destination[0], 'lng': destination[1]},
+                    'departure_time': self._time(day_start + departure, timezone),
+                    'arrival_time': self._time(day_start + arrival, timezone),
+                    'distance': {'value': int(total_meters), 'text': _text_distance(total_meters)},
+                    'duration': {'value': arrival - departure, 'text': _text_duration(arrival - departure)},
+                    'steps': steps,
+                }],
+                'overview_polyline': {'points': encode_polyline(path)},
+            })
+        return routes
+
+    @staticmethod
+    def _time(epoch, timezone):
+        local = datetime.datetime.fromtimestamp(epoch, ZoneInfo(timezone))
+        return {'value': int(epoch), 'text': local.strftime('%I:%M %p').lstrip('0'),
+                'time_zone': timezone, 'iso': iso_utc(epoch)}
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Asyncio upstream proxy engine for the LA Transit server
+Every upstream fetch runs as a non-blocking task on one shared event loop,
+so waiting on Swiftly, TomTom or WeatherMap does not tie up a thread.
+Connections are kept alive and pooled per upstream host, identical
+in-flight GETs share one upstream fetch, and successful responses can be
+cached for a caller-supplied TTL.
+"""
+
+import asyncio
+import collections
+import contextvars
+import http.client
+import io
+import math
+import os
+import ssl
+import threading
+import time
+import urllib.parse
+import urllib.request
+from urllib.error import HTTPError, URLError
+
+from response_cache import ResponseCache, normalize_url
+
+UPSTREAM_TIMEOUT = 10  # seconds, same as the old urlopen() calls
+MAX_REDIRECTS = 5
+MAX_HEADER_BYTES = 64 * 1024
+
+# Connection pool configuration (overridable from the environment)
+POOL_MAX_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', '8'))
+POOL_IDLE_TIMEOUT = float(os.getenv('UPSTREAM_IDLE_TIMEOUT', '30'))
+
+# Number of recent request durations kept per host for p50/p99 reporting
+LATENCY_SAMPLES = 1000
+
+# Callable set by the caller of a handler coroutine (threaded serving mode): fetch() asks it for the
+# right to wait on the upstream each time the answer is not cached; it returns False to refuse
+UPSTREAM_GATE = contextvars.ContextVar('upstream_gate', default=None)
+
+
+class UpstreamBusy(BaseException):
+    """fetch() refused by UPSTREAM_GATE
+
+    A BaseException, like asyncio.CancelledError, so the proxy handlers'
+    `except Exception` fallbacks (mock data, 500 pages) let it through to
+    the code that set the gate.
+    """
+
+
+class UpstreamResponse:
+    """Buffered upstream response exposing the parts of the urlopen() API the handlers use"""
+
+    def __init__(self, url, status, reason, headers, body, reusable=False):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.reusable = reusable
+        # Handler-specific transformed body (e.g. decoded GTFS-RT JSON), cached with the response
+        self.decoded = None
+
+    def read(self):
+        return self.body
+
+    def getcode(self):
+        return self.status
+
+
+class PooledConnection:
+    """One keep-alive connection to an upstream host"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        self.requests = 0
+
+    def is_healthy(self, now, idle_timeout):
+        """Cheap liveness check before reusing an idle connection"""
+        if now - self.last_used > idle_timeout:
+            return False
+        # at_eof() becomes true once the server has closed its side
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    def close(self):
+        self.writer.close()
+
+
+class HostPool:
+    """Idle connections plus a cap on concurrent connections for one host"""
+
+    def __init__(self, max_size):
+        self.idle = collections.deque()
+        self.slots = asyncio.Semaphore(max_size)
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def stats(self):
+        samples = sorted(self.latencies)
+        return {
+            'idle': len(self.idle),
+            'created': self.created,
+            'reused': self.reused,
+            'discarded': self.discarded,
+            'requests': len(samples),
+            'p50_ms': round(percentile(samples, 50) * 1000, 1) if samples else None,
+            'p99_ms': round(percentile(samples, 99) * 1000, 1) if samples else None,
+        }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, rank - 1)]
+
+
+class ProxyEngine:
+    """Runs upstream HTTP(S) requests on an asyncio event loop"""
+
+    def __init__(self, pool_size=None, idle_timeout=None, cache=None):
+        self.loop = None
+        self.cache = cache if cache is not None else ResponseCache()
+        # One SSL context for every upstream connection
+        self.ssl_context = ssl.create_default_context()
+        self.pool_size = max(1, pool_size if pool_size is not None else POOL_MAX_SIZE)
+        self.idle_timeout = idle_timeout if idle_timeout is not None else POOL_IDLE_TIMEOUT
+        self.pools = {}
+        self.inflight = {}  # normalized URL -> task shared by concurrent identical GETs
+        self.background = set()  # running background tasks such as feed pollers and streams
+        self._pending = []
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def bind(self, loop):
+        """Use an already running loop (asyncio serving mode)"""
+        self.loop = loop
+        self._submit_pending()
+
+    def start(self):
+        """Start a private event loop in a background thread (threaded serving mode)"""
+        with self._lock:
+            if self.loop is not None:
+                return self.loop
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="proxy-engine", daemon=True)
+            thread.start()
+            self.loop = loop
+        self._submit_pending()
+        return loop
+
+    def submit(self, coro):
+        """Schedule a background coroutine on the engine loop, queued until the loop exists"""
+        if self.loop is None:
+            self._pending.append(coro)
+        else:
+            future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+            self.background.add(future)
+            future.add_done_callback(self.background.discard)
+
+    def _submit_pending(self):
+        pending, self._pending = self._pending, []
+        for coro in pending:
+            self.submit(coro)
+
+    def run(self, coro):
+        """Run a coroutine on the engine loop from a worker thread and wait for its result"""
+        loop = self.loop or self.start()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def fetch_blocking(self, request, timeout=UPSTREAM_TIMEOUT, ttl=0):
+        """Blocking wrapper around fetch() for code running outside the loop"""
+        return self.run(self.fetch(request, timeout, ttl))
+
+    def stats(self):
+        """Pool and latency counters per upstream host"""
+        return {f"{host}:{port}": pool.stats() for (_, host, port), pool in list(self.pools.items())}
+
+    async def fetch(self, request, timeout=UPSTREAM_TIMEOUT, ttl=0):
+        """Fetch a urllib.request.Request (or URL string) without blocking the loop
+
+        Raises HTTPError for 4xx/5xx answers and URLError for connection
+        problems, matching urllib.request.urlopen() so callers keep their
+        existing error handling. Concurrent GETs for the same normalized URL
+        share one upstream fetch; with ttl > 0 a successful GET response is
+        also cached for that many seconds.
+        """
+        if isinstance(request, str):
+            request = urllib.request.Request(request)
+        url = request.full_url
+        method = request.get_method()
+        headers = dict(request.header_items())
+
+        if method != 'GET':
+            self._pass_gate(url)
+            return await self._fetch_with_timeout(url, method, headers, request.data, timeout)
+
+        key = normalize_url(url, method)
+        if ttl > 0:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        self._pass_gate(url)
+
+        # Single-flight: concurrent identical requests wait on one upstream fetch
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(key, url, headers, timeout, ttl))
+            self.inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_inflight(key, done))
+            leader = True
+        else:
+            self.coalesced += 1
+            leader = False
+        try:
+            # shield() keeps the shared fetch alive if one waiter is cancelled
+            return await asyncio.shield(task)
+        except HTTPError as e:
+            if leader:
+                raise
+            # Give each waiter its own readable error body
+            raise HTTPError(e.url, e.code, e.reason, e.headers, io.BytesIO(e.upstream_body)) from None
+
+    @staticmethod
+    def _pass_gate(url):
+        gate = UPSTREAM_GATE.get()
+        if gate is not None and not gate():
+            raise UpstreamBusy(url)
+
+    async def _fetch_and_store(self, key, url, headers, timeout, ttl):
+        response = await self._fetch_with_timeout(url, 'GET', headers, None, timeout)
+        if ttl > 0:
+            self.cache.put(key, response, ttl, len(response.body))
+        return response
+
+    def _finish_inflight(self, key, task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every waiter went away
+
+    async def _fetch_with_timeout(self, url, method, headers, body, timeout):
+        try:
+            return await asyncio.wait_for(self._fetch(url, method, headers, body), timeout)
+        except (HTTPError, URLError):
+            raise
+        except asyncio.TimeoutError:
+            raise URLError('timed out')
+        except (OSError, ssl.SSLError, asyncio.IncompleteReadError, ValueError) as e:
+            raise URLError(e)
+
+    async def _fetch(self, url, method, headers, body):
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._exchange(url, method, headers, body)
+            location = response.headers.get('Location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                url = urllib.parse.urljoin(url, location)
+                if response.status == 303:
+                    method, body = 'GET', None
+                continue
+            if response.status >= 400:
+                error = HTTPError(url, response.status, response.reason, response.headers,
+                                  io.BytesIO(response.body))
+                error.upstream_body = response.body
+                raise error
+            return response
+        raise URLError(f"Too many redirects for {url}")
+
+    async def _exchange(self, url, method, headers, body):
+        parts = urllib.parse.urlsplit(url)
+        secure = parts.scheme == 'https'
+        key = (parts.scheme, parts.hostname, parts.port or (443 if secure else 80))
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = HostPool(self.pool_size)
+        payload = self._build_request(parts, method, headers, body)
+
+        async with pool.slots:
+            started = time.monotonic()
+            conn, reused = await self._checkout(pool, key)
+            try:
+                response = await self._send(conn, url, method, payload)
+            except (ConnectionError, asyncio.IncompleteReadError, URLError):
+                conn.close()
+                if not reused:
+                    raise
+                # The server dropped an idle connection; retry once on a fresh one
+                pool.discarded += 1
+                conn, reused = await self._connect(pool, key), False
+                try:
+                    response = await self._send(conn, url, method, payload)
+                except BaseException:
+                    conn.close()
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+            pool.latencies.append(time.monotonic() - started)
+
+            if response.reusable:
+                conn.last_used = time.monotonic()
+                pool.idle.append(conn)
+            else:
+                conn.close()
+            return response
+
+    async def _checkout(self, pool, key):
+        """Reuse the most recently used healthy idle connection or open a new one"""
+        now = time.monotonic()
+        while pool.idle:
+            conn = pool.idle.pop()
+            if conn.is_healthy(now, self.idle_timeout):
+                pool.reused += 1
+                return conn, True
+            pool.discarded += 1
+            conn.close()
+        return await self._connect(pool, key), False
+
+    async def _connect(self, pool, key):
+        scheme, host, port = key
+        secure = scheme == 'https'
+        reader, writer = await asyncio.open_connection(
+            host, port,
+            ssl=self.ssl_context if secure else None,
+            server_hostname=host if secure else None,
+        )
+        pool.created += 1
+        return PooledConnection(reader, writer)
+
+    async def _send(self, conn, url, method, payload):
+        conn.requests += 1
+        conn.writer.write(payload)
+        await conn.writer.drain()
+        return await self._read_response(url, method, conn.reader)
+
+    def _build_request(self, parts, method, headers, body):
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}"]
+        names = {name.lower() for name in headers}
+        for name, value in headers.items():
+            lines.append(f"{name}: {value}")
+        if 'accept-encoding' not in names:
+            lines.append("Accept-Encoding: identity")
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+        return head + body if body else head
+
+    async def _read_response(self, url, method, reader):
+        status_line = (await reader.readline()).decode('latin-1').rstrip('\r\n')
+        if not status_line:
+            raise ConnectionResetError("Upstream closed the connection")
+        version, _, rest = status_line.partition(' ')
+        code, _, reason = rest.partition(' ')
+        if not version.startswith('HTTP/') or not code.isdigit():
+            raise URLError(f"Bad status line from upstream: {status_line!r}")
+        status = int(code)
+        header_lines = []
+        header_bytes = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            header_bytes += len(line)
+            if header_bytes > MAX_HEADER_BYTES:
+                raise URLError("Upstream response headers too large")
+            header_lines.append(line)
+        headers = http.client.parse_headers(io.BytesIO(b"".join(header_lines) + b"\r\n"))
+
+        # Only a delimited HTTP/1.1 body leaves the connection reusable
+        reusable = version == 'HTTP/1.1' and 'close' not in headers.get('Connection', '').lower()
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            body = await self._read_chunked(reader)
+        elif headers.get('Content-Length') is not None:
+            body = await reader.readexactly(int(headers['Content-Length']))
+        else:
+            body = await reader.read()
+            reusable = False
+        return UpstreamResponse(url, status, reason, headers, body, reusable)
+
+    async def _read_chunked(self, reader):
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+            if size == 0:
+                # Skip optional trailers up to the terminating blank line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
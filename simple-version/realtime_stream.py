@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Server-Sent Events push stream for realtime vehicles, trip updates and alerts
+Feed pollers publish each tick to a StreamHub, which fans it out to every
+subscriber on the engine event loop. An idle subscriber costs one coroutine
+and a small queue. Subscribers that stop reading are dropped once their queue
+fills instead of buffering without limit.
+"""
+
+import asyncio
+import collections
+import os
+
+from realtime_feed import encode_feed_body
+from vehicle_index import parse_spatial_query, spatial_contains
+
+STREAM_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', '16'))  # events buffered per subscriber before it is dropped
+STREAM_HEARTBEAT = float(os.getenv('STREAM_HEARTBEAT', '15'))  # seconds between keepalive comments
+STREAM_MAX_SUBSCRIBERS = int(os.getenv('STREAM_MAX_SUBSCRIBERS', '10000'))
+STREAM_WRITE_BUFFER = 64 * 1024  # socket send buffer high-water mark per subscriber
+STREAM_RETRY_MS = 5000  # EventSource reconnect delay suggested to clients
+
+STREAM_FEEDS = ('vehicles', 'trips', 'alerts')
+
+SSE_HEADERS = (
+    ('Content-Type', 'text/event-stream'),
+    ('Cache-Control', 'no-cache'),
+    ('X-Accel-Buffering', 'no'),
+)
+
+
+def sse_message(event, event_id, data):
+    return b''.join((b'event: ', event.encode('ascii'), b'\nid: ', str(event_id).encode('ascii'),
+                     b'\ndata: ', data, b'\n\n'))
+
+
+def entity_routes(entity):
+    """Route ids an entity refers to; an empty set means it applies system-wide"""
+    if 'vehicle' in entity:
+        route_id = ((entity['vehicle'] or {}).get('trip') or {}).get('route_id')
+        return {route_id} if route_id else set()
+    if 'trip_update' in entity:
+        route_id = ((entity['trip_update'] or {}).get('trip') or {}).get('route_id')
+        return {route_id} if route_id else set()
+    routes = set()
+    for selector in (entity.get('alert') or {}).get('informed_entity', []):
+        route_id = selector.get('route_id') or (selector.get('trip') or {}).get('route_id')
+        if route_id:
+            routes.add(route_id)
+    return routes
+
+
+class StreamFilter:
+    """What one subscriber asked for; subscribers with equal filters share encoded events"""
+
+    def __init__(self, feeds=STREAM_FEEDS, routes=None, spatial=None):
+        self.feeds = frozenset(feeds)
+        self.routes = frozenset(routes or ())
+        self.spatial = spatial
+        self.key = (self.routes, self.spatial)
+
+    @classmethod
+    def from_query(cls, query_params):
+        """Build from parse_qs output: feeds=, route= (comma separated) and bbox= or lat=&lon=&radius="""
+        feeds = query_params.get('feeds', [','.join(STREAM_FEEDS)])[0].split(',')
+        unknown = set(feeds) - set(STREAM_FEEDS)
+        if unknown:
+            raise ValueError(f"unknown feeds: {', '.join(sorted(unknown))}")
+        routes = query_params.get('route', query_params.get('route_id', ['']))[0]
+        return cls(feeds, [r for r in routes.split(',') if r], parse_spatial_query(query_params))
+
+    @property
+    def unfiltered(self):
+        return not self.routes and self.spatial is None
+
+    def matches_routes(self, entity):
+        if not self.routes:
+            return True
+        routes = entity_routes(entity)
+        return not routes or bool(routes & self.routes)
+
+    def matches_vehicle(self, entity):
+        """Route and area check; bbox / radius only narrow the vehicle feed"""
+        if self.routes and not entity_routes(entity) & self.routes:
+            return False
+        if self.spatial is None:
+            return True
+        position = (entity.get('vehicle') or {}).get('position') or {}
+        lat, lon = position.get('latitude'), position.get('longitude')
+        return lat is not None and lon is not None and spatial_contains(self.spatial, lat, lon)
+
+
+class Subscriber:
+    def __init__(self, stream_filter, queue_size):
+        self.filter = stream_filter
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.task = None
+        self.dropped = False
+
+    def send(self, message):
+        """Queue an event; False when the subscriber is too far behind"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+
+class StreamHub:
+    """Fans feed ticks out to SSE subscribers; all methods run on the engine loop"""
+
+    def __init__(self, max_subscribers=None, queue_size=None, heartbeat=None):
+        self.max_subscribers = max_subscribers if max_subscribers is not None else STREAM_MAX_SUBSCRIBERS
+        self.queue_size = queue_size if queue_size is not None else STREAM_QUEUE_SIZE
+        self.heartbeat = heartbeat if heartbeat is not None else STREAM_HEARTBEAT
+        self.subscribers = set()
+        self.snapshots = {}  # feed kind -> latest snapshot
+        self.filters = collections.Counter()  # filter key -> subscribers using it
+        self.visible = {}  # filter key -> vehicle ids its subscribers currently hold
+        self.connected = 0
+        self.dropped = 0
+        self.events = 0
+
+    def attach(self, pollers):
+        """Subscribe to feed pollers given as {kind: FeedPoller}"""
+        for kind, poller in pollers.items():
+            poller.add_listener(lambda snapshot, kind=kind: self.publish(kind, snapshot))
+
+    def is_full(self):
+        return len(self.subscribers) >= self.max_subscribers
+
+    def publish(self, kind, snapshot):
+        previous = self.snapshots.get(kind)
+        self.snapshots[kind] = snapshot
+        if kind == 'alerts' and previous is not None and previous.body == snapshot.body:
+            return  # alerts rarely change; don't resend identical lists every tick
+        encoded = {}
+        for subscriber in list(self.subscribers):
+            stream_filter = subscriber.filter
+            if kind not in stream_filter.feeds:
+                continue
+            message = encoded.get(stream_filter.key)
+            if message is None:
+                message = encoded[stream_filter.key] = self._encode_tick(kind, snapshot, stream_filter)
+            if subscriber.send(message):
+                self.events += 1
+            else:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber):
+        print(f"⚠️  Dropping slow stream subscriber ({self.queue_size} events behind)")
+        subscriber.dropped = True
+        self.dropped += 1
+        self._remove(subscriber)
+        if subscriber.task is not None:
+            subscriber.task.cancel()
+
+    def _remove(self, subscriber):
+        if subscriber not in self.subscribers:
+            return
+        self.subscribers.discard(subscriber)
+        key = subscriber.filter.key
+        self.filters[key] -= 1
+        if self.filters[key] <= 0:
+            del self.filters[key]
+            self.visible.pop(key, None)
+
+    def _encode_full(self, kind, snapshot, stream_filter):
+        """Everything in a snapshot the filter selects"""
+        header = snapshot.feed.get('header', {})
+        matches = stream_filter.matches_vehicle if kind == 'vehicles' else stream_filter.matches_routes
+        if stream_filter.unfiltered:
+            bodies = snapshot.entity_bodies
+        else:
+            bodies = [body for entity, body in zip(snapshot.entities, snapshot.entity_bodies)
+                      if matches(entity)]
+        if kind == 'vehicles':
+            self.visible[stream_filter.key] = {entity.get('id') for entity in snapshot.entities
+                                               if 'vehicle' in entity and matches(entity)}
+        return sse_message(kind, snapshot.version,
+                           encode_feed_body(header, bodies, version=snapshot.version, full=True))
+
+    def _encode_tick(self, kind, snapshot, stream_filter):
+        delta = snapshot.indexes.get('deltas')
+        if kind != 'vehicles' or delta is None or not delta.ticks or delta.ticks[-1][0] != snapshot.version:
+            return self._encode_full(kind, snapshot, stream_filter)
+        if stream_filter.unfiltered:
+            return sse_message(kind, snapshot.version, delta.encode(snapshot.version - 1))
+        # Only vehicles that changed this tick can enter or leave the filter
+        _, changed, removed = delta.ticks[-1]
+        visible = self.visible.setdefault(stream_filter.key, set())
+        updated, gone = [], []
+        for vehicle_id in changed | removed:
+            entity = delta.entities.get(vehicle_id)
+            if entity is not None and stream_filter.matches_vehicle(entity):
+                updated.append(delta.bodies[vehicle_id])
+                visible.add(vehicle_id)
+            elif vehicle_id in visible:
+                gone.append(vehicle_id)
+                visible.discard(vehicle_id)
+        data = encode_feed_body(snapshot.feed.get('header', {}), updated, version=snapshot.version,
+                                since=snapshot.version - 1, full=False, removed=sorted(gone))
+        return sse_message(kind, snapshot.version, data)
+
+    async def serve_socket(self, stream_filter, sock, preamble=b''):
+        """Stream to a socket detached from a worker thread (threaded server mode)"""
+        try:
+            _, writer = await asyncio.open_connection(sock=sock)
+        except OSError:
+            sock.close()
+            return
+        await self.serve(stream_filter, writer, preamble)
+
+    async def serve(self, stream_filter, writer, preamble=b''):
+        """Push events to one subscriber until it disconnects or falls behind"""
+        subscriber = Subscriber(stream_filter, self.queue_size)
+        subscriber.task = asyncio.current_task()
+        writer.transport.set_write_buffer_limits(high=STREAM_WRITE_BUFFER)
+        self.subscribers.add(subscriber)
+        self.filters[stream_filter.key] += 1
+        self.connected += 1
+        try:
+            writer.write(preamble + f"retry: {STREAM_RETRY_MS}\n\n".encode('ascii'))
+            for kind in STREAM_FEEDS:
+                snapshot = self.snapshots.get(kind)
+                if kind in stream_filter.feeds and snapshot is not None:
+                    subscriber.send(self._encode_full(kind, snapshot, stream_filter))
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    message = b': keepalive\n\n'  # also detects clients that went away
+                writer.write(message)
+                # Waits only while the socket buffer is over the high-water mark;
+                # meanwhile new events pile up in the queue until the subscriber is dropped
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            if not subscriber.dropped:
+                raise
+        finally:
+            self._remove(subscriber)
+            writer.close()
+
+    def stats(self):
+        return {
+            'subscribers': len(self.subscribers),
+            'distinct_filters': len(self.filters),
+            'connected_total': self.connected,
+            'dropped_slow': self.dropped,
+            'events_queued': self.events,
+            'queue_size': self.queue_size,
+        }
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+In-process TTL response cache with LRU eviction for proxied upstream APIs
+Entries expire after a per-entry TTL; once the memory cap is reached the
+least recently used entries are evicted first.
+"""
+
+import collections
+import os
+import threading
+import time
+import urllib.parse
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+# Rough per-entry bookkeeping cost added to the payload size
+ENTRY_OVERHEAD = 512
+
+
+def normalize_url(url, method='GET'):
+    """Cache key for a URL: lower-cased scheme/host, path, and sorted query parameters"""
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    path = urllib.parse.unquote(parts.path) or '/'
+    return f"{method} {parts.scheme.lower()}://{parts.netloc.lower()}{path}?{query}"
+
+
+class ResponseCache:
+    """Thread-safe TTL cache bounded by total payload size"""
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else RESPONSE_CACHE_MAX_BYTES
+        self._entries = collections.OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value, or None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.size -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl, size):
+        """Store a value for ttl seconds; values larger than the whole cache are skipped"""
+        size += ENTRY_OVERHEAD
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
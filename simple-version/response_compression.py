@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Negotiated gzip/deflate compression for JSON API responses
+Bodies at or above COMPRESS_MIN_BYTES are compressed with the client's
+preferred Accept-Encoding. Bodies that are themselves cached (feed
+snapshots, cached upstream responses, isochrones) keep their compressed
+bytes in a CompressionCache keyed by the body object, so a popular payload
+is compressed once rather than on every request.
+"""
+
+import gzip
+import os
+import threading
+import zlib
+
+from response_cache import ResponseCache
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))  # smaller bodies are not worth it
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))  # 1 (fastest) .. 9 (smallest)
+COMPRESS_CACHE_BYTES = int(os.getenv('COMPRESS_CACHE_BYTES', str(16 * 1024 * 1024)))
+COMPRESS_CACHE_TTL = float(os.getenv('COMPRESS_CACHE_TTL', '300'))
+
+CODINGS = ('gzip', 'deflate')  # in order of preference at equal quality
+
+
+def negotiate_encoding(accept_encoding):
+    """The content-coding to use for an Accept-Encoding header, or None for identity"""
+    qualities = {}
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        coding = coding.strip().lower()
+        if coding == '*':
+            for name in CODINGS:
+                qualities.setdefault(name, quality)
+        elif coding in CODINGS:
+            qualities[coding] = quality
+    best = max(CODINGS, key=lambda coding: qualities.get(coding, 0))
+    return best if qualities.get(best, 0) > 0 else None
+
+
+def compress(body, coding, level=None):
+    level = level if level is not None else COMPRESS_LEVEL
+    if coding == 'gzip':
+        return gzip.compress(body, level, mtime=0)
+    return zlib.compress(body, level)
+
+
+class CompressionCache:
+    """Compressed variants of long-lived bodies, looked up by the body object itself
+
+    Entries hold a reference to their body, so an id() cannot be reused by
+    another object while its entry is alive; each is charged for the body it
+    pins as well as the compressed bytes, so COMPRESS_CACHE_BYTES bounds both.
+    """
+
+    def __init__(self, max_bytes=None, level=None):
+        self.cache = ResponseCache(max_bytes if max_bytes is not None else COMPRESS_CACHE_BYTES)
+        self.level = level if level is not None else COMPRESS_LEVEL
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+
+    def get(self, body, coding, cacheable=False):
+        """`body` compressed with `coding`, reusing the cached bytes of a cacheable body"""
+        key = (id(body), coding)
+        if cacheable:
+            entry = self.cache.get(key)
+            if entry is not None and entry[0] is body:
+                return entry[1]
+        compressed = compress(body, coding, self.level)
+        if cacheable:
+            self.cache.put(key, (body, compressed), COMPRESS_CACHE_TTL, len(body) + len(compressed))
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(compressed)
+        return compressed
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats.update({
+            'level': self.level,
+            'min_bytes': COMPRESS_MIN_BYTES,
+            'compressed': self.compressed,
+            'ratio': round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+        })
+        return stats
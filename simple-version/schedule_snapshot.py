@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Precompiled, memory-mapped static schedule snapshots
+The build step compiles a GTFS zip into one versioned binary file holding
+every Schedule column. The server memory-maps that file at startup: numeric
+columns become zero-copy memoryviews over the shared page cache, and strings
+are decoded only when accessed. A newly published snapshot replaces the file
+atomically and the ScheduleStore swaps to it on its next check.
+
+Usage: python schedule_snapshot.py build gtfs.zip schedule.bin
+       python schedule_snapshot.py bench schedule.bin
+"""
+
+import asyncio
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from gtfs_static import GTFS_STATIC_PATH, GTFSError, Schedule, StringPool, load_schedule, rss_megabytes
+
+SCHEDULE_SNAPSHOT_PATH = os.getenv('SCHEDULE_SNAPSHOT_PATH', os.path.splitext(GTFS_STATIC_PATH)[0] + '.bin')
+SCHEDULE_RELOAD_INTERVAL = float(os.getenv('SCHEDULE_RELOAD_INTERVAL', '60'))  # seconds between file checks
+
+MAGIC = b'LATSCHED'
+FORMAT_VERSION = 4
+PREAMBLE = struct.Struct('<8sII')  # magic, format version, header length
+ALIGNMENT = 8
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is missing, truncated or from another format version"""
+
+
+class MappedStrings:
+    """Read-only string column decoded from a mapped UTF-8 blob on access"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def values(self):
+        return list(self)
+
+
+class MappedStringPool(MappedStrings):
+    """Interned IDs from a snapshot; the reverse index is built on first lookup"""
+
+    def __init__(self, blob, offsets):
+        super().__init__(blob, offsets)
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = {value: i for i, value in enumerate(self)}
+        return self._index
+
+    def get(self, value, default=None):
+        return self.index.get(value, default)
+
+    def intern(self, value):
+        raise TypeError("snapshot string pools are read-only")
+
+
+def _encode_strings(values):
+    offsets = array('i', [0])
+    chunks = []
+    total = 0
+    for value in values:
+        data = value.encode('utf-8')
+        chunks.append(data)
+        total += len(data)
+        offsets.append(total)
+    return b''.join(chunks), offsets
+
+
+def write_snapshot(schedule, path):
+    """Serialize a Schedule and atomically replace `path` with it"""
+    columns = {}
+    payload = []
+    size = 0
+
+    def add(data):
+        nonlocal size
+        padding = -size % ALIGNMENT
+        if padding:
+            payload.append(b'\0' * padding)
+            size += padding
+        offset = size
+        payload.append(data)
+        size += len(data)
+        return offset
+
+    for name, column in vars(schedule).items():
+        if isinstance(column, (array, memoryview)):
+            typecode = column.typecode if isinstance(column, array) else column.format
+            columns[name] = ['array', typecode, add(column.tobytes()), len(column)]
+        elif isinstance(column, (StringPool, MappedStrings, list)):
+            values = column.values if isinstance(column, (StringPool, MappedStrings)) else column
+            blob, offsets = _encode_strings(values)
+            kind = 'strings' if isinstance(column, list) else 'pool'
+            columns[name] = [kind, add(offsets.tobytes()), len(offsets), add(blob), len(blob)]
+    header = json.dumps({
+        'version': schedule.version,
+        'built_at': int(time.time()),
+        'byteorder': sys.byteorder,
+        'columns': columns,
+    }).encode('utf-8')
+    data_start = PREAMBLE.size + len(header)
+    data_start += -data_start % ALIGNMENT
+
+    temporary = f"{path}.tmp{os.getpid()}"
+    with open(temporary, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(b'\0' * (data_start - PREAMBLE.size - len(header)))
+        for chunk in payload:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers holding the old file keep their mapping; new opens see the new inode
+    os.replace(temporary, path)
+
+
+def open_snapshot(path):
+    """Memory-map a snapshot file into a Schedule without copying its columns"""
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"cannot map {path}: {e}")
+    if len(mapped) < PREAMBLE.size:
+        raise SnapshotError(f"{path} is truncated")
+    magic, format_version, header_length = PREAMBLE.unpack_from(mapped)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise SnapshotError(f"{path} is not a format {FORMAT_VERSION} schedule snapshot")
+    header = json.loads(mapped[PREAMBLE.size:PREAMBLE.size + header_length])
+    if header['byteorder'] != sys.byteorder:
+        raise SnapshotError(f"{path} was built on a {header['byteorder']}-endian machine")
+    data_start = PREAMBLE.size + header_length
+    data_start += -data_start % ALIGNMENT
+    view = memoryview(mapped)
+
+    def column(offset, count, typecode):
+        start = data_start + offset
+        itemsize = array(typecode).itemsize
+        end = start + count * itemsize
+        if end > len(mapped):
+            raise SnapshotError(f"{path} is truncated")
+        return view[start:end].cast(typecode)
+
+    schedule = Schedule.__new__(Schedule)
+    for name, spec in header['columns'].items():
+        if spec[0] == 'array':
+            _, typecode, offset, count = spec
+            setattr(schedule, name, column(offset, count, typecode))
+        else:
+            kind, offsets_at, offsets_count, blob_at, blob_length = spec
+            offsets = column(offsets_at, offsets_count, 'i')
+            blob = view[data_start + blob_at:data_start + blob_at + blob_length]
+            setattr(schedule, name, (MappedStringPool if kind == 'pool' else MappedStrings)(blob, offsets))
+    schedule.version = header['version']
+    schedule.indexes = {}
+    return schedule
+
+
+class ScheduleStore:
+    """Holds the current Schedule and swaps in a new snapshot when its file changes
+
+    Builders derive per-schedule indexes (stop search, departures, ...) before a
+    schedule is published, so readers always see a schedule and its indexes together.
+    """
+
+    def __init__(self, snapshot_path=None, gtfs_path=None):
+        self.snapshot_path = snapshot_path or SCHEDULE_SNAPSHOT_PATH
+        self.gtfs_path = gtfs_path or GTFS_STATIC_PATH
+        self.schedule = None
+        self.builders = {}  # name -> callable deriving an index from a schedule
+        self.swaps = 0
+        self.loaded_in = None
+        self._file_id = None
+
+    def add_builder(self, name, builder):
+        self.builders[name] = builder
+        if self.schedule is not None:
+            self.schedule.indexes[name] = builder(self.schedule)
+
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        """Map the snapshot, compiling it from the GTFS zip first when it is missing or stale"""
+        started = time.perf_counter()
+        snapshot_id = self._stat(self.snapshot_path)
+        gtfs_id = self._stat(self.gtfs_path)
+        if gtfs_id is not None and (snapshot_id is None or gtfs_id[1] > snapshot_id[1]):
+            print(f"🛠️  Compiling schedule snapshot from {self.gtfs_path}")
+            write_snapshot(load_schedule(self.gtfs_path), self.snapshot_path)
+        elif snapshot_id is None:
+            return None
+        try:
+            schedule = open_snapshot(self.snapshot_path)
+        except SnapshotError:
+            if gtfs_id is None:
+                raise
+            # Written by an older format; rebuild it from the feed
+            write_snapshot(load_schedule(self.gtfs_path), self.snapshot_path)
+            schedule = open_snapshot(self.snapshot_path)
+        self.publish(schedule)
+        self.loaded_in = time.perf_counter() - started
+        return schedule
+
+    def publish(self, schedule):
+        schedule.indexes = getattr(schedule, 'indexes', {})
+        for name, builder in self.builders.items():
+            schedule.indexes[name] = builder(schedule)
+        self._file_id = self._stat(self.snapshot_path)
+        self.schedule = schedule  # single reference swap
+        self.swaps += 1
+
+    def reload_if_changed(self):
+        """Swap to a newly published snapshot file; True when a swap happened"""
+        file_id = self._stat(self.snapshot_path)
+        if file_id is None or file_id == self._file_id:
+            return False
+        try:
+            schedule = open_snapshot(self.snapshot_path)
+        except SnapshotError as e:
+            print(f"❌ Schedule snapshot reload error: {e}")
+            self._file_id = file_id
+            return False
+        self.publish(schedule)
+        print(f"🔁 Swapped to schedule snapshot {schedule.version}")
+        return True
+
+    async def watch(self, interval=None):
+        """Check for a new snapshot file periodically on the engine loop"""
+        interval = interval if interval is not None else SCHEDULE_RELOAD_INTERVAL
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, self.reload_if_changed)
+            except Exception as e:
+                print(f"❌ Schedule watch error: {e}")
+
+    def stats(self):
+        if self.schedule is None:
+            return None
+        stats = self.schedule.stats()
+        stats.update({'snapshot': self.snapshot_path, 'swaps': self.swaps,
+                      'load_seconds': round(self.loaded_in, 3) if self.loaded_in is not None else None})
+        return stats
+
+
+def main(argv):
+    if len(argv) >= 3 and argv[0] == 'build':
+        started = time.perf_counter()
+        try:
+            schedule = load_schedule(argv[1])
+        except (OSError, GTFSError) as e:
+            print(f"❌ {e}")
+            return 1
+        parsed = time.perf_counter()
+        write_snapshot(schedule, argv[2])
+        print(f"🚌 {schedule}")
+        print(f"⏱️  Parsed GTFS in {parsed - started:.2f}s, wrote {argv[2]} "
+              f"({os.path.getsize(argv[2]) / 1e6:.1f} MB) in {time.perf_counter() - parsed:.2f}s")
+        return 0
+    if len(argv) >= 2 and argv[0] == 'bench':
+        before = rss_megabytes()
+        started = time.perf_counter()
+        schedule = open_snapshot(argv[1])
+        opened = time.perf_counter() - started
+        started = time.perf_counter()
+        schedule.stop_ids.get(schedule.stop_ids[0])
+        indexed = time.perf_counter() - started
+        print(f"🚌 {schedule}")
+        print(f"⏱️  Mapped in {opened * 1000:.1f} ms, stop_id index built in {indexed * 1000:.1f} ms, "
+              f"RSS +{rss_megabytes() - before:.0f} MB")
+        return 0
+    print("Usage: python schedule_snapshot.py build gtfs.zip schedule.bin | bench schedule.bin")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
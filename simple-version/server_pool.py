@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Bounded worker-pool TCP server for the LA Transit Python servers
+Accepted connections are queued and served by a fixed set of worker threads,
+so one slow upstream call no longer stalls every other client
+"""
+
+import os
+import queue
+import socketserver
+import threading
+
+# Serving configuration (overridable from the environment)
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', '16'))
+SERVER_BACKLOG = int(os.getenv('SERVER_BACKLOG', '128'))
+KEEPALIVE_TIMEOUT = float(os.getenv('KEEPALIVE_TIMEOUT', '5'))  # seconds to wait for the next request on an open connection
+KEEPALIVE_MAX_REQUESTS = int(os.getenv('KEEPALIVE_MAX_REQUESTS', '100'))  # requests served per connection
+# Workers that may sit waiting on the proxy engine for an upstream call; the rest stay free for local requests
+MAX_UPSTREAM_WAITS = int(os.getenv('MAX_UPSTREAM_WAITS', str(max(1, SERVER_WORKERS // 2))))
+MAX_REQUEST_BODY = 1024 * 1024
+
+# Minimal response sent when the pending-request queue is full
+OVERLOADED_RESPONSE = (
+    b"HTTP/1.0 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: 20\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+    b"Server is overloaded"
+)
+
+
+class PooledTCPServer(socketserver.TCPServer):
+    """TCPServer that hands accepted connections to a bounded pool of worker threads"""
+
+    allow_reuse_address = True
+
+    def __init__(self, server_address, RequestHandlerClass, workers=None, backlog=None,
+                 bind_and_activate=True, upstream_waits=None):
+        self.workers = max(1, workers if workers is not None else SERVER_WORKERS)
+        self.backlog = max(1, backlog if backlog is not None else SERVER_BACKLOG)
+        self.upstream_waits = max(1, min(self.workers, upstream_waits if upstream_waits is not None
+                                         else MAX_UPSTREAM_WAITS))
+        self._upstream_slots = threading.BoundedSemaphore(self.upstream_waits)
+        self.upstream_rejected = 0
+        # listen() backlog for connections not yet accepted
+        self.request_queue_size = self.backlog
+        self._pending = queue.Queue(maxsize=self.backlog)
+        self._stopping = threading.Event()
+        self._threads = []
+        self._detached = set()
+        super().__init__(server_address, RequestHandlerClass, bind_and_activate)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"http-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def process_request(self, request, client_address):
+        """Queue the connection for a worker instead of serving it inline"""
+        try:
+            self._pending.put_nowait((request, client_address))
+        except queue.Full:
+            print(f"⚠️  Request queue full ({self.backlog}) - rejecting {client_address[0]}")
+            try:
+                request.sendall(OVERLOADED_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            item = self._pending.get()
+            if item is None:
+                break
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def saturated(self):
+        """True when accepted connections are waiting for a worker"""
+        return not self._pending.empty()
+
+    def begin_upstream_wait(self):
+        """Claim one of the upstream_waits slots for a worker about to block on an upstream call
+
+        Returns False when all are taken; the caller should answer 503 rather
+        than tie up another worker. Pair a True with end_upstream_wait().
+        """
+        if self._upstream_slots.acquire(blocking=False):
+            return True
+        self.upstream_rejected += 1
+        return False
+
+    def end_upstream_wait(self):
+        self._upstream_slots.release()
+
+    def detach_request(self, request):
+        """Take a connection away from its worker (e.g. for a long-lived stream)
+
+        Returns a duplicate socket owned by the caller; when the worker finishes,
+        the original is closed without shutting the connection down.
+        """
+        sock = request.dup()
+        self._detached.add(request)
+        return sock
+
+    def shutdown_request(self, request):
+        if request in self._detached:
+            self._detached.discard(request)
+            self.close_request(request)
+            return
+        super().shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._stopping.set()
+        for _ in self._threads:
+            try:
+                self._pending.put_nowait(None)
+            except queue.Full:
+                break
@@ -5,13 +5,14 @@ Bypasses CORS issues by serving files from localhost
 """
 
 import http.server
-import socketserver
 import os
 import urllib.request
 import urllib.parse
 import json
 from urllib.error import HTTPError, URLError
 
+from server_pool import PooledTCPServer
+
 PORT = 8000
 
 class TransitAPIHandler(http.server.SimpleHTTPRequestHandler):
@@ -143,8 +144,9 @@ def main():
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
     # Create server
-    with socketserver.TCPServer(("", PORT), TransitAPIHandler) as httpd:
+    with PooledTCPServer(("", PORT), TransitAPIHandler) as httpd:
         print(f"🚇 LA Metro Transit Server running on http://localhost:{PORT}")
+        print(f"🧵 Worker pool: {httpd.workers} threads, backlog {httpd.backlog}")
         print(f"📁 Serving files from: {os.getcwd()}")
         print(f"🔗 Main app: http://localhost:{PORT}/index-working-with-location-sharing.html")
         print(f"🔗 TransitLand proxy: http://localhost:{PORT}/api/transitland/*")
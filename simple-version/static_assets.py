@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+In-memory static asset cache with validators and precompressed variants
+Each file is read, hashed and compressed once; later requests only stat it
+to notice edits (a changed mtime or size reloads it). Responses carry an ETag
+so revalidations are answered with 304, and clients that accept gzip or
+brotli get the prebuilt variant instead of the raw bytes. Large uncompressed
+bodies are sent from the file with os.sendfile, honouring Range requests.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # optional: gzip-only variants without it
+    brotli = None
+
+STATIC_GZIP_LEVEL = int(os.getenv('STATIC_GZIP_LEVEL', '9'))
+STATIC_MIN_COMPRESS_BYTES = 1024  # smaller files are sent as they are
+SENDFILE_MIN_BYTES = int(os.getenv('SENDFILE_MIN_BYTES', str(32 * 1024)))  # larger files go out via os.sendfile
+
+
+def parse_byte_range(header, size):
+    """(first, last) byte offsets for a single-range Range header, or None to send the whole file
+
+    Multiple ranges and other units are ignored (a full 200 response is
+    allowed for them); a range entirely past the end raises ValueError.
+    """
+    unit, _, spec = (header or '').partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash or not (first or last) or not (first or '0').isdigit() or not (last or '0').isdigit():
+        return None
+    if first and last and int(last) < int(first):
+        return None
+    if not first:
+        if int(last) == 0 or size == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - int(last)), size - 1
+    if int(first) >= size:
+        raise ValueError(f"range starts past the end of {size} bytes")
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+class StaticAsset:
+    """One cached file: its bytes, validators and compressed variants"""
+
+    __slots__ = ('path', 'content_type', 'file_id', 'etag', 'variants')
+
+    def __init__(self, path, content_type, file_id, content):
+        self.path = path
+        self.content_type = content_type
+        self.file_id = file_id
+        self.etag = '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+        self.variants = {'identity': content}  # content-coding -> body
+        if len(content) >= STATIC_MIN_COMPRESS_BYTES:
+            compressed = gzip.compress(content, STATIC_GZIP_LEVEL, mtime=0)
+            if len(compressed) < len(content):
+                self.variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(content)
+                if len(compressed) < len(content):
+                    self.variants['br'] = compressed
+
+    def variant_etag(self, coding):
+        """Strong ETag of one variant: each content-coding is its own representation"""
+        return self.etag if coding == 'identity' else f'{self.etag[:-1]}-{coding}"'
+
+    def matches(self, if_none_match):
+        """True when an If-None-Match header names any variant of this file"""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in tags or any(self.variant_etag(coding) in tags for coding in self.variants)
+
+    def negotiate(self, accept_encoding):
+        """Smallest variant the client accepts, as (content-coding, body)"""
+        accepted = {'identity'}
+        for item in (accept_encoding or '').split(','):
+            coding, _, params = item.strip().partition(';')
+            quality = params.strip()
+            if quality.startswith('q='):
+                try:
+                    if float(quality[2:]) <= 0:
+                        continue
+                except ValueError:
+                    continue
+            coding = coding.strip().lower()
+            accepted.update(self.variants if coding == '*' else (coding,))
+        coding = min((coding for coding in self.variants if coding in accepted),
+                     key=lambda coding: len(self.variants[coding]))
+        return coding, self.variants[coding]
+
+
+class StaticAssets:
+    """Thread-safe cache of StaticAsset by path, revalidated against the file's mtime and size"""
+
+    def __init__(self):
+        self._assets = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+
+    def get(self, path, content_type):
+        """The current StaticAsset for a file; raises FileNotFoundError like open()"""
+        stat = os.stat(path)
+        file_id = (stat.st_mtime_ns, stat.st_size)
+        asset = self._assets.get(path)
+        if asset is not None and asset.file_id == file_id:
+            with self._lock:
+                self.hits += 1
+            return asset
+        with open(path, 'rb') as f:
+            content = f.read()
+        asset = StaticAsset(path, content_type, file_id, content)
+        with self._lock:
+            self._assets[path] = asset
+            self.loads += 1
+        print(f"📦 Cached {path}: {len(content)} bytes"
+              + ''.join(f", {coding} {len(body)}" for coding, body in asset.variants.items() if coding != 'identity'))
+        return asset
+
+    def stats(self):
+        return {
+            'files': len(self._assets),
+            'bytes': sum(len(body) for asset in list(self._assets.values()) for body in asset.variants.values()),
+            'loads': self.loads,
+            'hits': self.hits,
+            'brotli': brotli is not None,
+        }
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Stop search indexes over the static GTFS stops table
+A uniform grid answers "k nearest stops to a point" by searching outward ring
+by ring from the query cell, and a sorted key array answers name-prefix
+searches with two bisections. Both are rebuilt whenever a schedule is loaded.
+"""
+
+import bisect
+import heapq
+import math
+import re
+
+from vehicle_index import METERS_PER_DEGREE, haversine_meters
+
+STOP_INDEX_CELL = 0.005  # degrees, ~550 m of latitude
+MAX_RING = 200  # give up widening the search ~100 km out
+MAX_STOP_RESULTS = 100
+DIRECT_RANK_LIMIT = 256  # name matches ranked by distance directly; more use the grid search
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_stop_name(name):
+    """Case- and punctuation-insensitive form: 'Wilshire / Western Station' -> 'wilshire western station'"""
+    return _NON_ALNUM.sub(' ', name.lower().replace('&', ' and ')).strip()
+
+
+class StopIndex:
+    """k-nearest and name-prefix lookups over a Schedule's stops"""
+
+    def __init__(self, schedule, cell=STOP_INDEX_CELL):
+        self.schedule = schedule
+        self.cell = cell
+        self.lats = list(schedule.stop_lats)
+        self.lons = list(schedule.stop_lons)
+        self.cells = {}
+        for stop, (lat, lon) in enumerate(zip(self.lats, self.lons)):
+            self.cells.setdefault(self._cell(lat, lon), []).append(stop)
+        # Names are indexed whole and from every later word start, so 'western' also
+        # finds 'Wilshire / Western'; whole-name matches are listed first
+        self.names = [normalize_stop_name(name) for name in schedule.stop_names]
+        full, tails = [], []
+        for stop, name in enumerate(self.names):
+            words = name.split()
+            if words:
+                full.append((name, stop))
+            for position in range(1, len(words)):
+                tails.append((' '.join(words[position:]), stop))
+        full.sort()
+        tails.sort()
+        self.full_keys = [key for key, _ in full]
+        self.full_stops = [stop for _, stop in full]
+        self.tail_keys = [key for key, _ in tails]
+        self.tail_stops = [stop for _, stop in tails]
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def nearest(self, lat, lon, k=10, max_meters=None, accept=None):
+        """[(meters, stop)] for the k stops closest to the point, nearest first
+
+        accept, when given, is a predicate restricting which stops count.
+        """
+        row, col = self._cell(lat, lon)
+        # Degrees of longitude shrink with latitude; one ring is at least this many meters wide
+        ring_meters = self.cell * METERS_PER_DEGREE * min(1.0, math.cos(math.radians(lat)))
+        best = []  # max-heap of (-meters, stop) holding the current k best
+        for ring in range(MAX_RING + 1):
+            for cell in self._ring(row, col, ring):
+                for stop in self.cells.get(cell, ()):
+                    if accept is not None and not accept(stop):
+                        continue
+                    meters = haversine_meters(lat, lon, self.lats[stop], self.lons[stop])
+                    if max_meters is not None and meters > max_meters:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-meters, stop))
+                    elif meters < -best[0][0]:
+                        heapq.heapreplace(best, (-meters, stop))
+            # Anything in ring + 1 or beyond is at least ring * ring_meters away
+            reach = ring * ring_meters
+            if len(best) >= k and -best[0][0] <= reach:
+                break
+            if max_meters is not None and reach > max_meters:
+                break
+        return sorted((-meters, stop) for meters, stop in best)
+
+    @staticmethod
+    def _ring(row, col, ring):
+        if ring == 0:
+            yield row, col
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield row - ring, c
+            yield row + ring, c
+        for r in range(row - ring + 1, row + ring):
+            yield r, col - ring
+            yield r, col + ring
+
+    @staticmethod
+    def _prefix_range(keys, key):
+        start = bisect.bisect_left(keys, key)
+        return start, bisect.bisect_left(keys, key + '\x7f', start)
+
+    def prefix(self, text, limit=None):
+        """Stops whose name (or a word-aligned tail of it) starts with text; whole-name matches first"""
+        key = normalize_stop_name(text)
+        if not key:
+            return []
+        seen = set()
+        stops = []
+        for keys, key_stops in ((self.full_keys, self.full_stops), (self.tail_keys, self.tail_stops)):
+            start, end = self._prefix_range(keys, key)
+            for stop in key_stops[start:end]:
+                if stop not in seen:
+                    seen.add(stop)
+                    stops.append(stop)
+                    if limit is not None and len(stops) >= limit:
+                        return stops
+        return stops
+
+    def match_count(self, text):
+        """Upper bound on the stops prefix(text) returns, from the two index ranges alone"""
+        key = normalize_stop_name(text)
+        if not key:
+            return 0
+        total = 0
+        for keys in (self.full_keys, self.tail_keys):
+            start, end = self._prefix_range(keys, key)
+            total += end - start
+        return total
+
+    def search(self, name=None, lat=None, lon=None, limit=10, max_meters=None):
+        """[(meters or None, stop)] for a name prefix, a point, or a name ranked by distance"""
+        if name:
+            if lat is None or lon is None:
+                return [(None, stop) for stop in self.prefix(name, limit)]
+            if self.match_count(name) > DIRECT_RANK_LIMIT:
+                # Common prefix: walk outward from the point and keep the matching stops
+                key = normalize_stop_name(name)
+                tail = ' ' + key
+                names = self.names
+                return self.nearest(lat, lon, limit, max_meters,
+                                    accept=lambda stop: names[stop].startswith(key) or tail in names[stop])
+            ranked = sorted((haversine_meters(lat, lon, self.lats[stop], self.lons[stop]), stop)
+                            for stop in self.prefix(name))
+            if max_meters is not None:
+                ranked = [(meters, stop) for meters, stop in ranked if meters <= max_meters]
+            return ranked[:limit]
+        if lat is None or lon is None:
+            return []
+        return self.nearest(lat, lon, limit, max_meters)
+
+    def describe(self, stop, meters=None):
+        """JSON-ready record for one stop"""
+        schedule = self.schedule
+        record = {
+            'stop_id': schedule.stop_ids[stop],
+            'stop_name': schedule.stop_names[stop],
+            'latitude': self.lats[stop],
+            'longitude': self.lons[stop],
+        }
+        if meters is not None:
+            record['distance_meters'] = round(meters, 1)
+        return record
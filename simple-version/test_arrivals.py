@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Delay overlay checks: each tick shares the storage of trips it did not touch,
+and arrivals are described against the schedule and overlay they were ranked with
+"""
+
+import datetime
+import os
+import tempfile
+import types
+import unittest
+from array import array
+from zoneinfo import ZoneInfo
+
+from arrivals import EMPTY_CHUNK, TRIP_CHUNK_BITS, ArrivalsEngine, DelayOverlay
+from realtime_feed import FeedSnapshot
+from schedule_snapshot import ScheduleStore
+from test_journey_planner import DAY, write_feed
+
+TRIPS = 3 << TRIP_CHUNK_BITS  # three chunks; trip t runs on pattern t % 4 and route t % 5
+
+
+def trip_delay(delay, start_date=None):
+    return types.SimpleNamespace(delays=[delay], start_date=start_date)
+
+
+class DelayOverlayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schedule = types.SimpleNamespace(trip_ids=[f'trip_{trip}' for trip in range(TRIPS)],
+                                              trip_patterns=array('i', [trip % 4 for trip in range(TRIPS)]),
+                                              trip_routes=array('i', [trip % 5 for trip in range(TRIPS)]))
+        self.engine = ArrivalsEngine.__new__(ArrivalsEngine)
+        self.engine.trips, self.engine.pattern_trips = {}, {}
+        self.engine.route_counts, self.engine.start_date_counts = {}, {}
+        self.overlay = DelayOverlay.empty(self.schedule)
+
+    def tick(self, version, updates):
+        changes = {}
+        for trip, update in updates.items():
+            self.engine._set_trip(self.schedule, trip, update, changes)
+        self.overlay = self.overlay.derive(changes, version, self.engine.pattern_trips,
+                                           self.engine.route_counts, self.engine.start_date_counts)
+        return self.overlay
+
+    def test_untouched_chunks_are_shared(self):
+        first = self.tick(1, {1: trip_delay(120), 300: trip_delay(-60, '20261017')})
+        self.assertIs(first.by_trip[2], EMPTY_CHUNK)
+        second = self.tick(2, {2: trip_delay(30)})
+        self.assertIs(second.by_trip[1], first.by_trip[1])
+        self.assertIsNot(second.by_trip[0], first.by_trip[0])
+        self.assertIsNone(first.get(2))  # the previous version is left as it was
+        self.assertEqual(second.get(2).delays, [30])
+        self.assertIsNone(second.get(300, '20261018'))
+        third = self.tick(3, {})
+        self.assertIs(third.by_trip, second.by_trip)
+        self.assertEqual((third.version, len(third)), (3, 3))
+
+    def test_bounds_follow_the_trips_still_live(self):
+        overlay = self.tick(1, {1: trip_delay(600), 5: trip_delay(60), 2: trip_delay(-90)})
+        self.assertEqual(overlay.patterns, {1: (600, 0), 2: (0, 90)})
+        self.assertEqual((overlay.max_late, overlay.max_early), (600, 90))
+        self.assertEqual(overlay.routes, {1, 2, 0})
+        overlay = self.tick(2, {1: None, 2: None})
+        self.assertEqual(overlay.patterns, {1: (60, 0)})
+        self.assertEqual((overlay.max_late, overlay.max_early), (60, 0))
+        self.assertEqual(overlay.routes, {0})
+        self.assertEqual(len(overlay), 1)
+
+
+class ScheduleSwapTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        gtfs_path = os.path.join(directory.name, 'gtfs.zip')
+        write_feed(gtfs_path)
+        self.store = ScheduleStore(os.path.join(directory.name, 'gtfs.bin'), gtfs_path)
+        self.schedule = self.store.load()
+        self.engine = ArrivalsEngine(self.store)
+
+    def test_describe_uses_the_captured_schedule_and_overlay(self):
+        self.engine.apply_trip_updates(FeedSnapshot(1, {'entity': [{'id': 'first', 'trip_update': {
+            'trip': {'trip_id': 'FIRST'}, 'vehicle': {'id': 'bus_7'}, 'delay': 120}}]}, 'live'))
+        now = datetime.datetime(DAY.year, DAY.month, DAY.day, 4, 0,
+                                tzinfo=ZoneInfo(self.schedule.timezone)).timestamp()
+        overlay = self.engine.current_overlay(self.schedule)
+        stop = self.schedule.stop_ids.get('A')
+        arrivals = self.engine.next_arrivals(self.schedule, [stop], now=now, overlay=overlay)
+        # A schedule reload and the next tick land before the response is built
+        self.store.publish(ScheduleStore(self.store.snapshot_path, self.store.gtfs_path).load())
+        self.engine.apply_trip_updates(FeedSnapshot(2, {'entity': []}, 'live'))
+        self.assertIsNot(self.engine.current_overlay(self.schedule), overlay)
+        (prediction,) = [self.engine.describe_arrival(self.schedule, *arrival, now=now, overlay=overlay)
+                         for arrival in arrivals]
+        self.assertEqual((prediction['trip_id'], prediction['stop_id']), ('FIRST', 'A'))
+        self.assertEqual((prediction['vehicle_id'], prediction['delay'], prediction['realtime']), ('bus_7', 120, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Geocoder checks against a local stand-in upstream and a throwaway SQLite cache
+"""
+
+import asyncio
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+import urllib.parse
+
+from geocoder import GeocodeCache, Geocoder, NominatimUpstream, normalize_query
+
+
+class StubUpstream:
+    """Answers every query with one place (none for 'nowhere'), recording what it was asked"""
+
+    name = 'stub'
+
+    def __init__(self):
+        self.queries = []
+        self.gate = None  # asyncio.Event holding searches until set
+
+    async def search(self, query, limit):
+        self.queries.append(query)
+        if self.gate is not None:
+            await self.gate.wait()
+        if 'nowhere' in query.lower():
+            return []
+        return [{'display_name': query, 'latitude': 34.0561, 'longitude': -118.2365,
+                 'category': 'railway', 'type': 'station'}]
+
+
+class NormalizeQueryTest(unittest.TestCase):
+
+    def test_spellings_collide(self):
+        spellings = ['123 S. Main Street', '123 south main st', '  123 S MAIN ST, Los Angeles, CA ',
+                     '123 s. main st., los angeles, california', '123 South Main Street, LA, CA, USA']
+        self.assertEqual({normalize_query(query) for query in spellings}, {'123 s main st'})
+
+    def test_distinct_places_stay_apart(self):
+        self.assertNotEqual(normalize_query('North Hollywood Station'), normalize_query('Hollywood Station'))
+        self.assertNotEqual(normalize_query('Main St & 1st St'), normalize_query('Main St 1st St'))
+
+    def test_region_alone_is_kept(self):
+        self.assertEqual(normalize_query('Los Angeles'), 'los angeles')
+        self.assertEqual(normalize_query(' ?! '), '')
+
+
+class GeocoderTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'geocode.sqlite3')
+        self.upstream = StubUpstream()
+        self.geocoder = Geocoder(self.upstream, GeocodeCache(self.path))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def test_upstream_gets_the_query_as_typed(self):
+        places, source = await self.geocoder.geocode('  North Hollywood Station ')
+        self.assertEqual(source, 'stub')
+        self.assertEqual(self.upstream.queries, ['North Hollywood Station'])
+        self.assertEqual(places[0]['display_name'], 'North Hollywood Station')
+
+    async def test_memory_then_disk_then_upstream(self):
+        await self.geocoder.geocode('Union Station')
+        await self.geocoder.geocode('Griffith Observatory')
+        places, source = await self.geocoder.geocode('union station, los angeles, ca')
+        self.assertEqual((source, len(self.upstream.queries)), ('memory', 2))
+
+        # A restarted server keeps only the most recent entry in memory here
+        restarted = Geocoder(self.upstream, GeocodeCache(self.path, memory_entries=1))
+        self.assertEqual((await restarted.geocode('UNION STATION'))[1], 'disk')
+        self.assertEqual((await restarted.geocode('Union Station'))[1], 'memory')
+        self.assertEqual((await restarted.geocode('The Getty'))[1], 'stub')
+        self.assertEqual(self.upstream.queries, ['Union Station', 'Griffith Observatory', 'The Getty'])
+        stats = restarted.stats()
+        self.assertEqual((stats['memory_hits'], stats['disk_hits'], stats['misses']), (1, 1, 1))
+
+    async def test_concurrent_misses_share_one_search(self):
+        self.upstream.gate = asyncio.Event()
+        lookups = [asyncio.create_task(self.geocoder.geocode(query))
+                   for query in ('Crypto.com Arena', 'crypto com arena', 'CRYPTO.COM ARENA, Los Angeles, CA')]
+        await asyncio.sleep(0.05)
+        self.upstream.gate.set()
+        results = await asyncio.gather(*lookups)
+        self.assertEqual(len(self.upstream.queries), 1)
+        self.assertEqual({places[0]['latitude'] for places, _ in results}, {34.0561})
+        self.assertEqual(self.geocoder.upstream_calls, 1)
+
+    async def test_upstream_failure_is_not_cached(self):
+        class FailingUpstream(StubUpstream):
+            async def search(self, query, limit):
+                await super().search(query, limit)
+                raise OSError("upstream down")
+
+        failing = Geocoder(FailingUpstream(), GeocodeCache(self.path))
+        with self.assertRaises(OSError):
+            await failing.geocode('Union Station')
+        self.assertEqual((await self.geocoder.geocode('Union Station'))[1], 'stub')
+
+    async def test_no_match_is_cached_for_the_negative_ttl(self):
+        geocoder = Geocoder(self.upstream, GeocodeCache(self.path), ttl=3600, negative_ttl=0.2)
+        self.assertEqual(await geocoder.geocode('Nowhere Land'), ([], 'stub'))
+        await geocoder.geocode('Union Station')
+        self.assertEqual(await geocoder.geocode('nowhere land'), ([], 'memory'))
+        with sqlite3.connect(self.path) as db:
+            expires = dict(db.execute('SELECT query, expires FROM geocode').fetchall())
+        self.assertLess(expires['nowhere land'] - time.time(), 1)
+        self.assertGreater(expires['union station'] - time.time(), 3000)
+
+        await asyncio.sleep(0.25)
+        self.assertEqual(await geocoder.geocode('Nowhere Land'), ([], 'stub'))
+        self.assertEqual((await geocoder.geocode('Union Station'))[1], 'memory')
+        self.assertEqual(self.upstream.queries, ['Nowhere Land', 'Union Station', 'Nowhere Land'])
+
+    async def test_empty_query_is_rejected(self):
+        with self.assertRaises(ValueError):
+            await self.geocoder.geocode(' , ')
+        self.assertEqual(self.upstream.queries, [])
+
+
+class NominatimUpstreamTest(unittest.IsolatedAsyncioTestCase):
+
+    async def search(self, query):
+        requests = []
+
+        async def fetch(request):
+            requests.append(urllib.parse.parse_qs(urllib.parse.urlparse(request.full_url).query))
+            return io.BytesIO(json.dumps([{'lat': '34.1184', 'lon': '-118.3004', 'display_name': 'Griffith Observatory',
+                                           'category': 'tourism', 'type': 'attraction'}]).encode('utf-8'))
+
+        places = await NominatimUpstream(fetch, 'http://127.0.0.1:1', min_interval=0).search(query, 5)
+        return places, requests[0]
+
+    async def test_region_is_added_once(self):
+        places, params = await self.search('Griffith Observatory')
+        self.assertEqual(params['q'], ['Griffith Observatory, Los Angeles, CA'])
+        self.assertEqual(places, [{'display_name': 'Griffith Observatory', 'latitude': 34.1184,
+                                   'longitude': -118.3004, 'category': 'tourism', 'type': 'attraction'}])
+        _, params = await self.search('Griffith Observatory, Los Angeles, CA')
+        self.assertEqual(params['q'], ['Griffith Observatory, Los Angeles, CA'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+GTFS-RT decoder checks: round trips and malformed payloads
+"""
+
+import unittest
+
+from gtfs_realtime import (DecodeError, FeedDecoder, _encode_varint, decode_feed, encode_feed,
+                           synthetic_vehicle_feed)
+
+HEADER = encode_feed({'header': {'gtfs_realtime_version': '2.0', 'timestamp': 1700000000}})
+
+
+def length_delimited(number, payload):
+    return _encode_varint(number << 3 | 2) + _encode_varint(len(payload)) + payload
+
+
+def vehicle_entity(position_payload):
+    """A FeedMessage entity field whose vehicle.position holds `position_payload` as given"""
+    vehicle = length_delimited(2, position_payload)
+    entity = length_delimited(1, b'bus') + length_delimited(4, vehicle)
+    return length_delimited(2, entity)
+
+
+class DecodeFeedTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        feed = synthetic_vehicle_feed(3, timestamp=1700000000)
+        decoded = decode_feed(encode_feed(feed))
+        self.assertEqual(len(decoded['entity']), 3)
+        self.assertEqual(decoded['entity'][1]['vehicle']['vehicle']['id'], '3001')
+        self.assertAlmostEqual(decoded['entity'][1]['vehicle']['position']['latitude'], 33.707, places=5)
+        again = FeedDecoder()
+        again.decode(encode_feed(feed))
+        self.assertEqual(again.decode(encode_feed(feed)), decoded)
+        self.assertEqual(again.reused, 3)
+
+    def test_truncated_fixed_width_field(self):
+        # latitude (float, wire type 5) with 2 of its 4 bytes, at the very end of the payload
+        data = HEADER + vehicle_entity(_encode_varint(1 << 3 | 5) + b'\x00\x00')
+        with self.assertRaises(DecodeError):
+            decode_feed(data)
+        # an unknown double at the top level, cut short
+        with self.assertRaises(DecodeError):
+            decode_feed(HEADER + _encode_varint(9 << 3 | 1) + b'\x00\x00')
+
+    def test_wire_type_must_match_field_kind(self):
+        # latitude sent as a varint, as the first field of its message
+        with self.assertRaises(DecodeError):
+            decode_feed(HEADER + vehicle_entity(_encode_varint(1 << 3) + _encode_varint(5)))
+        # stop_id (string) sent as a 4-byte fixed field
+        entity = length_delimited(1, b'bus') + length_delimited(4, _encode_varint(7 << 3 | 5) + b'abcd')
+        with self.assertRaises(DecodeError):
+            decode_feed(HEADER + length_delimited(2, entity))
+
+    def test_truncated_varint(self):
+        with self.assertRaises(DecodeError):
+            decode_feed(HEADER + vehicle_entity(_encode_varint(3 << 3 | 5) + b'\x00\x00\x00\x00')[:-6] + b'\x80')
+
+
+if __name__ == '__main__':
+    unittest.main()
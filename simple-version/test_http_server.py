@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+End-to-end checks of the request handler under both serving modes
+Each test case starts a PooledTCPServer or AsyncHTTPServer on an ephemeral
+port with its own proxy engine and talks to it over a raw socket.
+"""
+
+import asyncio
+import http.server
+import importlib.util
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+from unittest import mock
+
+import geocoder
+from async_server import AsyncHTTPServer
+from geocoder import GeocodeCache, Geocoder, NominatimUpstream
+from proxy_engine import ProxyEngine
+from realtime_feed import FeedPoller, FeedSnapshot, RealtimeFeeds
+from realtime_stream import StreamHub
+from server_pool import PooledTCPServer
+from vehicle_delta import VehicleDeltaLog
+from vehicle_index import VehicleIndex
+
+CACHE_DIRECTORY = tempfile.mkdtemp()
+geocoder.GEOCODE_CACHE_PATH = os.path.join(CACHE_DIRECTORY, 'geocode.sqlite3')  # the server builds one on import
+_spec = importlib.util.spec_from_file_location(
+    'comprehensive_server', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'comprehensive-server.py'))
+server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(server)
+
+
+def tearDownModule():
+    shutil.rmtree(CACHE_DIRECTORY, ignore_errors=True)
+
+
+def read_response(rfile):
+    """(status, headers with lowercased names, body) of one Content-Length framed response"""
+    status_line = rfile.readline()
+    if not status_line:
+        return None
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = rfile.readline().rstrip(b'\r\n')
+        if not line:
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = rfile.read(int(headers.get('content-length', 0)))
+    return status, headers, body
+
+
+class FileHandler(server.ComprehensiveLATransitHandler):
+    """Serves path_on_disk at /file through send_file; everything else as the real server does"""
+
+    path_on_disk = None
+    validator = '"v1"'
+    buffered = []  # bytes held in the response buffer after send_file (asyncio mode)
+
+    def do_GET(self):
+        if self.path != '/file':
+            super().do_GET()
+            return
+        self.send_file(self.path_on_disk, 'application/octet-stream', (('ETag', self.validator),), self.validator)
+        if isinstance(self.wfile, io.BytesIO):
+            self.buffered.append(len(self.wfile.getvalue()))
+
+
+class ServerTestCase(unittest.TestCase):
+    """Runs the handler under `mode` ('threaded' or 'asyncio') for each test"""
+
+    mode = None
+    handler_class = server.ComprehensiveLATransitHandler
+    upstream_waits = None  # threaded mode
+
+    def setUp(self):
+        self.engine = server.PROXY_ENGINE = ProxyEngine()
+        if self.mode == 'asyncio':
+            self.httpd = AsyncHTTPServer(('127.0.0.1', 0), self.handler_class, engine=self.engine, workers=4)
+        else:
+            self.httpd = PooledTCPServer(('127.0.0.1', 0), self.handler_class, workers=4,
+                                         upstream_waits=self.upstream_waits)
+            self.engine.start()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        deadline = time.time() + 5
+        while self.httpd.server_address[1] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.address = self.httpd.server_address[:2]
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.thread.join(5)
+        self.httpd.server_close()
+        if self.mode != 'asyncio':
+            self.engine.loop.call_soon_threadsafe(self.engine.loop.stop)
+
+    def connect(self):
+        sock = socket.create_connection(self.address, timeout=5)
+        self.addCleanup(sock.close)
+        return sock, sock.makefile('rb')
+
+    def request(self, raw):
+        sock, rfile = self.connect()
+        sock.sendall(raw)
+        return read_response(rfile)
+
+
+def read_event(rfile):
+    """One Server-Sent Events block, up to its blank line"""
+    lines = []
+    while True:
+        line = rfile.readline()
+        if line in (b'\n', b''):
+            return b''.join(lines)
+        lines.append(line)
+
+
+def trips_snapshot(version, routes):
+    entities = [{'id': f'trip_{route}', 'trip_update': {'trip': {'trip_id': f'trip_{route}', 'route_id': route}}}
+                for route in routes]
+    return FeedSnapshot(version, {'header': {'gtfs_realtime_version': '2.0'}, 'entity': entities}, 'live')
+
+
+class SendFileTests:
+    size = 300 * 1024
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.content = os.urandom(cls.size)
+        FileHandler.path_on_disk = os.path.join(cls.directory.name, 'body.bin')
+        with open(FileHandler.path_on_disk, 'wb') as f:
+            f.write(cls.content)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def get(self, *headers):
+        head = ''.join(f"{header}\r\n" for header in headers)
+        return self.request(f"GET /file HTTP/1.1\r\nHost: test\r\n{head}\r\n".encode('latin-1'))
+
+    def test_whole_file(self):
+        FileHandler.buffered.clear()
+        with mock.patch('os.sendfile', wraps=os.sendfile) as sendfile:
+            status, headers, body = self.get()
+        self.assertTrue(sendfile.called)
+        self.assertEqual((status, headers['accept-ranges']), (200, 'bytes'))
+        self.assertEqual(body, self.content)
+        if self.mode == 'asyncio':
+            self.assertLess(FileHandler.buffered[0], 1024)  # headers only; the body went out with sendfile
+
+    def test_byte_ranges(self):
+        status, headers, body = self.get('Range: bytes=100-199')
+        self.assertEqual((status, headers['content-range'], body), (206, f"bytes 100-199/{self.size}",
+                                                                     self.content[100:200]))
+        status, headers, body = self.get('Range: bytes=-50000')
+        self.assertEqual((status, body), (206, self.content[-50000:]))
+        status, headers, body = self.get(f"Range: bytes={self.size}-")
+        self.assertEqual((status, headers['content-range'], body), (416, f"bytes */{self.size}", b''))
+
+    def test_if_range(self):
+        status, _, body = self.get('Range: bytes=0-9', 'If-Range: "v1"')
+        self.assertEqual((status, body), (206, self.content[:10]))
+        status, _, body = self.get('Range: bytes=0-9', 'If-Range: "stale"')
+        self.assertEqual((status, body), (200, self.content))
+
+    def test_keep_alive_after_file_body(self):
+        sock, rfile = self.connect()
+        sock.sendall(b"GET /file HTTP/1.1\r\nHost: test\r\n\r\n"
+                     b"GET /file HTTP/1.1\r\nHost: test\r\nRange: bytes=-5\r\n\r\n")
+        self.assertEqual(read_response(rfile)[2], self.content)
+        self.assertEqual(read_response(rfile)[2], self.content[-5:])
+
+
+class ThreadedSendFileTest(SendFileTests, ServerTestCase):
+    mode = 'threaded'
+    handler_class = FileHandler
+
+
+class AsyncioSendFileTest(SendFileTests, ServerTestCase):
+    mode = 'asyncio'
+    handler_class = FileHandler
+
+
+class StreamTests:
+
+    def setUp(self):
+        self.hub = server.STREAM_HUB = StreamHub(heartbeat=30)
+        super().setUp()
+
+    def tearDown(self):
+        for subscriber in list(self.hub.subscribers):
+            self.engine.loop.call_soon_threadsafe(subscriber.task.cancel)
+        self.wait_for_subscribers(0)
+        super().tearDown()
+
+    def open_stream(self, method, query=''):
+        sock, rfile = self.connect()
+        sock.sendall(f"{method} /api/stream{query} HTTP/1.1\r\nHost: test\r\nContent-Length: 0\r\n\r\n".encode('ascii'))
+        return read_response(rfile), rfile
+
+    def wait_for_subscribers(self, count):
+        deadline = time.time() + 5
+        while len(self.hub.subscribers) != count and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.hub.subscribers), count)
+
+    def test_get_and_post_subscribe_with_a_route_filter(self):
+        for version, method in enumerate(('GET', 'POST'), 1):
+            (status, headers, _), rfile = self.open_stream(method, '?feeds=trips&route=66')
+            self.assertEqual((status, headers['content-type'], headers['connection']),
+                             (200, 'text/event-stream', 'close'), method)
+            self.assertNotIn('content-length', headers)
+            self.assertEqual(read_event(rfile), b'retry: 5000\n')
+            if version > 1:
+                self.assertTrue(read_event(rfile).startswith(b"event: trips\nid: 1\n"))  # the current state first
+            self.wait_for_subscribers(version)
+            self.engine.loop.call_soon_threadsafe(self.hub.publish, 'trips', trips_snapshot(version, ['66', '10']))
+            event = read_event(rfile)
+            self.assertTrue(event.startswith(f"event: trips\nid: {version}\n".encode('ascii')), method)
+            self.assertIn(b'"trip_66"', event)
+            self.assertNotIn(b'"trip_10"', event)
+
+    def test_bad_query_is_answered_before_streaming(self):
+        (status, headers, body), _ = self.open_stream('GET', '?feeds=bogus')
+        self.assertEqual(status, 400)
+        self.assertIn(b'unknown feeds', body)
+        self.assertEqual(self.hub.stats()['connected_total'], 0)
+
+
+class FramingTests:
+    """HTTP/1.1 message framing: keep-alive pipelining and rejected request bodies"""
+
+    def test_pipelined_requests_are_answered_in_order(self):
+        sock, rfile = self.connect()
+        sock.sendall(b'GET /api/stats HTTP/1.1\r\nHost: test\r\n\r\n'
+                     b'POST /api/stats HTTP/1.1\r\nHost: test\r\nContent-Length: 5\r\n\r\nhello'
+                     b'GET /api/stats HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n')
+        responses = [read_response(rfile) for _ in range(3)]
+        self.assertEqual([status for status, _, _ in responses], [200, 200, 200])
+        self.assertIn('upstream', json.loads(responses[1][2]))  # the body did not leak into the next request
+        self.assertEqual(responses[2][1]['connection'], 'close')
+        self.assertEqual(rfile.read(), b'')
+
+    def assertRejected(self, raw, status):
+        sock, rfile = self.connect()
+        sock.sendall(raw)
+        code, headers, _ = read_response(rfile)
+        self.assertEqual((code, headers['connection']), (status, 'close'))
+        self.assertEqual(rfile.read(), b'')
+
+    def test_chunked_body_gets_411(self):
+        self.assertRejected(b'POST /api/stats HTTP/1.1\r\nHost: test\r\nTransfer-Encoding: chunked\r\n\r\n'
+                            b'5\r\nhello\r\n0\r\n\r\n', 411)
+
+    def test_oversized_body_gets_413(self):
+        self.assertRejected(f"POST /api/stats HTTP/1.1\r\nHost: test\r\n"
+                            f"Content-Length: {server.MAX_REQUEST_BODY + 1}\r\n\r\n".encode('ascii'), 413)
+
+    def test_invalid_content_length_gets_400(self):
+        self.assertRejected(b'POST /api/stats HTTP/1.1\r\nHost: test\r\nContent-Length: ten\r\n\r\n', 400)
+
+
+class ThreadedFramingTest(FramingTests, ServerTestCase):
+    mode = 'threaded'
+
+
+class AsyncioFramingTest(FramingTests, ServerTestCase):
+    mode = 'asyncio'
+
+
+class ThreadedStreamTest(StreamTests, ServerTestCase):
+    mode = 'threaded'
+
+
+class AsyncioStreamTest(StreamTests, ServerTestCase):
+    mode = 'asyncio'
+
+
+class RealtimeSnapshotTest(ServerTestCase):
+    mode = 'asyncio'
+    feed_path = '/api/swiftly/real-time/lametro/gtfs-rt-vehicle-positions'
+
+    def setUp(self):
+        super().setUp()
+        snapshot = FeedSnapshot(7, {'header': {'gtfs_realtime_version': '2.0'}, 'entity': [
+            {'id': 'bus', 'vehicle': {'position': {'latitude': 34.05, 'longitude': -118.25}}}]}, 'live')
+        snapshot.indexes['vehicles'] = VehicleIndex(snapshot.entities, snapshot.entity_bodies)
+        snapshot.indexes['deltas'] = VehicleDeltaLog().record(snapshot)
+        poller = FeedPoller('vehicles', 'http://127.0.0.1:9/unused', interval=0)
+        poller.snapshot = snapshot
+        self.saved_feeds = server.REALTIME_FEEDS
+        server.REALTIME_FEEDS = RealtimeFeeds()
+        server.REALTIME_FEEDS.add('lametro/gtfs-rt-vehicle-positions', poller)
+        self.addCleanup(setattr, server, 'REALTIME_FEEDS', self.saved_feeds)
+
+    def get(self, query):
+        return self.request(f"GET {self.feed_path}?{query} HTTP/1.1\r\nHost: test\r\n\r\n".encode('ascii'))
+
+    def test_bad_queries_get_json_errors(self):
+        for query in ('since=abc', 'bbox=nan,nan,nan,nan', 'lat=34&lon=inf', 'since=3&bbox=-119,33,-118,35'):
+            status, headers, body = self.get(query)
+            self.assertEqual((status, headers['content-type']), (400, 'application/json'), query)
+            payload = json.loads(body)
+            self.assertEqual((payload['success'], payload['data']), (False, []), query)
+            self.assertTrue(payload['error'].startswith('Invalid vehicle query'), query)
+
+    def test_good_queries(self):
+        status, headers, body = self.get('bbox=-119,33,-118,35')
+        self.assertEqual((status, headers['x-feed-version'], len(json.loads(body)['entity'])), (200, '7', 1))
+        status, _, body = self.get('since=6')
+        self.assertEqual(status, 200)
+
+
+class VenueTransitTest(unittest.TestCase):
+
+    def test_failed_lookup_leaves_events_without_transit(self):
+        events = [{'name': 'Show', 'venue': {'latitude': '34.05', 'longitude': '-118.25'}}]
+        handler = server.ComprehensiveLATransitHandler.__new__(server.ComprehensiveLATransitHandler)
+        failing = mock.Mock(**{'enrich.side_effect': RuntimeError('index rebuilt')})
+        with mock.patch.object(server.SCHEDULE_STORE, 'schedule', object()), \
+                mock.patch.object(server, 'VENUE_TRANSIT', failing):
+            asyncio.run(handler.add_venue_transit('34.0', '-118.2', events))
+        failing.enrich.assert_called_once()
+        self.assertEqual(events, [{'name': 'Show', 'venue': {'latitude': '34.05', 'longitude': '-118.25'}}])
+
+
+class SlowGeocodeUpstream(http.server.ThreadingHTTPServer):
+    """Nominatim stand-in; a query containing 'slow' is held until `release` is set"""
+
+    def __init__(self):
+        self.holding = threading.Event()
+        self.release = threading.Event()
+        super().__init__(('127.0.0.1', 0), self.Handler)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)['q'][0]
+            if 'slow' in query.lower():
+                self.server.holding.set()
+                self.server.release.wait(5)
+            body = json.dumps([{'lat': '34.0561', 'lon': '-118.2365', 'display_name': query}]).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+
+class ThreadedUpstreamWaitTest(ServerTestCase):
+    mode = 'threaded'
+    upstream_waits = 1
+
+    def setUp(self):
+        super().setUp()
+        self.upstream = SlowGeocodeUpstream()
+        threading.Thread(target=self.upstream.serve_forever, daemon=True).start()
+        self.addCleanup(self.upstream.server_close)
+        self.addCleanup(self.upstream.shutdown)
+        self.addCleanup(self.upstream.release.set)
+        base_url = 'http://%s:%d' % self.upstream.server_address
+        self.saved_geocoder = server.GEOCODER
+        server.GEOCODER = Geocoder(NominatimUpstream(self.engine.fetch, base_url, min_interval=0),
+                                   GeocodeCache(os.path.join(CACHE_DIRECTORY, 'waits.sqlite3')))
+        self.addCleanup(setattr, server, 'GEOCODER', self.saved_geocoder)
+
+    def geocode(self, query):
+        status, headers, body = self.request(f"GET /api/geocode?q={urllib.parse.quote(query)} HTTP/1.1\r\n"
+                                             f"Host: test\r\nConnection: close\r\n\r\n".encode('ascii'))
+        return status, headers, json.loads(body)
+
+    def test_cache_hits_are_served_while_the_upstream_slots_are_taken(self):
+        self.assertEqual(self.geocode('Union Station')[2]['source'], 'nominatim')
+        slow = []
+        thread = threading.Thread(target=lambda: slow.append(self.geocode('Slow Place')))
+        thread.start()
+        self.assertTrue(self.upstream.holding.wait(5))
+
+        status, _, payload = self.geocode('union station')
+        self.assertEqual((status, payload['source']), (200, 'memory'))
+        status, headers, payload = self.geocode('Griffith Observatory')
+        self.assertEqual((status, headers['retry-after'], payload['success']), (503, '1', False))
+
+        self.upstream.release.set()
+        thread.join(5)
+        self.assertEqual(slow[0][0], 200)
+        self.assertEqual(self.geocode('Griffith Observatory')[0], 200)  # the slot was given back
+        self.assertEqual(self.httpd.upstream_rejected, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Journey planner checks on a three-stop feed around the service-day boundary
+Yesterday's LATE trip runs past 24:00 (03:20-03:40 today) and today's first
+trips leave from 04:05, so a search between 3am and 4am has to see both days.
+"""
+
+import datetime
+import os
+import tempfile
+import unittest
+import zipfile
+from zoneinfo import ZoneInfo
+
+from arrivals import service_day_start
+from journey_planner import JourneyPlanner
+from schedule_snapshot import ScheduleStore
+from stop_index import StopIndex
+
+# Stops ~2.2 km apart, beyond walking distance of each other
+STOPS = {'A': (34.00, -118.25), 'B': (34.02, -118.25), 'C': (34.04, -118.25)}
+TRIPS = {
+    'LATE': ('1', [('A', '27:20:00'), ('B', '27:40:00')]),  # yesterday's service day
+    'EARLY': ('2', [('B', '04:05:00'), ('C', '04:30:00')]),
+    'FIRST': ('1', [('A', '04:10:00'), ('B', '04:30:00')]),
+}
+DAY = datetime.date(2026, 10, 14)
+
+
+def write_feed(path):
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('agency.txt', 'agency_id,agency_name,agency_url,agency_timezone\n'
+                                       'LACMTA,Metro,https://www.metro.net,America/Los_Angeles\n')
+        archive.writestr('calendar.txt', 'service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,'
+                                         'start_date,end_date\nDAILY,1,1,1,1,1,1,1,20240101,20301231\n')
+        archive.writestr('stops.txt', 'stop_id,stop_name,stop_lat,stop_lon\n' + ''.join(
+            f"{stop},Stop {stop},{lat},{lon}\n" for stop, (lat, lon) in STOPS.items()))
+        archive.writestr('routes.txt', 'route_id,route_short_name,route_long_name,route_type\n'
+                                       '1,1,Line 1,3\n2,2,Line 2,3\n')
+        archive.writestr('trips.txt', 'route_id,service_id,trip_id\n' + ''.join(
+            f"{route},DAILY,{trip}\n" for trip, (route, _) in TRIPS.items()))
+        archive.writestr('stop_times.txt', 'trip_id,arrival_time,departure_time,stop_id,stop_sequence\n' + ''.join(
+            f"{trip},{clock},{clock},{stop},{sequence + 1}\n"
+            for trip, (_, stop_times) in TRIPS.items() for sequence, (stop, clock) in enumerate(stop_times)))
+
+
+class ServiceDayBoundaryTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        gtfs_path = os.path.join(cls.directory.name, 'gtfs.zip')
+        write_feed(gtfs_path)
+        store = ScheduleStore(os.path.join(cls.directory.name, 'gtfs.bin'), gtfs_path)
+        store.add_builder('stops', StopIndex)
+        store.add_builder('planner', JourneyPlanner)
+        cls.schedule = store.load()
+        cls.planner = cls.schedule.indexes['planner']
+        cls.timezone = ZoneInfo(cls.schedule.timezone)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def at(self, hour, minute):
+        """Epoch of a wall-clock time on DAY"""
+        return int(datetime.datetime(DAY.year, DAY.month, DAY.day, hour, minute, tzinfo=self.timezone).timestamp())
+
+    def test_plan_boards_todays_first_trip_before_4am(self):
+        routes = self.planner.plan(STOPS['A'], STOPS['B'], self.at(3, 45))
+        self.assertTrue(routes)
+        leg = routes[0]['legs'][0]
+        self.assertEqual(leg['departure_time']['text'], '4:10 AM')  # leaves just in time for FIRST
+        self.assertEqual(leg['arrival_time']['text'], '4:30 AM')
+
+    def test_plan_transfers_from_yesterdays_late_trip_to_todays_first(self):
+        routes = self.planner.plan(STOPS['A'], STOPS['C'], self.at(3, 10))
+        self.assertTrue(routes)
+        self.assertEqual(routes[0]['transfers'], 1)
+        transit = [step['transit_details'] for step in routes[0]['legs'][0]['steps'] if 'transit_details' in step]
+        self.assertEqual([details['trip_id'] for details in transit], ['LATE', 'EARLY'])
+        self.assertEqual(transit[0]['departure_time']['text'], '3:20 AM')
+        self.assertEqual(transit[1]['arrival_time']['text'], '4:30 AM')
+
+    def test_reachable_and_matrix_before_4am(self):
+        depart = self.at(3, 45)
+        reached = self.planner.reachable(STOPS['A'], depart, 3600)
+        stop_b = self.schedule.stop_ids.get('B')
+        self.assertIn(stop_b, reached)
+        rows = self.planner.matrix([STOPS['A']], [STOPS['B'], STOPS['C']], depart)
+        elements = rows[0]['elements']
+        self.assertEqual(elements[0]['status'], 'OK')
+        self.assertEqual(depart + elements[0]['duration']['value'], self.at(4, 30))
+        self.assertEqual(elements[1]['status'], 'ZERO_RESULTS')  # EARLY has left B by 04:30
+
+    def test_daytime_search_uses_only_todays_service(self):
+        _, start, days, _ = self.planner._departure(self.at(8, 0), None)
+        self.assertEqual([offset for offset, _, _ in days], [0])
+        self.assertEqual(start, self.at(8, 0) - service_day_start(DAY, self.timezone))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Proxy engine checks: the upstream gate only applies to answers that are not cached
+"""
+
+import asyncio
+import unittest
+
+from proxy_engine import UPSTREAM_GATE, ProxyEngine, UpstreamBusy, UpstreamResponse
+from response_cache import normalize_url
+
+URL = 'http://127.0.0.1:9/data.json'  # nothing listens here
+
+
+class UpstreamGateTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_cached_answers_skip_the_gate(self):
+        engine = ProxyEngine()
+        response = UpstreamResponse(URL, 200, 'OK', {}, b'{}')
+        engine.cache.put(normalize_url(URL, 'GET'), response, 60, 2)
+        asked = []
+        UPSTREAM_GATE.set(lambda: asked.append(True) or False)
+        self.assertIs(await engine.fetch(URL, ttl=60), response)
+        self.assertEqual(asked, [])
+        with self.assertRaises(UpstreamBusy):
+            await engine.fetch(URL + '?other', ttl=60)
+        with self.assertRaises(UpstreamBusy):
+            await engine.fetch(URL)  # ttl 0: never cached
+        self.assertEqual(len(asked), 2)
+        self.assertEqual(engine.inflight, {})
+
+    async def test_gate_is_inherited_by_tasks(self):
+        UPSTREAM_GATE.set(lambda: False)
+        with self.assertRaises(UpstreamBusy):
+            await asyncio.create_task(ProxyEngine().fetch(URL))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Stream hub checks: subscribing, per-subscriber filters and dropping slow clients
+"""
+
+import asyncio
+import types
+import unittest
+
+from realtime_feed import FeedSnapshot
+from realtime_stream import StreamFilter, StreamHub
+
+
+def snapshot(version, entities):
+    return FeedSnapshot(version, {'header': {'gtfs_realtime_version': '2.0'}, 'entity': entities}, 'live')
+
+
+def trip(route):
+    return {'id': f'trip_{route}', 'trip_update': {'trip': {'trip_id': f'trip_{route}', 'route_id': route}}}
+
+
+def vehicle(vehicle_id, route, lat, lon):
+    return {'id': vehicle_id, 'vehicle': {'trip': {'route_id': route}, 'position': {'latitude': lat, 'longitude': lon}}}
+
+
+class RecordingWriter:
+    """StreamWriter stand-in; with stalled=True drain() never returns, like a client that stopped reading"""
+
+    def __init__(self, stalled=False):
+        self.stalled = stalled
+        self.chunks = []
+        self.closed = False
+        self.transport = types.SimpleNamespace(set_write_buffer_limits=lambda high: None)
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    async def drain(self):
+        if self.stalled:
+            await asyncio.Event().wait()
+
+    def close(self):
+        self.closed = True
+
+    def events(self):
+        return [chunk for chunk in self.chunks if chunk.startswith(b'event: ')]
+
+
+class StreamHubTest(unittest.IsolatedAsyncioTestCase):
+
+    async def subscribe(self, hub, stream_filter, writer):
+        subscribed = len(hub.subscribers) + 1
+        task = asyncio.create_task(hub.serve(stream_filter, writer, b'HTTP/1.1 200 OK\r\n\r\n'))
+        while len(hub.subscribers) < subscribed:
+            await asyncio.sleep(0)
+        self.addAsyncCleanup(self.cancel, task)
+        return task
+
+    @staticmethod
+    async def cancel(task):
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    async def settle(self):
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+    async def test_subscriber_gets_the_current_state_then_ticks(self):
+        hub = StreamHub(heartbeat=30)
+        hub.publish('trips', snapshot(1, [trip('66')]))
+        writer = RecordingWriter()
+        await self.subscribe(hub, StreamFilter(), writer)
+        await self.settle()
+        self.assertTrue(writer.chunks[0].startswith(b'HTTP/1.1 200 OK\r\n\r\nretry: '))
+        hub.publish('trips', snapshot(2, [trip('66'), trip('10')]))
+        await self.settle()
+        self.assertEqual([event.split(b'\n')[1] for event in writer.events()], [b'id: 1', b'id: 2'])
+        self.assertEqual(hub.stats()['subscribers'], 1)
+
+    async def test_filters_select_feeds_routes_and_area(self):
+        hub = StreamHub(heartbeat=30)
+        routes = RecordingWriter()
+        area = RecordingWriter()
+        await self.subscribe(hub, StreamFilter(feeds=['trips'], routes=['66']), routes)
+        await self.subscribe(hub, StreamFilter(feeds=['vehicles'], spatial=('bbox', (-118.3, 34.0, -118.2, 34.1))), area)
+        hub.publish('trips', snapshot(1, [trip('66'), trip('10')]))
+        hub.publish('vehicles', snapshot(1, [vehicle('inside', '10', 34.05, -118.25),
+                                             vehicle('outside', '66', 33.9, -118.25)]))
+        await self.settle()
+        (trips_event,) = routes.events()
+        self.assertIn(b'"trip_66"', trips_event)
+        self.assertNotIn(b'"trip_10"', trips_event)
+        (vehicles_event,) = area.events()
+        self.assertIn(b'"inside"', vehicles_event)
+        self.assertNotIn(b'"outside"', vehicles_event)
+
+    async def test_slow_subscriber_is_dropped(self):
+        hub = StreamHub(queue_size=2, heartbeat=30)
+        writer = RecordingWriter(stalled=True)
+        task = await self.subscribe(hub, StreamFilter(), writer)
+        for version in range(1, 6):
+            hub.publish('trips', snapshot(version, [trip(str(version))]))
+            await asyncio.sleep(0)
+        await asyncio.wait_for(task, 1)  # ends quietly rather than raising CancelledError
+        self.assertTrue(writer.closed)
+        self.assertEqual((hub.stats()['dropped_slow'], hub.stats()['subscribers']), (1, 0))
+        self.assertEqual(hub.filters, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Response compression checks: negotiation and the compressed-body cache bound
+"""
+
+import gzip
+import json
+import unittest
+import zlib
+
+from response_compression import CompressionCache, negotiate_encoding
+
+
+def body(i):
+    return json.dumps({'entity': [{'id': f'vehicle_{i}_{n}', 'route': n % 30} for n in range(400)]}).encode('utf-8')
+
+
+class NegotiateEncodingTest(unittest.TestCase):
+
+    def test_preference(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'gzip')
+        self.assertEqual(negotiate_encoding('deflate;q=1, gzip;q=0.5'), 'deflate')
+        self.assertEqual(negotiate_encoding('*;q=0.3'), 'gzip')
+        self.assertIsNone(negotiate_encoding('gzip;q=0, identity'))
+        self.assertIsNone(negotiate_encoding(None))
+
+
+class CompressionCacheTest(unittest.TestCase):
+
+    def test_cached_variant_is_reused_for_the_same_body(self):
+        cache = CompressionCache()
+        payload = body(0)
+        compressed = cache.get(payload, 'gzip', cacheable=True)
+        self.assertEqual(gzip.decompress(compressed), payload)
+        self.assertIs(cache.get(payload, 'gzip', cacheable=True), compressed)
+        self.assertEqual(zlib.decompress(cache.get(payload, 'deflate')), payload)
+        self.assertEqual(cache.compressed, 2)
+
+    def test_entries_are_charged_for_the_pinned_body(self):
+        payloads = [body(i) for i in range(20)]
+        cap = 4 * len(payloads[0])
+        cache = CompressionCache(max_bytes=cap)
+        for payload in payloads:
+            cache.get(payload, 'gzip', cacheable=True)
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], cap)
+        self.assertLess(stats['entries'], 4)  # compressed alone, all 20 would have fitted
+        self.assertGreater(stats['evictions'], 0)
+
+    def test_uncacheable_bodies_are_not_kept(self):
+        cache = CompressionCache()
+        cache.get(body(0), 'gzip')
+        self.assertEqual(cache.stats()['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
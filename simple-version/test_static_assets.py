@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Static asset checks: Range header parsing
+"""
+
+import unittest
+
+from static_assets import parse_byte_range
+
+
+class ParseByteRangeTest(unittest.TestCase):
+
+    def test_single_ranges(self):
+        self.assertEqual(parse_byte_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_byte_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_byte_range('bytes=900-5000', 1000), (900, 999))
+        self.assertEqual(parse_byte_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_byte_range('bytes=-5000', 1000), (0, 999))
+        self.assertEqual(parse_byte_range(' Bytes = 5-5', 1000), (5, 5))
+
+    def test_ignored_ranges_send_the_whole_file(self):
+        for header in (None, '', 'items=0-5', 'bytes=0-5,10-20', 'bytes=5-2', 'bytes=-', 'bytes=a-b', 'bytes=5'):
+            self.assertIsNone(parse_byte_range(header, 1000), header)
+
+    def test_unsatisfiable_ranges(self):
+        for header, size in (('bytes=1000-', 1000), ('bytes=-0', 1000), ('bytes=-10', 0), ('bytes=0-', 0)):
+            with self.assertRaises(ValueError):
+                parse_byte_range(header, size)
+
+
+if __name__ == '__main__':
+    unittest.main()
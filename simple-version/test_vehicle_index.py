@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Vehicle index checks: spatial query parsing and bbox / radius lookups
+"""
+
+import json
+import unittest
+import urllib.parse
+
+from vehicle_index import MAX_RADIUS_METERS, VehicleIndex, parse_spatial_query
+
+
+def parse(query):
+    return parse_spatial_query(urllib.parse.parse_qs(query))
+
+
+def vehicle(vehicle_id, lat, lon):
+    return {'id': vehicle_id, 'vehicle': {'position': {'latitude': lat, 'longitude': lon}}}
+
+
+class ParseSpatialQueryTest(unittest.TestCase):
+
+    def test_bbox_and_radius(self):
+        self.assertIsNone(parse('route=66'))
+        self.assertEqual(parse('bbox=-118.3,34.0,-118.2,34.1'), ('bbox', (-118.3, 34.0, -118.2, 34.1)))
+        self.assertEqual(parse('lat=34.05&lon=-118.25'), ('radius', (34.05, -118.25, 1000.0)))
+        self.assertEqual(parse('lat=34.05&lng=-118.25&radius=250'), ('radius', (34.05, -118.25, 250.0)))
+
+    def test_malformed_values_are_rejected(self):
+        for query in ('bbox=1,2,3', 'bbox=a,b,c,d', 'bbox=0,1,1,0', 'bbox=1,0,0,1', 'lat=34', 'lon=-118',
+                      'lat=x&lon=0', 'lat=34&lon=-118&radius=0', f'lat=34&lon=-118&radius={MAX_RADIUS_METERS + 1}'):
+            with self.assertRaises(ValueError, msg=query):
+                parse(query)
+
+    def test_non_finite_values_are_rejected(self):
+        for query in ('bbox=nan,nan,nan,nan', 'bbox=-inf,-inf,inf,inf', 'bbox=-118.3,34.0,-118.2,infinity',
+                      'lat=nan&lon=0', 'lat=0&lon=-inf', 'lat=34&lon=-118&radius=nan', 'lat=34&lon=-118&radius=inf'):
+            with self.assertRaises(ValueError, msg=query):
+                parse(query)
+
+    def test_coordinates_are_clamped(self):
+        self.assertEqual(parse('bbox=-500,-100,500,100'), ('bbox', (-180, -90, 180, 90)))
+        self.assertEqual(parse('lat=95&lon=-200&radius=10'), ('radius', (90, -180, 10.0)))
+
+
+class VehicleIndexQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = VehicleIndex([vehicle('downtown', 34.05, -118.25), vehicle('santa_monica', 34.01, -118.49),
+                                   {'id': 'no_position', 'vehicle': {}}])
+
+    def ids(self, query):
+        return sorted(json.loads(self.index.encoded[i])['id'] for i in self.index.query(parse(query)))
+
+    def test_queries(self):
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.ids('bbox=-118.3,34.0,-118.2,34.1'), ['downtown'])
+        self.assertEqual(self.ids('lat=34.0522&lon=-118.2437&radius=2000'), ['downtown'])
+        self.assertEqual(self.ids('bbox=-500,-100,500,100'), ['downtown', 'santa_monica'])
+        self.assertEqual(self.ids('lat=95&lon=-200&radius=50000'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
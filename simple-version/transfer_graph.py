@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Walking transfer graph between nearby stops
+Computed once when a schedule is compiled: every ordered pair of stops within
+TRANSFER_METERS becomes an edge weighted by walking time, stored as CSR
+adjacency (transfer_offsets / transfer_stops / transfer_seconds) that the
+server maps with the rest of the snapshot. With NumPy installed the pair
+search is vectorized over latitude-sorted blocks of stops; otherwise a grid
+scan in plain Python produces the same edges.
+
+Usage: python transfer_graph.py gtfs.zip [--radius 400] [--pure]
+"""
+
+import math
+import os
+import sys
+import time
+from array import array
+
+from vehicle_index import EARTH_RADIUS_METERS, haversine_meters
+
+try:
+    import numpy
+except ImportError:  # optional: only speeds up the compile step
+    numpy = None
+
+WALK_SPEED = float(os.getenv('PLAN_WALK_SPEED', '1.3'))  # meters per second
+TRANSFER_METERS = float(os.getenv('PLAN_TRANSFER_METERS', '400'))  # walk between stops when transferring
+WALK_DETOUR = 1.25  # street distance relative to a straight line
+BLOCK_SIZE = 128  # stops per vectorized block
+DEGREE_METERS = EARTH_RADIUS_METERS * math.pi / 180  # one degree of latitude on the haversine sphere
+
+
+def walk_seconds(meters):
+    return int(meters * (WALK_DETOUR / WALK_SPEED))
+
+
+def _longitude_span(radius, lats):
+    """Degrees of longitude covering `radius` meters at the most poleward latitude given"""
+    widest = max((abs(lat) for lat in lats), default=0.0)
+    return radius / (DEGREE_METERS * max(math.cos(math.radians(min(widest, 89.0))), 1e-6))
+
+
+def transfer_pairs_grid(lats, lons, radius):
+    """[(stop, other, meters)] for all ordered pairs within `radius`, using a lat/lon grid"""
+    lat_cell = radius / DEGREE_METERS
+    lon_cell = _longitude_span(radius, lats)
+    cells = {}
+    for stop, (lat, lon) in enumerate(zip(lats, lons)):
+        cells.setdefault((math.floor(lat / lat_cell), math.floor(lon / lon_cell)), []).append(stop)
+    pairs = []
+    for (row, col), members in cells.items():
+        neighbours = [other for r in (row - 1, row, row + 1) for c in (col - 1, col, col + 1)
+                      for other in cells.get((r, c), ())]
+        for stop in members:
+            lat, lon = lats[stop], lons[stop]
+            for other in neighbours:
+                if other != stop:
+                    meters = haversine_meters(lat, lon, lats[other], lons[other])
+                    if meters <= radius:
+                        pairs.append((stop, other, meters))
+    return pairs
+
+
+def transfer_pairs_numpy(lats, lons, radius):
+    """Same pairs as transfer_pairs_grid, as (stops, others, meters) NumPy arrays"""
+    lat = numpy.asarray(lats, dtype=numpy.float64)
+    lon = numpy.asarray(lons, dtype=numpy.float64)
+    order = numpy.argsort(lat, kind='stable')
+    sorted_lat, sorted_lon = lat[order], lon[order]
+    lat_span = radius / DEGREE_METERS
+    lon_span = _longitude_span(radius, lats)
+    phi = numpy.radians(sorted_lat)
+    cos_phi = numpy.cos(phi)
+    stops, others, distances = [], [], []
+    for start in range(0, len(order), BLOCK_SIZE):
+        end = min(start + BLOCK_SIZE, len(order))
+        # Only stops inside the block's latitude band (widened by the radius) can be in range
+        low = numpy.searchsorted(sorted_lat, sorted_lat[start] - lat_span, 'left')
+        high = numpy.searchsorted(sorted_lat, sorted_lat[end - 1] + lat_span, 'right')
+        block = slice(start, end)
+        near = ((numpy.abs(sorted_lat[block, None] - sorted_lat[None, low:high]) <= lat_span)
+                & (numpy.abs(sorted_lon[block, None] - sorted_lon[None, low:high]) <= lon_span))
+        rows, columns = numpy.nonzero(near)
+        rows += start
+        columns += low
+        keep = rows != columns
+        rows, columns = rows[keep], columns[keep]
+        a = (numpy.sin((phi[columns] - phi[rows]) / 2) ** 2
+             + cos_phi[rows] * cos_phi[columns]
+             * numpy.sin(numpy.radians(sorted_lon[columns] - sorted_lon[rows]) / 2) ** 2)
+        meters = 2 * EARTH_RADIUS_METERS * numpy.arcsin(numpy.sqrt(a))
+        within = meters <= radius
+        stops.append(order[rows[within]])
+        others.append(order[columns[within]])
+        distances.append(meters[within])
+    if not stops:
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        return empty, empty, numpy.zeros(0)
+    return numpy.concatenate(stops), numpy.concatenate(others), numpy.concatenate(distances)
+
+
+def build_transfer_graph(lats, lons, radius=None, use_numpy=None):
+    """CSR walking graph: (offsets, stops, seconds) arrays, neighbours nearest first"""
+    radius = radius if radius is not None else TRANSFER_METERS
+    use_numpy = numpy is not None if use_numpy is None else use_numpy and numpy is not None
+    count = len(lats)
+    if use_numpy:
+        stops, others, meters = transfer_pairs_numpy(lats, lons, radius)
+        seconds = (meters * (WALK_DETOUR / WALK_SPEED)).astype(numpy.int32)
+        order = numpy.lexsort((others, seconds, stops))
+        offsets = numpy.zeros(count + 1, dtype=numpy.int32)
+        numpy.cumsum(numpy.bincount(stops, minlength=count), out=offsets[1:])
+        return (array('i', offsets.tobytes()), array('i', others[order].astype(numpy.int32).tobytes()),
+                array('i', seconds[order].tobytes()))
+    edges = sorted((stop, walk_seconds(meters), other) for stop, other, meters in transfer_pairs_grid(lats, lons, radius))
+    offsets = array('i', [0]) * (count + 1)
+    for stop, _, _ in edges:
+        offsets[stop + 1] += 1
+    for stop in range(count):
+        offsets[stop + 1] += offsets[stop]
+    return offsets, array('i', (other for _, _, other in edges)), array('i', (seconds for _, seconds, _ in edges))
+
+
+def main(argv):
+    from gtfs_static import load_schedule  # gtfs_static imports this module
+
+    if not argv:
+        print("Usage: python transfer_graph.py gtfs.zip [--radius 400] [--pure]")
+        return 1
+    radius = float(argv[argv.index('--radius') + 1]) if '--radius' in argv else None
+    schedule = load_schedule(argv[0])
+    lats, lons = list(schedule.stop_lats), list(schedule.stop_lons)
+    runs = [('grid', False)] + ([('numpy', True)] if numpy is not None and '--pure' not in argv else [])
+    results = {}
+    for name, vectorized in runs:
+        started = time.perf_counter()
+        results[name] = build_transfer_graph(lats, lons, radius, use_numpy=vectorized)
+        offsets, _, _ = results[name]
+        print(f"🚶 {name}: {offsets[-1]} transfers between {len(lats)} stops "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+    if len(results) == 2:
+        same = all(a == b for a, b in zip(results['grid'], results['numpy']))
+        print(f"{'✅' if same else '❌'} grid and numpy graphs {'match' if same else 'differ'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Delta encoding of GTFS-RT vehicle positions for polling clients
+Every feed tick records which vehicles were added, moved or removed. A client
+that sends the last version it saw gets only those changes; a client too far
+behind (or ahead, after a restart) gets the full snapshot instead.
+"""
+
+import collections
+import os
+
+from realtime_feed import encode_feed_body
+
+VEHICLE_DELTA_HISTORY = int(os.getenv('VEHICLE_DELTA_HISTORY', '30'))  # ticks a client may lag behind
+VEHICLE_DELTA_PRECISION = int(os.getenv('VEHICLE_DELTA_PRECISION', '5'))  # lat/lon decimals, 5 is ~1 m
+
+
+def vehicle_fingerprint(entity, precision=VEHICLE_DELTA_PRECISION):
+    """The parts of a vehicle whose change is worth sending to clients"""
+    vehicle = entity.get('vehicle') or {}
+    position = vehicle.get('position') or {}
+    trip = vehicle.get('trip') or {}
+    latitude, longitude = position.get('latitude'), position.get('longitude')
+    return (
+        round(latitude, precision) if latitude is not None else None,
+        round(longitude, precision) if longitude is not None else None,
+        position.get('bearing'),
+        trip.get('trip_id'),
+        trip.get('route_id'),
+        vehicle.get('stop_id'),
+        vehicle.get('current_status'),
+        vehicle.get('current_stop_sequence'),
+        vehicle.get('occupancy_status'),
+    )
+
+
+class VehicleDeltaLog:
+    """Per-tick change sets for one vehicle-positions feed
+
+    Used as a FeedPoller builder: record() is called with each new snapshot,
+    always from one poll at a time, and returns the VehicleDelta to attach.
+    """
+
+    def __init__(self, history=None):
+        self.history = history if history is not None else VEHICLE_DELTA_HISTORY
+        self.ticks = collections.deque(maxlen=self.history)  # (version, changed ids, removed ids)
+        self.fingerprints = {}  # vehicle id -> fingerprint last reported as changed
+        self.version = 0
+
+    def record(self, snapshot):
+        bodies = {}
+        entities = {}
+        fingerprints = {}
+        changed = set()
+        for entity, body in zip(snapshot.entities, snapshot.entity_bodies):
+            if 'vehicle' not in entity:
+                continue
+            vehicle_id = entity.get('id')
+            bodies[vehicle_id] = body
+            entities[vehicle_id] = entity
+            fingerprint = vehicle_fingerprint(entity)
+            previous = self.fingerprints.get(vehicle_id)
+            # Compare against what was last reported so slow drift still gets sent eventually
+            if previous is None or previous != fingerprint:
+                changed.add(vehicle_id)
+                fingerprints[vehicle_id] = fingerprint
+            else:
+                fingerprints[vehicle_id] = previous
+        removed = self.fingerprints.keys() - fingerprints.keys()
+
+        if snapshot.version != self.version + 1:
+            self.ticks.clear()  # a gap in versions; older clients must resync
+        self.ticks.append((snapshot.version, frozenset(changed), frozenset(removed)))
+        self.fingerprints = fingerprints
+        self.version = snapshot.version
+        return VehicleDelta(snapshot, entities, bodies, tuple(self.ticks))
+
+
+class VehicleDelta:
+    """Answers 'what changed since version N' for one published snapshot"""
+
+    def __init__(self, snapshot, entities, bodies, ticks):
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        self.entities = entities  # vehicle id -> entity
+        self.bodies = bodies  # vehicle id -> serialized entity
+        self.ticks = ticks
+        self.oldest = ticks[0][0] - 1 if ticks else self.version  # earliest version a delta can start from
+        self._encoded = {}  # since -> response body; clients cluster on a few versions
+
+    def covers(self, since):
+        return self.oldest <= since <= self.version
+
+    def encode(self, since):
+        """Delta body from `since`, or the full snapshot when `since` is out of range"""
+        key = since if self.covers(since) else None
+        body = self._encoded.get(key)
+        if body is None:
+            body = self._encode(key)
+            if len(self._encoded) <= len(self.ticks) + 1:
+                self._encoded[key] = body
+        return body
+
+    def _encode(self, since):
+        header = self.snapshot.feed.get('header', {})
+        if since is None:
+            return encode_feed_body(header, self.snapshot.entity_bodies,
+                                    version=self.version, full=True)
+        touched = set()
+        for version, changed, removed in self.ticks:
+            if version > since:
+                touched |= changed
+                touched |= removed
+        updated = [self.bodies[vehicle_id] for vehicle_id in touched if vehicle_id in self.bodies]
+        removed = sorted(vehicle_id for vehicle_id in touched if vehicle_id not in self.bodies)
+        return encode_feed_body(header, updated, version=self.version, since=since,
+                                full=False, removed=removed)
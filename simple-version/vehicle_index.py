@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Spatial index over GTFS-RT vehicle positions
+Vehicles are bucketed into a uniform lat/lon grid once per feed tick, so
+viewport (bbox) and proximity (lat/lon/radius) queries only touch the cells
+they overlap instead of scanning every bus in the system.
+"""
+
+import json
+import math
+import os
+
+from realtime_feed import encode_feed_body
+
+VEHICLE_INDEX_CELL = float(os.getenv('VEHICLE_INDEX_CELL', '0.01'))  # degrees, ~1.1 km of latitude
+DEFAULT_RADIUS_METERS = 1000
+MAX_RADIUS_METERS = 50000
+
+EARTH_RADIUS_METERS = 6371000
+METERS_PER_DEGREE = 111320
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+
+def _coordinate(value, name):
+    """float() that rejects nan and inf, which would pass every comparison check below"""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be a finite number")
+    return number
+
+
+def _clamp(value, limit):
+    return min(max(value, -limit), limit)
+
+
+def parse_spatial_query(query_params):
+    """Read bbox= or lat=&lon=[&radius=] from parse_qs output
+
+    Returns None when no spatial filter was requested, ('bbox', (west, south, east, north))
+    or ('radius', (lat, lon, meters)), with latitudes clamped to +-90 and longitudes
+    to +-180. Raises ValueError on malformed or non-finite values.
+    """
+    bbox = query_params.get('bbox', [None])[0]
+    if bbox:
+        parts = [_coordinate(v, 'bbox') for v in bbox.split(',')]
+        if len(parts) != 4:
+            raise ValueError("bbox must be west,south,east,north")
+        west, south, east, north = parts
+        if south > north or west > east:
+            raise ValueError("bbox must be west,south,east,north")
+        return 'bbox', (_clamp(west, 180), _clamp(south, 90), _clamp(east, 180), _clamp(north, 90))
+
+    lat = query_params.get('lat', [None])[0]
+    lon = query_params.get('lon', query_params.get('lng', [None]))[0]
+    if lat is None and lon is None:
+        return None
+    if lat is None or lon is None:
+        raise ValueError("lat and lon are both required")
+    radius = float(query_params.get('radius', [DEFAULT_RADIUS_METERS])[0])
+    if not 0 < radius <= MAX_RADIUS_METERS:
+        raise ValueError(f"radius must be between 0 and {MAX_RADIUS_METERS} meters")
+    return 'radius', (_clamp(_coordinate(lat, 'lat'), 90), _clamp(_coordinate(lon, 'lon'), 180), radius)
+
+
+def spatial_contains(spatial, lat, lon):
+    """Whether a point satisfies a parse_spatial_query() result"""
+    kind, args = spatial
+    if kind == 'bbox':
+        west, south, east, north = args
+        return south <= lat <= north and west <= lon <= east
+    center_lat, center_lon, meters = args
+    return haversine_meters(center_lat, center_lon, lat, lon) <= meters
+
+
+class VehicleIndex:
+    """Uniform grid over the positioned vehicles of one feed snapshot"""
+
+    def __init__(self, entities, entity_bodies=None, cell=None):
+        self.cell = cell or VEHICLE_INDEX_CELL
+        self.cells = {}  # (row, col) -> positions in the arrays below
+        self.lats = []
+        self.lons = []
+        self.encoded = []  # each entity serialized once, joined per query
+        for i, entity in enumerate(entities):
+            position = (entity.get('vehicle') or {}).get('position') or {}
+            lat, lon = position.get('latitude'), position.get('longitude')
+            if lat is None or lon is None:
+                continue
+            self.cells.setdefault(self._cell(lat, lon), []).append(len(self.lats))
+            self.lats.append(lat)
+            self.lons.append(lon)
+            self.encoded.append(entity_bodies[i] if entity_bodies is not None
+                                else json.dumps(entity).encode('utf-8'))
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def _candidate_cells(self, west, south, east, north):
+        row_min, col_min = self._cell(south, west)
+        row_max, col_max = self._cell(north, east)
+        span = (row_max - row_min + 1) * (col_max - col_min + 1)
+        if span > len(self.cells):
+            # Box larger than the occupied area; walk occupied cells instead
+            return [members for (row, col), members in self.cells.items()
+                    if row_min <= row <= row_max and col_min <= col <= col_max]
+        cells = self.cells
+        return [cells[(row, col)]
+                for row in range(row_min, row_max + 1)
+                for col in range(col_min, col_max + 1)
+                if (row, col) in cells]
+
+    def within_bbox(self, west, south, east, north):
+        """Positions of vehicles inside the box"""
+        lats, lons = self.lats, self.lons
+        return [i for members in self._candidate_cells(west, south, east, north)
+                for i in members
+                if south <= lats[i] <= north and west <= lons[i] <= east]
+
+    def within_radius(self, lat, lon, meters):
+        """Positions of vehicles within the radius, nearest first"""
+        dlat = meters / METERS_PER_DEGREE
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        lats, lons = self.lats, self.lons
+        hits = []
+        for members in self._candidate_cells(lon - dlon, lat - dlat, lon + dlon, lat + dlat):
+            for i in members:
+                distance = haversine_meters(lat, lon, lats[i], lons[i])
+                if distance <= meters:
+                    hits.append((distance, i))
+        hits.sort()
+        return [i for _, i in hits]
+
+    def query(self, spatial):
+        """Run a parse_spatial_query() result against the index"""
+        kind, args = spatial
+        if kind == 'bbox':
+            return self.within_bbox(*args)
+        return self.within_radius(*args)
+
+    def encode(self, header, positions):
+        """Feed JSON holding only the selected vehicles"""
+        return encode_feed_body(header, [self.encoded[i] for i in positions])
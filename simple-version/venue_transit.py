@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Transit context for event venues
+Event listings carry each venue's nearest stops and a transit travel time from
+the caller, computed server-side in one batch: every venue missing from the
+cache is served by a single one-to-all search from the caller's location.
+Nearest stops depend only on the schedule, so popular venues are looked up
+once per schedule version; travel times are cached per (origin grid cell,
+departure bucket, venue) with the origin snapped to the cell centre.
+"""
+
+import math
+import os
+import threading
+
+from journey_planner import MAX_ACCESS_METERS
+from response_cache import ResponseCache
+
+VENUE_STOPS = 3  # nearest stops attached to each venue
+VENUE_ORIGIN_CELL = float(os.getenv('VENUE_ORIGIN_CELL', '0.0025'))  # degrees, ~280 m of latitude
+VENUE_DEPART_BUCKET = int(os.getenv('VENUE_DEPART_BUCKET', '300'))  # seconds of departure time sharing an ETA
+VENUE_STOPS_TTL = float(os.getenv('VENUE_STOPS_TTL', '86400'))
+VENUE_ETA_TTL = float(os.getenv('VENUE_ETA_TTL', '300'))
+VENUE_CACHE_BYTES = int(os.getenv('VENUE_CACHE_BYTES', str(8 * 1024 * 1024)))
+ENTRY_BYTES = 256  # rough size of one cached stop record or travel time
+
+
+class VenueTransit:
+    """Nearest stops and travel times for venues over the current schedule of a ScheduleStore"""
+
+    def __init__(self, store, cell=None, bucket=None):
+        self.store = store
+        self.cell = cell or VENUE_ORIGIN_CELL
+        self.bucket = bucket or VENUE_DEPART_BUCKET
+        self.cache = ResponseCache(VENUE_CACHE_BYTES)
+        self.searches = 0
+        self._lock = threading.Lock()
+
+    def enrich(self, origin, venues, depart, overlay=None):
+        """{nearest_stops, status, duration, transfers} for each (lat, lon) venue, from origin at epoch `depart`"""
+        schedule = self.store.schedule
+        index = schedule.indexes['stops']
+        row, col = math.floor(origin[0] / self.cell), math.floor(origin[1] / self.cell)
+        bucket = int(depart // self.bucket)
+        live_version = overlay.version if overlay is not None and overlay.schedule is schedule else None
+        results = []
+        missing = []
+        for lat, lon in venues:
+            venue = (round(lat, 5), round(lon, 5))
+            stops_key = ('stops', schedule.version, venue)
+            stops = self.cache.get(stops_key)
+            if stops is None:
+                stops = [index.describe(stop, meters)
+                         for meters, stop in index.nearest(lat, lon, VENUE_STOPS, MAX_ACCESS_METERS)]
+                self.cache.put(stops_key, stops, VENUE_STOPS_TTL, ENTRY_BYTES * len(stops))
+            result = {'nearest_stops': stops}
+            eta_key = ('eta', schedule.version, row, col, bucket, live_version, venue)
+            eta = self.cache.get(eta_key)
+            if eta is None:
+                missing.append((result, eta_key, (lat, lon)))
+            else:
+                result.update(eta)
+            results.append(result)
+        if missing:
+            snapped = ((row + 0.5) * self.cell, (col + 0.5) * self.cell)
+            rows = schedule.indexes['planner'].matrix([snapped], [point for _, _, point in missing],
+                                                      bucket * self.bucket, overlay=overlay)
+            for (result, eta_key, _), eta in zip(missing, rows[0]['elements']):
+                self.cache.put(eta_key, eta, VENUE_ETA_TTL, ENTRY_BYTES)
+                result.update(eta)
+            with self._lock:
+                self.searches += 1
+        return results
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['searches'] = self.searches
+        return stats